@@ -1,3 +1,23 @@
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
 from django.test import TestCase
+from rest_framework_simplejwt.tokens import RefreshToken
 
-# Create your tests here.
+from api.testing import QueryBudget, QueryBudgetMixin
+
+
+class AccountsQueryBudgetTests(QueryBudgetMixin, TestCase):
+    budgets = [
+        QueryBudget('post', '/api/accounts/login/', 2, data={'username': 'budget', 'password': 'budget'}),
+        QueryBudget('post', '/api/accounts/logout/', 7, admin=True, data={'refresh': '{refresh}'}),
+    ]
+
+    def build_fixtures(self, size):
+        password = make_password('password')
+        users = User.objects.bulk_create([
+            User(username=f'user{i}', password=password, is_staff=True) for i in range(size)
+        ])
+        # Outstanding tokens of other users, which logout looks up by jti
+        for user in users:
+            RefreshToken.for_user(user)
+        return {'refresh': str(RefreshToken.for_user(self.budget_user))}
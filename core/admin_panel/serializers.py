@@ -1,6 +1,7 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 from api.models import Category, Product, SubCategory, ProductImage, Composition
-from api.serializers import ProductImageSerializer, ProductSerializer, CategorySerializer, SubCategorySerializer, CompositionSerializer
+from api.serializers import ProductImageSerializer, ProductSerializer, CategorySerializer, SubCategorySerializer, CompositionSerializer, InquirySerializer, SparseFieldsetMixin
 
 class AdminSubCategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -19,6 +20,7 @@ class AdminCategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = '__all__'
+        read_only_fields = ['image_status', 'image_hash', 'renditions']
 
     def create(self, validated_data):
         subcategories_data = validated_data.pop('subcategories', [])
@@ -51,7 +53,7 @@ class ProductImageSerializer(serializers.ModelSerializer):
         fields = ['id', 'image']  # Only include necessary fields
 
 
-class AdminProductSerializer(serializers.ModelSerializer):
+class AdminProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     image = serializers.ImageField(required=False)
     images = ProductImageSerializer(many=True, required=False)
     category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), required=False)
@@ -62,8 +64,15 @@ class AdminProductSerializer(serializers.ModelSerializer):
         model = Product
         fields = [
             'id', 'style_number', 'gauge', 'end', 'weight', 'description', 
-            'composition', 'category', 'sub_category', 'image', 'images'
+            'composition', 'category', 'sub_category', 'image', 'images', 'image_status'
         ]
+        read_only_fields = ['image_status']
+        field_relations = {
+            'composition': {'prefetch_related': (
+                Prefetch('composition', queryset=Composition.objects.only('id')),
+            )},
+            'images': {'prefetch_related': ('images',)},
+        }
 
     def create(self, validated_data):
         images_data = validated_data.pop('images', [])
@@ -113,3 +122,41 @@ class AdminProductSerializer(serializers.ModelSerializer):
 
         instance.save()
         return instance
+
+
+class AdminInquirySerializer(InquirySerializer):
+    class Meta(InquirySerializer.Meta):
+        fields = InquirySerializer.Meta.fields + ['is_read']
+
+
+class BulkTriageSerializer(serializers.Serializer):
+    """
+    {"action": "mark_read" | "mark_unread" | "delete",
+     "ids": [...]} or {"action": ..., "filter": {"is_read": ..., "from": ..., "to": ..., "product": ...}}
+    """
+    ACTIONS = ('mark_read', 'mark_unread', 'delete')
+    FILTERS = ('is_read', 'from', 'to', 'product')
+
+    action = serializers.ChoiceField(choices=ACTIONS)
+    ids = serializers.ListField(child=serializers.UUIDField(), required=False, allow_empty=False)
+    filter = serializers.DictField(required=False, allow_empty=False)
+
+    def validate_filter(self, value):
+        unknown = sorted(set(value) - set(self.FILTERS))
+        if unknown:
+            raise serializers.ValidationError(f"Unknown filters: {', '.join(unknown)}")
+        value = {
+            name: '' if v is None else str(v).lower() if isinstance(v, bool) else str(v).strip()
+            for name, v in value.items()
+        }
+        # A blank value filters nothing, so the action would hit every submission
+        empty = sorted(name for name, v in value.items() if not v)
+        if empty:
+            raise serializers.ValidationError(f"Empty filters: {', '.join(empty)}")
+        return value
+
+    def validate(self, data):
+        if ('ids' in data) == ('filter' in data):
+            raise serializers.ValidationError('Provide either ids or filter')
+        return data
+
@@ -1,3 +1,357 @@
-from django.test import TestCase
+import csv
+import io
+import json
+from datetime import datetime
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.models import Category, Composition, ContactUs, ImageStatus, Inquiry, InquiryItems, Product, ProductFacet
+from api.testing import QueryBudget, QueryBudgetMixin, catalog_fixtures
+
+
+class AdminQueryBudgetTests(QueryBudgetMixin, TestCase):
+    budgets = [
+        QueryBudget('get', '/api/admin/categories/', 2, admin=True),
+        QueryBudget('get', '/api/admin/subcategories/{category}/', 2, admin=True),
+        QueryBudget('get', '/api/admin/products/', 3, admin=True, data={'limit': 50}),
+        QueryBudget('get', '/api/admin/products/', 3, admin=True, data={'limit': 50, 'sort': '-weight'}),
+        QueryBudget('get', '/api/admin/categorised-products/{category}/', 3, admin=True),
+        QueryBudget('get', '/api/admin/products/{product}/', 3, admin=True),
+        QueryBudget('get', '/api/admin/compositions/', 1, admin=True),
+        QueryBudget('get', '/api/admin/contact-us/', 1, admin=True),
+        QueryBudget('get', '/api/admin/Inquiry/', 3, admin=True, data={'limit': 50}),
+        QueryBudget('get', '/api/admin/Inquiry/', 3, admin=True, data={'limit': 50, 'product': '{product}'}),
+        QueryBudget('get', '/api/admin/Inquiry/{inquiry}/', 3, admin=True),
+        QueryBudget('get', '/api/admin/Inquiry/export/csv/', 2, admin=True),
+        QueryBudget('get', '/api/admin/contact-us/export/ndjson/', 1, admin=True),
+        QueryBudget('post', '/api/admin/Inquiry/bulk/', 1, admin=True, data={
+            'action': 'mark_read', 'filter': {'is_read': False}
+        }),
+        QueryBudget('post', '/api/admin/contact-us/bulk/', 1, admin=True, data=lambda context: {
+            'action': 'delete', 'ids': context['contacts']
+        }),
+    ]
+
+
+class AdminProductListTests(TestCase):
+    def setUp(self):
+        self.context = catalog_fixtures(7)
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_superuser('admin', password='admin'))
+
+    def collect(self, url, data):
+        """Follow `next` from the first page to the last."""
+        pages = []
+        response = self.client.get(url, data)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data['data'])
+            if response.data['next'] is None:
+                return pages
+            self.assertIn('cursor=', response.data['next'])
+            response = self.client.get(response.data['next'])
+
+    def test_cursor_pages_cover_every_product_once(self):
+        pages = self.collect('/api/admin/products/', {'limit': 3})
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        style_numbers = [product['style_number'] for page in pages for product in page]
+        self.assertEqual(style_numbers, sorted(Product.objects.values_list('style_number', flat=True)))
+
+    def test_descending_sort_pages_in_order(self):
+        pages = self.collect('/api/admin/products/', {'limit': 2, 'sort': '-weight'})
+        keys = [(product['weight'], product['id']) for page in pages for product in page]
+        self.assertEqual(len(keys), Product.objects.count())
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+    def test_category_listing_is_paginated(self):
+        pages = self.collect(f"/api/admin/categorised-products/{self.context['category']}/", {'limit': 100})
+        self.assertEqual(len(pages), 1)
+        self.assertEqual(
+            [product['id'] for product in pages[0]],
+            [str(pk) for pk in Product.objects.filter(category_id=self.context['category']).order_by('style_number').values_list('id', flat=True)]
+        )
+
+    def test_unknown_sort_is_rejected(self):
+        response = self.client.get('/api/admin/products/', {'sort': 'description'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['message'], 'Cannot sort by description')
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/admin/products/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.data['status'])
+
+    def test_fields_narrows_each_product(self):
+        response = self.client.get('/api/admin/products/', {'fields': 'id,style_number', 'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        for product in response.data['data']:
+            self.assertEqual(set(product), {'id', 'style_number'})
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get('/api/admin/products/', {'fields': 'id,price'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['message'], 'Invalid field selection')
+
+
+class AdminExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_superuser('admin', password='admin'))
+        products = [
+            Product.objects.create(style_number=style_number, gauge='12GG', end='2/28', weight=300)
+            for style_number in ('KN-002', 'KN-001')
+        ]
+        for day in (1, 15, 31):
+            created_at = timezone.make_aware(datetime(2025, 1, day, 12))
+            contact = ContactUs.objects.create(
+                name=f'Buyer {day}', email=f'buyer{day}@example.com', subject='Samples', message='Please, send'
+            )
+            inquiry = Inquiry.objects.create(
+                name=f'Buyer {day}', email=f'buyer{day}@example.com', subject='Samples', message='Please, send'
+            )
+            inquiry.items.set([InquiryItems.objects.create(product=product) for product in products])
+            ContactUs.objects.filter(id=contact.id).update(created_at=created_at)
+            Inquiry.objects.filter(id=inquiry.id).update(created_at=created_at)
+
+    def export(self, path, **params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_in_range(self):
+        response, body = self.export('/api/admin/Inquiry/export/csv/', **{'from': '2025-01-01', 'to': '2025-01-15'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="inquiries.csv"')
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0], ['id', 'created_at', 'name', 'email', 'subject', 'message', 'is_read', 'style_numbers'])
+        self.assertEqual([row[2] for row in rows[1:]], ['Buyer 1', 'Buyer 15'])
+        self.assertEqual(rows[1][5], 'Please, send')
+        self.assertEqual(rows[1][7], 'KN-001;KN-002')
+
+    def test_ndjson_in_range(self):
+        response, body = self.export('/api/admin/contact-us/export/ndjson/', **{'from': '2025-01-15'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['name'] for row in rows], ['Buyer 15', 'Buyer 31'])
+        self.assertEqual(set(rows[0]), {'id', 'created_at', 'name', 'email', 'subject', 'message', 'is_read'})
+        self.assertEqual(rows[0]['id'], str(ContactUs.objects.get(name='Buyer 15').id))
+        self.assertFalse(rows[0]['is_read'])
+
+    def test_rejects_bad_format_and_dates(self):
+        self.assertEqual(self.client.get('/api/admin/contact-us/export/xlsx/').status_code, 400)
+        response = self.client.get('/api/admin/contact-us/export/csv/', {'to': '15/01/2025'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['message'], "Invalid 'to' date: 15/01/2025")
+
+
+@override_settings(PRODUCT_IMPORT={'CHUNK_SIZE': 2, 'MAX_ERRORS': 1000})
+class AdminProductImportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_superuser('admin', password='admin'))
+        self.knit = Category.objects.create(name='Knit')
+        Composition.objects.bulk_create([Composition(material='Wool'), Composition(material='Cotton')])
+
+    def upload(self, name, content, **data):
+        upload = SimpleUploadedFile(name, content.encode() if isinstance(content, str) else content)
+        return self.client.post('/api/admin/products/import/', {'file': upload, **data})
+
+    def test_csv_rows_with_errors(self):
+        response = self.upload('sheet.csv', (
+            'style_number,gauge,end,weight,category,composition,images\n'
+            'KN-001,12GG,2/28,300GSM,knit,Wool;Cotton,product_images/a.jpg;product_images/b.jpg\n'
+            ',12GG,2/28,300GSM,Knit,,\n'
+            'KN-003,12GG,2/28,300GSM,Crochet,Silk,\n'
+            'KN-004,7GG,2/28,300GSM,Knit,,\n'
+            f'KN-005,{"G" * 51},2/28,300GSM,,,\n'
+            'KN-006,7GG,2/28,300GSM,,wool,\n'
+        ))
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.data['status'])
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(response.data['error_count'], 3)
+        self.assertEqual(response.data['errors'], [
+            {'row': 3, 'errors': {'style_number': ['This field is required.']}},
+            {'row': 4, 'errors': {'category': ['Unknown category: Crochet'], 'composition': ['Unknown composition: Silk']}},
+            {'row': 6, 'errors': {'gauge': ['Ensure this field has no more than 50 characters.']}},
+        ])
+
+        product = Product.objects.get(style_number='KN-001')
+        self.assertEqual(product.category, self.knit)
+        self.assertEqual(sorted(product.composition.values_list('material', flat=True)), ['Cotton', 'Wool'])
+        self.assertEqual(
+            sorted(product.images.values_list('image', 'image_status')),
+            [('product_images/a.jpg', ImageStatus.PENDING), ('product_images/b.jpg', ImageStatus.PENDING)]
+        )
+        # Rows of every chunk reach the facet index
+        self.assertEqual(ProductFacet.objects.filter(facet='gauge', value='7GG').count(), 2)
+
+    def test_jsonl_reports_unparseable_lines(self):
+        response = self.upload('sheet.jsonl', (
+            '{"style_number": "KN-001", "composition": ["Wool"]}\n'
+            '\n'
+            '{"style_number": \n'
+            '["KN-002"]\n'
+            '{"style_number": "KN-003", "category": "Crochet"}\n'
+        ), create_missing='true')
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [3, 4])
+        self.assertEqual(response.data['errors'][0]['errors'], {'row': ['Invalid JSON object']})
+        self.assertEqual(Product.objects.get(style_number='KN-003').category.name, 'Crochet')
+
+    def test_nothing_valid_is_rejected(self):
+        response = self.upload('sheet.csv', 'style_number,category\nKN-001,Crochet\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['created'], 0)
+        response = self.upload('sheet.csv', b'style_number\n\xff\xfe\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'], [{'row': None, 'errors': {'file': ['File is not valid UTF-8']}}])
+        self.assertFalse(Product.objects.exists())
+
+    def test_rejects_missing_file_and_unknown_format(self):
+        self.assertEqual(self.client.post('/api/admin/products/import/', {}).status_code, 400)
+        response = self.upload('sheet.xlsx', 'style_number\nKN-001\n', format='xlsx')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['message'], 'Unsupported format: xlsx')
+
+    @override_settings(PRODUCT_IMPORT={'CHUNK_SIZE': 2, 'MAX_ERRORS': 2})
+    def test_error_list_is_capped(self):
+        response = self.upload('sheet.csv', 'style_number,gauge\n' + ',12GG\n' * 5 + 'KN-001,12GG\n')
+        self.assertEqual(response.data['error_count'], 5)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3])
+
+
+class InboxFixtures:
+    """Submissions on fixed days for the inbox filter tests."""
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_superuser('admin', password='admin'))
+        self.knit, self.crochet = (
+            Product.objects.create(style_number=style_number, gauge='12GG', end='2/28', weight='300GSM')
+            for style_number in ('KN-001', 'CR-001')
+        )
+
+    def submit(self, model, name, day, is_read=False, products=()):
+        submission = model.objects.create(
+            name=name, email='buyer@example.com', subject='Samples', message='Please send', is_read=is_read
+        )
+        if products:
+            submission.items.set([InquiryItems.objects.create(product=product) for product in products])
+        model.objects.filter(id=submission.id).update(created_at=timezone.make_aware(datetime(2025, 1, day, 12)))
+        return submission
+
+
+class AdminInboxTests(InboxFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.submit(Inquiry, 'Ann', 1, is_read=True, products=[self.knit])
+        self.submit(Inquiry, 'Bob', 10, products=[self.knit, self.knit, self.crochet])
+        self.submit(Inquiry, 'Cid', 20, products=[self.crochet])
+        self.submit(Inquiry, 'Dee', 31, is_read=True)
+
+    def names(self, **params):
+        response = self.client.get('/api/admin/Inquiry/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [inquiry['name'] for inquiry in response.data['data']]
+
+    def test_newest_first_across_pages(self):
+        self.assertEqual(self.names(), ['Dee', 'Cid', 'Bob', 'Ann'])
+        # Same created_at: id breaks the tie, so no row is skipped or repeated
+        Inquiry.objects.update(created_at=timezone.make_aware(datetime(2025, 1, 5)))
+        names = []
+        response = self.client.get('/api/admin/Inquiry/', {'limit': 3})
+        while True:
+            names.extend(inquiry['name'] for inquiry in response.data['data'])
+            if response.data['next'] is None:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(sorted(names), ['Ann', 'Bob', 'Cid', 'Dee'])
+
+    def test_is_read_filter(self):
+        self.assertEqual(self.names(is_read='false'), ['Cid', 'Bob'])
+        self.assertEqual(self.names(is_read='1'), ['Dee', 'Ann'])
+
+    def test_date_range_is_inclusive(self):
+        self.assertEqual(self.names(**{'from': '2025-01-10', 'to': '2025-01-20'}), ['Cid', 'Bob'])
+        self.assertEqual(self.names(**{'from': '2025-01-11'}), ['Dee', 'Cid'])
+        self.assertEqual(self.names(to='2025-01-01'), ['Ann'])
+
+    def test_product_filter_returns_each_inquiry_once(self):
+        self.assertEqual(self.names(product=str(self.knit.id)), ['Bob', 'Ann'])
+        self.assertEqual(self.names(product=str(self.crochet.id), is_read='false', to='2025-01-15'), ['Bob'])
+
+    def test_invalid_filters(self):
+        for params in ({'is_read': 'maybe'}, {'from': '2025-13-01'}, {'product': 'KN-001'}, {'cursor': 'x'}):
+            with self.subTest(params=params):
+                response = self.client.get('/api/admin/Inquiry/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.data['status'])
+
+
+class AdminBulkTriageTests(InboxFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.ann = self.submit(ContactUs, 'Ann', 1)
+        self.bob = self.submit(ContactUs, 'Bob', 10, is_read=True)
+        self.cid = self.submit(ContactUs, 'Cid', 20)
+        self.inquiry = self.submit(Inquiry, 'Dee', 5, products=[self.knit])
+
+    def triage(self, path='/api/admin/contact-us/bulk/', **data):
+        return self.client.post(path, data, format='json')
+
+    def unread(self):
+        return sorted(ContactUs.objects.filter(is_read=False).values_list('name', flat=True))
+
+    def test_mark_by_ids(self):
+        response = self.triage(action='mark_read', ids=[str(self.ann.id), str(self.bob.id)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(self.unread(), ['Cid'])
+
+    def test_mark_by_filter(self):
+        response = self.triage(action='mark_unread', filter={'is_read': True})
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(self.unread(), ['Ann', 'Bob', 'Cid'])
+        response = self.triage(action='mark_read', filter={'from': '2025-01-02', 'to': '2025-01-20'})
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(self.unread(), ['Ann'])
+
+    def test_delete_inquiries_by_product(self):
+        self.submit(Inquiry, 'Eve', 6, products=[self.crochet])
+        response = self.triage('/api/admin/Inquiry/bulk/', action='delete', filter={'product': str(self.knit.id)})
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(list(Inquiry.objects.values_list('name', flat=True)), ['Eve'])
+        self.assertEqual(ContactUs.objects.count(), 3)
+
+    def test_product_filter_is_rejected_for_contacts(self):
+        response = self.triage(action='delete', filter={'product': str(self.knit.id)})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['message'], "The 'product' filter only applies to inquiries")
+        self.assertEqual(ContactUs.objects.count(), 3)
+
+    def test_empty_filter_values_are_rejected(self):
+        # A blank bound would otherwise match, and delete, every submission
+        for bad_filter in ({'from': ''}, {'to': ' ', 'is_read': 'false'}, {'product': None}):
+            with self.subTest(filter=bad_filter):
+                response = self.triage(action='delete', filter=bad_filter)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('filter', response.data)
+        self.assertEqual(ContactUs.objects.count(), 3)
+
+    def test_invalid_requests(self):
+        for data in (
+            {'action': 'archive', 'ids': [str(self.ann.id)]},
+            {'action': 'delete'},
+            {'action': 'delete', 'filter': {}},
+            {'action': 'delete', 'ids': [str(self.ann.id)], 'filter': {'is_read': True}},
+            {'action': 'delete', 'filter': {'name': 'Ann'}},
+            {'action': 'delete', 'filter': {'from': 'yesterday'}},
+        ):
+            with self.subTest(data=data):
+                self.assertEqual(self.triage(**data).status_code, 400)
+        self.assertEqual(ContactUs.objects.count(), 3)
@@ -1,11 +1,12 @@
 from django.urls import path
-from .views import CategoryView, SelectedSubCategoryView, ProductListCreate,ProductDetail,ComporsitionView,ContactUsView,InquiryView
+from .views import CategoryView, SelectedSubCategoryView, ProductListCreate,ProductImportView,ProductDetail,ComporsitionView,ContactUsView,InquiryView,InquiryExportView,ContactUsExportView,InquiryBulkView,ContactUsBulkView
 
 urlpatterns = [
     path('categories/', CategoryView.as_view(), name='category-get-post'),
     path('categories/<str:pk>/', CategoryView.as_view(), name='category-detail-update-delete'),
     path('subcategories/<str:pk>/', SelectedSubCategoryView.as_view(), name='subcategories-inside-category'),
     path('products/', ProductListCreate.as_view(), name='product-get-post'),
+    path('products/import/', ProductImportView.as_view(), name='product-import'),
     path('categorised-products/<uuid:pk>/', ProductListCreate.as_view(), name='get-post-products-inside-category'),# fetch product by category id
     path('products/<uuid:pk>/', ProductDetail.as_view(), name='update-delete-get_specific-product'),# get single product update delete
     path('compositions/', ComporsitionView.as_view(), name='Get-Post-compositions'),
@@ -14,6 +15,10 @@ urlpatterns = [
     path('concact-us/<uuid:pk>/', ContactUsView.as_view(), name='delete-contactus'),
     path('Inquiry/', InquiryView.as_view(), name='Get-Inquery'),
     path('Inquiry/<uuid:pk>/', InquiryView.as_view(), name='Get-Inquery'),
+    path('Inquiry/export/<str:file_format>/', InquiryExportView.as_view(), name='inquiry-export'),
+    path('Inquiry/bulk/', InquiryBulkView.as_view(), name='inquiry-bulk'),
+    path('contact-us/export/<str:file_format>/', ContactUsExportView.as_view(), name='contact-us-export'),
+    path('contact-us/bulk/', ContactUsBulkView.as_view(), name='contact-us-bulk'),
     
 
 
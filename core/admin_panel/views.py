@@ -1,9 +1,10 @@
 from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status
-from .serializers import AdminCategorySerializer, AdminProductSerializer, AdminSubCategorySerializer,CompositionSerializer
-from django.http import Http404
+from rest_framework import serializers, status
+from .serializers import AdminCategorySerializer, AdminProductSerializer, AdminSubCategorySerializer,CompositionSerializer,AdminInquirySerializer,BulkTriageSerializer
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
 from api.models import Category, Product, Composition,ContactUs,Inquiry
 from api.serializers import ContactUsSerializer, InquirySerializer
 
@@ -16,8 +17,13 @@ from rest_framework import permissions
 from rest_framework import viewsets
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 import json
-from django.core.cache import cache
-from api.views import CategoryList
+from api.instrumentation import timed
+from api.services import export_service
+from api.services.inbox_service import filter_submissions
+from api.services.inquiry_service import inquiries_with_items
+from api.pagination import InboxPaginator, InvalidCursor, KeysetPaginator
+from api.services.import_service import FORMATS as IMPORT_FORMATS, ProductImporter, detect_format
+from django.conf import settings
 
 class SelectedSubCategoryView(APIView):
     '''
@@ -167,11 +173,6 @@ class CategoryView(APIView):
 
     parser_classes = (MultiPartParser, FormParser, JSONParser)
 
-    def invalidate_category_cache(self):
-        """Helper method to invalidate category cache"""
-        cache_key = CategoryList.get_cache_key(CategoryList())
-        cache.delete(cache_key)
-
     def get(self, request):
         """
         Retrieve a list of all categories.
@@ -180,7 +181,7 @@ class CategoryView(APIView):
             Response: A list of categories with HTTP status 200.
         """
         try:
-            categories = Category.objects.all()
+            categories = Category.objects.prefetch_related('subcategories')
             serializer = AdminCategorySerializer(categories, many=True)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Exception as e:
@@ -199,7 +200,6 @@ class CategoryView(APIView):
         serializer = AdminCategorySerializer(data=request.data)
         if serializer.is_valid():
             serializer.save()
-            self.invalidate_category_cache()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -237,7 +237,6 @@ class CategoryView(APIView):
         serializer = AdminCategorySerializer(category, data=data, partial=True)
         if serializer.is_valid():
             serializer.save()
-            self.invalidate_category_cache()
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -254,7 +253,6 @@ class CategoryView(APIView):
         try:
             category = Category.objects.get(pk=pk)
             category.delete()
-            self.invalidate_category_cache()
             return Response(
                 {
                     'status': True,
@@ -287,26 +285,107 @@ class ProductListCreate(APIView):
     """
     permission_classes = [permissions.IsAuthenticated]
 
-    def invalidate_product_cache(self):
-        """Helper method to invalidate product cache"""
-        cache.delete('product_list')
+    sort_fields = ('style_number', 'gauge', 'end', 'weight', 'id')
 
     def get(self, request, pk=None):
+        """
+        A page of products.
+
+        Query params:
+        - fields, exclude: columns to return, e.g. fields=id,style_number,image
+        - sort: one of sort_fields, prefixed with '-' for descending
+          (default: style_number)
+        - cursor, limit: keyset pagination
+        """
+        try:
+            fields = AdminProductSerializer.select_fields(request.query_params)
+        except serializers.ValidationError as e:
+            return Response(
+                {'status': False, 'message': 'Invalid field selection', 'errors': e.detail},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        sort = request.query_params.get('sort', 'style_number')
+        if sort.lstrip('-') not in self.sort_fields:
+            return Response(
+                {'status': False, 'message': f'Cannot sort by {sort}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        descending = '-' if sort.startswith('-') else ''
+        ordering = [sort] if sort.lstrip('-') == 'id' else [sort, f'{descending}id']
+
+        products = Product.objects.all()
         if pk:
-            products = Product.objects.filter(category_id=pk)
-        else:
-            products = Product.objects.all()
-        serializer = AdminProductSerializer(products, many=True)
-        return Response(serializer.data)
+            products = products.filter(category_id=pk)
+        products = AdminProductSerializer.narrow_queryset(
+            products, fields, columns=[field.lstrip('-') for field in ordering]
+        )
+
+        try:
+            paginator = KeysetPaginator(request, ordering=ordering)
+            page = paginator.paginate_queryset(products)
+        except InvalidCursor as e:
+            return Response({'status': False, 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        with timed('serializer'):
+            data = AdminProductSerializer(page, many=True, fields=fields).data
+        return Response({
+            'status': True,
+            'message': 'Products fetched successfully',
+            'data': data,
+            **paginator.get_pagination_data()
+        }, status=status.HTTP_200_OK)
 
     def post(self, request):
         serializer = AdminProductSerializer(data=request.data)
         if serializer.is_valid():
             serializer.save()
-            self.invalidate_product_cache()  # Clear cache after creation
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class ProductImportView(APIView):
+    """
+    Bulk import products from a line sheet.
+
+    post: multipart upload with `file` (.csv or .jsonl) and optional
+    `format` ("csv"/"jsonl") and `create_missing` ("true" creates unknown
+    categories, sub-categories and compositions instead of rejecting the row).
+    Relations are given by name; see api.services.import_service for columns.
+
+    Returns the number of created products and per-row errors.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = (MultiPartParser, FormParser)
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {'status': False, 'message': 'No file uploaded'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        file_format = request.data.get('format') or detect_format(upload.name)
+        if file_format not in IMPORT_FORMATS:
+            return Response(
+                {'status': False, 'message': f'Unsupported format: {file_format}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        config = getattr(settings, 'PRODUCT_IMPORT', {})
+        importer = ProductImporter(
+            chunk_size=config.get('CHUNK_SIZE', 500),
+            create_missing=str(request.data.get('create_missing', '')).lower() in ('1', 'true'),
+            max_errors=config.get('MAX_ERRORS', 1000),
+        )
+        importer.run(upload, file_format)
+        return Response(
+            {
+                'status': importer.error_count == 0,
+                'message': f'{importer.created} products imported',
+                **importer.summary()
+            },
+            status=status.HTTP_201_CREATED if importer.created else status.HTTP_400_BAD_REQUEST
+        )
+
 class ProductDetail(APIView):
     """
     API view to handle the details of a single product.
@@ -323,12 +402,6 @@ class ProductDetail(APIView):
     
     permission_classes = [permissions.IsAuthenticated]
 
-    def invalidate_product_cache(self, pk=None):
-        """Helper method to invalidate product cache"""
-        cache.delete('product_list')
-        if pk:
-            cache.delete(f'product_detail_{pk}')
-
     def get_object(self, pk):
         try:
             return Product.objects.get(pk=pk)
@@ -345,14 +418,12 @@ class ProductDetail(APIView):
         serializer = AdminProductSerializer(product, data=request.data)
         if serializer.is_valid():
             serializer.save()
-            self.invalidate_product_cache(pk)  # Clear both caches
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, pk):
         product = self.get_object(pk)
         product.delete()
-        self.invalidate_product_cache(pk)  # Clear both caches
         return Response(
             {'message': 'Product deleted successfully'},
             status=status.HTTP_204_NO_CONTENT
@@ -394,29 +465,43 @@ class InquiryView(APIView):
         
         Parameters:
         - inquiry_id: Optional. If provided, fetch the specific inquiry.
+        - is_read, from, to, product: list filters (see api.services.inbox_service)
+        - cursor, limit: keyset pagination, newest first
         
         Returns:
-        - Success: Inquiry details or list of inquiries
+        - Success: Inquiry details or a page of inquiries
         - Error: Inquiry not found
         """
         if pk:
             # Fetch a specific inquiry
-            inquiry = get_object_or_404(Inquiry, id=pk)
-            serializer = InquirySerializer(inquiry)
+            inquiry = get_object_or_404(inquiries_with_items(), id=pk)
+            serializer = AdminInquirySerializer(inquiry)
             return Response({
                 "status": True,
                 "message": "Inquiry details fetched successfully",
                 "data": serializer.data
             }, status=status.HTTP_200_OK)
-        else:
-            # Fetch all inquiries
-            inquiries = Inquiry.objects.all()
-            serializer = InquirySerializer(inquiries, many=True)
+
+        # Fetch a page of inquiries; items and their products are prefetched
+        # for the whole page, so the query count does not grow with it
+        try:
+            paginator = InboxPaginator(request)
+            inquiries = filter_submissions(inquiries_with_items(), request.query_params)
+            page = paginator.paginate_queryset(inquiries)
+        except (InvalidCursor, ValueError) as e:
             return Response({
-                "status": True,
-                "message": "All inquiries fetched successfully",
-                "data": serializer.data
-            }, status=status.HTTP_200_OK)
+                "status": False,
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        with timed('serializer'):
+            data = AdminInquirySerializer(page, many=True).data
+        return Response({
+            "status": True,
+            "message": "All inquiries fetched successfully",
+            "data": data,
+            **paginator.get_pagination_data()
+        }, status=status.HTTP_200_OK)
 
     def delete(self, request, pk):
         """
@@ -435,6 +520,106 @@ class InquiryView(APIView):
             "status": True,
             "message": "Inquiry deleted successfully"
         }, status=status.HTTP_204_NO_CONTENT)
-        
-  
-    
\ No newline at end of file
+
+
+class ExportView(APIView):
+    """
+    Stream every row of a model as CSV or NDJSON.
+
+    get: /export/<csv|ndjson>/?from=YYYY-MM-DD&to=YYYY-MM-DD (both optional,
+    inclusive). Rows are read in chunks and written as they are produced,
+    so memory stays flat however many rows are exported.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    export_name = None
+    fields = ()
+    # Callable (start, end, chunk_size) -> iterable of row dicts with `fields`
+    row_source = None
+
+    def get(self, request, file_format):
+        if file_format not in export_service.FORMATS:
+            return Response(
+                {'status': False, 'message': f'Unsupported format: {file_format}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            start, end = export_service.parse_date_range(
+                request.query_params.get('from'), request.query_params.get('to')
+            )
+        except ValueError as e:
+            return Response({'status': False, 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        chunk_size = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+        response = StreamingHttpResponse(
+            export_service.stream_export(self.row_source(start, end, chunk_size), self.fields, file_format),
+            content_type=export_service.FORMATS[file_format]
+        )
+        response['Content-Disposition'] = f'attachment; filename="{self.export_name}.{file_format}"'
+        return response
+
+
+class InquiryExportView(ExportView):
+    """Inquiries with the style numbers of their products."""
+    export_name = 'inquiries'
+    fields = export_service.INQUIRY_FIELDS
+    row_source = staticmethod(export_service.iter_inquiries)
+
+
+class ContactUsExportView(ExportView):
+    """Contact form submissions."""
+    export_name = 'contact-us'
+    fields = export_service.CONTACT_FIELDS
+    row_source = staticmethod(export_service.iter_contacts)
+
+
+class BulkTriageView(APIView):
+    """
+    Mark read, mark unread or delete many submissions in one statement.
+
+    post: {"action": "mark_read" | "mark_unread" | "delete", "ids": [...]}
+    or {"action": ..., "filter": {"is_read": "false", "from": "2025-01-01", ...}}
+    with the same filters as the inbox listing.
+
+    Returns the number of affected submissions.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    model = None
+
+    def post(self, request):
+        serializer = BulkTriageSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        action = serializer.validated_data['action']
+
+        queryset = self.model.objects.all()
+        if 'ids' in serializer.validated_data:
+            queryset = queryset.filter(id__in=serializer.validated_data['ids'])
+        else:
+            try:
+                queryset = filter_submissions(queryset, serializer.validated_data['filter'])
+            except ValueError as e:
+                return Response({'status': False, 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if action == 'delete':
+            # Only ids are needed to cascade; count the submissions
+            # themselves, not the M2M rows
+            _, deleted = queryset.only('id').delete()
+            count = deleted.get(self.model._meta.label, 0)
+        else:
+            count = queryset.update(is_read=action == 'mark_read', updated_at=timezone.now())
+
+        return Response({
+            'status': True,
+            'message': f'{count} submissions updated' if action != 'delete' else f'{count} submissions deleted',
+            'action': action,
+            'count': count
+        }, status=status.HTTP_200_OK)
+
+
+class InquiryBulkView(BulkTriageView):
+    model = Inquiry
+
+
+class ContactUsBulkView(BulkTriageView):
+    model = ContactUs
+
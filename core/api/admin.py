@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import Product, ProductImage, Composition, ContactUs, Inquiry, InquiryItems, Category, SubCategory
+from .models import Product, ProductImage, Composition, ContactUs, Inquiry, InquiryItems, Category, SubCategory, EmailOutbox
 
 class InquiryItemsInline(admin.TabularInline):
     model = Inquiry.items.through
@@ -28,6 +28,12 @@ admin.site.register(ContactUs)
 admin.site.register(Category)
 admin.site.register(SubCategory)
 
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status']
+    readonly_fields = ['created_at', 'sent_at']
+
 
 
 
@@ -7,3 +7,12 @@ class ApiConfig(AppConfig):
 
     def ready(self):
         import api.signals  # Import the signals
+        from django.db.models.signals import post_migrate
+        from api.search import create_search_index
+
+        # The FTS5 table is not a Django model, so create it after migrate
+        post_migrate.connect(
+            lambda using, **kwargs: create_search_index(using),
+            sender=self,
+            weak=False
+        )
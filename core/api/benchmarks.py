@@ -0,0 +1,223 @@
+"""
+Micro-benchmarks for the catalog and inquiry hot paths.
+
+run_tier() seeds the current (throwaway) database and times each case, recording wall time, query count and peak Python memory. Used by the
+`benchmark` management command, which writes the results as JSON so runs on
+different commits can be diffed.
+"""
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import time
+import tracemalloc
+from io import BytesIO
+from unittest import mock
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+from .models import Category, Composition, Inquiry, InquiryItems, Product, SubCategory
+from .serializers import InquiryCreateSerializer
+from .services.image_service import get_optimization_options, optimize_image_bytes
+
+
+TIERS = {'1k': 1_000, '10k': 10_000, '100k': 100_000}
+
+GAUGES = ['7GG', '12GG', '14GG', '16GG']
+ENDS = ['Single', 'Double', 'Triple']
+WEIGHTS = ['150GSM', '180GSM', '200GSM', '220GSM', '250GSM']
+
+
+def seed_catalog(product_count, seed=0, chunk_size=5000):
+    """
+    Deterministic catalog of `product_count` products plus one inquiry per
+    ten products. bulk_create skips signals, so no search/facet indexing or
+    image processing happens; none of the benchmarked paths need them.
+    """
+    rng = random.Random(seed)
+    categories = Category.objects.bulk_create([Category(name=f'Category {i}') for i in range(10)])
+    subcategories = SubCategory.objects.bulk_create([SubCategory(name=f'Sub {i}') for i in range(30)])
+    Category.subcategories.through.objects.bulk_create([
+        Category.subcategories.through(category_id=category.id, subcategory_id=sub.id)
+        for i, category in enumerate(categories) for sub in subcategories[i * 3:i * 3 + 3]
+    ])
+    compositions = Composition.objects.bulk_create([Composition(material=f'Material {i}') for i in range(30)])
+
+    product_ids = []
+    Through = Product.composition.through
+    for start in range(0, product_count, chunk_size):
+        products = []
+        for i in range(start, min(start + chunk_size, product_count)):
+            category = rng.randrange(len(categories))
+            products.append(Product(
+                style_number=f'STY-{i:06d}',
+                gauge=rng.choice(GAUGES),
+                end=rng.choice(ENDS),
+                weight=rng.choice(WEIGHTS),
+                description=f'Benchmark product {i}',
+                category=categories[category],
+                sub_category=subcategories[category * 3 + rng.randrange(3)],
+                image=f'product_images/bench-{i}.jpg',
+            ))
+        Product.objects.bulk_create(products)
+        Through.objects.bulk_create([
+            Through(product_id=product.id, composition_id=composition.id)
+            for product in products for composition in rng.sample(compositions, 2)
+        ])
+        product_ids.extend(product.id for product in products)
+
+    inquiries = []
+    items = []
+    links = []
+    for i in range(product_count // 10):
+        inquiry = Inquiry(name=f'Buyer {i}', email=f'buyer{i}@example.com', subject='Samples', message='Please send')
+        inquiries.append(inquiry)
+        for product_id in rng.sample(product_ids, 3):
+            item = InquiryItems(product_id=product_id)
+            items.append(item)
+            links.append(Inquiry.items.through(inquiry_id=inquiry.id, inquiryitems_id=item.id))
+    Inquiry.objects.bulk_create(inquiries, batch_size=chunk_size)
+    InquiryItems.objects.bulk_create(items, batch_size=chunk_size)
+    Inquiry.items.through.objects.bulk_create(links, batch_size=chunk_size)
+    return product_ids
+
+
+def sample_image_bytes(width=2400, height=1600):
+    """A photo-sized JPEG upload; gradients keep the encoder honest."""
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    output = BytesIO()
+    image.save(output, format='JPEG', quality=95)
+    return output.getvalue()
+
+
+class QueryCounter:
+    """
+    Counts executed queries. Unlike CaptureQueriesContext it is not reset
+    by the request_started signal of in-process test client requests.
+    """
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(func, iterations, setup=None):
+    """
+    Time `func` `iterations` times after one warm-up call, then run it once
+    more under tracemalloc. `setup` runs before every call, untimed.
+    """
+    def call():
+        if setup is not None:
+            setup()
+        return func()
+
+    call()
+    timings = []
+    queries = QueryCounter()
+    with connection.execute_wrapper(queries):
+        for _ in range(iterations):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'iterations': iterations,
+        'wall_ms': {
+            'min': round(timings[0], 3),
+            'median': round(statistics.median(timings), 3),
+            'p95': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+            'mean': round(statistics.fmean(timings), 3),
+        },
+        'queries': queries.count // iterations,
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def benchmark_cases(product_ids, rng):
+    """{name: (func, setup)} for one seeded database."""
+    client = APIClient()
+    admin = get_user_model().objects.create_user('benchmark', password='benchmark')
+    admin_client = APIClient()
+    admin_client.force_authenticate(admin)
+    image_data = sample_image_bytes()
+    image_options = get_optimization_options()
+
+    def check(response):
+        assert response.status_code == 200, response.status_code
+        return response
+
+    def create_inquiry():
+        serializer = InquiryCreateSerializer(data={
+            'name': 'Buyer', 'email': 'buyer@example.com', 'subject': 'Samples', 'message': 'Please send',
+            'items': [str(pk) for pk in rng.sample(product_ids, 5)],
+        })
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+    # Cleared before every call to measure the uncached path
+    cold = cache.clear
+    return {
+        'product_list': (lambda: check(client.get('/api/products/', {'limit': 20})), cold),
+        'product_list_cached': (lambda: check(client.get('/api/products/', {'limit': 20})), None),
+        'product_detail': (lambda: check(client.get(f'/api/products/{rng.choice(product_ids)}/')), cold),
+        'category_list': (lambda: check(client.get('/api/categories/')), cold),
+        'inquiry_create': (create_inquiry, None),
+        'admin_inquiry_list': (lambda: check(admin_client.get('/api/admin/Inquiry/', {'limit': 50})), cold),
+        'optimize_image': (lambda: optimize_image_bytes(image_data, image_options), None),
+    }
+
+
+def run_tier(product_count, iterations=20, seed=0):
+    start = time.perf_counter()
+    product_ids = seed_catalog(product_count, seed=seed)
+    seed_seconds = time.perf_counter() - start
+
+    rng = random.Random(seed)
+    results = {}
+    # The benchmark client would otherwise run into the anonymous rate limit
+    with mock.patch.object(APIView, 'throttle_classes', []):
+        for name, (func, setup) in benchmark_cases(product_ids, rng).items():
+            # Image encoding takes ~100x longer than a request
+            count = max(3, iterations // 5) if name == 'optimize_image' else iterations
+            results[name] = measure(func, count, setup)
+    cache.clear()
+    return {'products': product_count, 'seed_seconds': round(seed_seconds, 2), 'benchmarks': results}
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'sqlite': sqlite3.sqlite_version if connection.vendor == 'sqlite' else None,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+    }
@@ -0,0 +1,236 @@
+import hashlib
+import time
+from contextlib import nullcontext
+from functools import wraps
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+
+from .db_routing import get_routing_config, read_from_primary
+from .instrumentation import record_cache
+
+
+RESPONSE_CACHE_PREFIX = 'response_cache'
+
+# Collection tags of every model a response can embed. Every write bumps
+# its model's collection tag as well as the instance tag (api.signals), so
+# these cover the per-entity tags a handler only reports after rendering.
+GUARD_TAGS = ('product', 'productimage', 'category', 'subcategory', 'composition')
+
+
+# Catalog cache tags
+#
+# Every cached response records the tags it depends on, e.g. 'product' (any
+# change to the set of products) or 'category:<id>' (one category). Each tag
+# has a version token; a cached response is only served while all of its
+# tags still carry the versions seen when it was stored. Model signals in
+# api.signals bump tags, so writers never need to know cache keys.
+
+def instance_tag(instance):
+    return f'{instance._meta.model_name}:{instance.pk}'
+
+
+def collection_tag(model):
+    return model._meta.model_name
+
+
+def product_tags(product, detail=False, fields=None):
+    """
+    Tags for everything a serialized product embeds. `fields` are the
+    rendered fields when the client asked for a sparse fieldset.
+
+    Relies on the rendered relations (composition, and for detail, images
+    and category subcategories) being prefetched.
+    """
+    def rendered(name, default=True):
+        return default if fields is None else name in fields
+
+    tags = {instance_tag(product)}
+    if product.category_id:
+        tags.add(f'category:{product.category_id}')
+    if product.sub_category_id:
+        tags.add(f'subcategory:{product.sub_category_id}')
+    if rendered('composition'):
+        tags.update(instance_tag(composition) for composition in product.composition.all())
+    if rendered('images', detail):
+        tags.update(instance_tag(image) for image in product.images.all())
+    if detail and rendered('category') and product.category_id:
+        tags.update(instance_tag(sub) for sub in product.category.subcategories.all())
+    return tags
+
+
+def _tag_key(tag):
+    return f'{RESPONSE_CACHE_PREFIX}:tag:{tag}'
+
+
+def _new_version():
+    # Prefixed with the time of the change, see changed_at()
+    return f'{time.time():.3f}:{uuid4().hex}'
+
+
+def changed_at(versions):
+    """
+    When the most recent of these tag versions was set. Versions in an
+    unknown format count as just changed.
+    """
+    latest = 0.0
+    for version in versions.values():
+        try:
+            latest = max(latest, float(version.split(':', 1)[0]))
+        except ValueError:
+            return time.time()
+    return latest
+
+
+def get_tag_versions(tags):
+    """
+    Current version token of each tag. Unknown (or evicted) tags get a fresh
+    token, so entries stored against them can never match again.
+    """
+    keys = {_tag_key(tag): tag for tag in tags}
+    found = cache.get_many(keys.keys())
+    missing = {key: _new_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return {keys[key]: version for key, version in found.items()}
+
+
+def bump_cache_tags(*tags):
+    """
+    Invalidate every cached response that depends on any of `tags`.
+
+    Called by model signals; call it directly after bulk writes such as
+    QuerySet.update() or bulk_create(), which do not send signals.
+    """
+    cache.set_many({_tag_key(tag): _new_version() for tag in tags}, timeout=None)
+
+
+def build_response_cache_key(request):
+    query = sorted(request.GET.lists())
+    # Bodies embed absolute URLs (images, pagination links)
+    raw = '|'.join([
+        request.scheme,
+        request.get_host(),
+        request.path,
+        repr(query),
+        request.META.get('HTTP_ACCEPT', ''),
+    ])
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'{RESPONSE_CACHE_PREFIX}:{digest}'
+
+
+def cache_response(tags=(), timeout=300, statuses=(200,)):
+    """
+    Cache the rendered body of an APIView GET handler.
+
+    The key covers scheme, host, path, query string and Accept header. A hit
+    is returned as plain bytes without running the handler, so no ORM or
+    serializer work is done. Only responses whose status is in `statuses`
+    are stored.
+
+    The entry depends on the static `tags` plus any `cache_tags` the handler
+    sets on its response. Responses rendered while a catalog write landed
+    are returned but not stored.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = build_response_cache_key(request)
+            cached = cache.get(key)
+            if cached is not None:
+                versions, status_code, content_type, body = cached
+                if get_tag_versions(versions) != versions:
+                    cached = None
+            record_cache(hit=cached is not None)
+            if cached is not None:
+                return HttpResponse(body, status=status_code, content_type=content_type)
+
+            # Read versions before the queries run, so a write that lands
+            # while rendering leaves the entry stale rather than poisoned
+            versions = get_tag_versions(tags)
+            guard = get_tag_versions(GUARD_TAGS)
+            # A replica may not have a recent catalog write yet, and an entry
+            # filled from it would be stored (and ETagged) under the new
+            # versions, so fills within the replication lag use the primary
+            config = get_routing_config()
+            recent = config['REPLICAS'] and \
+                time.time() - changed_at({**versions, **guard}) < config['STICKY_SECONDS']
+            with read_from_primary() if recent else nullcontext():
+                response = view_method(self, request, *args, **kwargs)
+            if response.status_code not in statuses:
+                return response
+
+            response = self.finalize_response(request, response, *args, **kwargs)
+            response.render()
+            dynamic_tags = set(getattr(response, 'cache_tags', ())) - versions.keys()
+            if dynamic_tags:
+                versions.update(get_tag_versions(dynamic_tags))
+            # The per-entity tags are only known now. If no collection tag
+            # moved since before the handler ran, nothing was written in
+            # between and those versions predate the queries; otherwise the
+            # body may mix old and new data, so it is not stored.
+            if get_tag_versions(GUARD_TAGS) != guard:
+                return response
+            cache.set(
+                key,
+                (versions, response.status_code, response['Content-Type'], response.content),
+                timeout
+            )
+            return response
+        return wrapper
+    return decorator
+
+
+def catalog_etag(request, tags):
+    """
+    Strong ETag for a catalog representation: the response cache key plus the
+    current versions of the tags the content depends on.
+    """
+    versions = get_tag_versions(tags)
+    raw = build_response_cache_key(request) + repr(sorted(versions.items()))
+    return '"%s"' % hashlib.md5(raw.encode()).hexdigest()
+
+
+def get_cache_control():
+    config = getattr(settings, 'CATALOG_HTTP_CACHE', {})
+    return {
+        'public': True,
+        'max_age': config.get('MAX_AGE', 60),
+        'stale_while_revalidate': config.get('STALE_WHILE_REVALIDATE', 300),
+    }
+
+
+def conditional_response(tags):
+    """
+    ETag / If-None-Match support for an APIView GET handler.
+
+    The ETag is derived from tag versions only, so a matching request is
+    answered with 304 before the handler (or the response cache) runs.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            etag = catalog_etag(request, tags)
+            cache_control = get_cache_control()
+
+            if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+            if if_none_match:
+                client_etags = parse_etags(if_none_match)
+                if etag in client_etags or '*' in client_etags:
+                    response = HttpResponseNotModified()
+                    response['ETag'] = etag
+                    patch_cache_control(response, **cache_control)
+                    return response
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+                patch_cache_control(response, **cache_control)
+            return response
+        return wrapper
+    return decorator
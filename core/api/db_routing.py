@@ -0,0 +1,109 @@
+"""
+Primary/replica database routing.
+
+Safe (GET/HEAD/OPTIONS) requests to the views in
+settings.DATABASE_ROUTING['READ_VIEW_MODULES'] read from one of the
+configured replicas; everything else, including every write, uses the
+primary ('default'). Without replicas all traffic stays on the primary.
+
+STICKY_SECONDS is the assumed upper bound on replication lag. A client
+that has just written keeps reading from the primary that long
+(read-your-writes). Clients are told apart by their Authorization header,
+i.e. the admin's JWT, and the pin is kept in the cache so it holds across
+server processes sharing a cache. The response cache (api.cache) likewise
+fills from the primary for that long after a catalog write.
+"""
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# The replica alias reads go to during the current request, if any
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def get_routing_config():
+    config = getattr(settings, 'DATABASE_ROUTING', {})
+    return {
+        'REPLICAS': list(config.get('REPLICAS', [])),
+        'READ_VIEW_MODULES': tuple(config.get('READ_VIEW_MODULES', ())),
+        'STICKY_SECONDS': config.get('STICKY_SECONDS', 15),
+    }
+
+
+@contextmanager
+def read_from_primary():
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def _pin_key(request):
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if not authorization:
+        return None
+    return 'db-pin:' + hashlib.sha256(authorization.encode()).hexdigest()
+
+
+class PrimaryReplicaRouter:
+    """Reads follow the request's replica; writes always go to the primary."""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold copies of the same rows
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReadReplicaMiddleware:
+    """
+    Pick the database a request reads from, and pin clients to the primary
+    after a successful write.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _read_alias.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+
+        config = get_routing_config()
+        if config['REPLICAS'] and request.method not in SAFE_METHODS and response.status_code < 400:
+            key = _pin_key(request)
+            if key is not None:
+                cache.set(key, True, timeout=config['STICKY_SECONDS'])
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        config = get_routing_config()
+        if not config['REPLICAS'] or request.method not in SAFE_METHODS:
+            return None
+        view_class = getattr(view_func, 'view_class', view_func)
+        if not view_class.__module__.startswith(config['READ_VIEW_MODULES']):
+            return None
+        key = _pin_key(request)
+        if key is not None and cache.get(key):
+            return None
+        # One replica per request, so a response never mixes two of them
+        _read_alias.set(random.choice(config['REPLICAS']))
+        return None
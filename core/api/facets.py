@@ -0,0 +1,184 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Product, ProductFacet, FacetCount
+
+
+FACETS = ('category', 'sub_category', 'gauge', 'end', 'weight', 'composition')
+
+
+def product_facet_values(product):
+    """
+    {(facet, value): label} for one product. Relies on category, sub_category
+    and composition being loaded or cheap to fetch.
+    """
+    values = {}
+    if product.category_id:
+        values[('category', str(product.category_id))] = product.category.name
+    if product.sub_category_id:
+        values[('sub_category', str(product.sub_category_id))] = product.sub_category.name
+    for facet in ('gauge', 'end', 'weight'):
+        value = getattr(product, facet)
+        if value:
+            values[(facet, value)] = value
+    for composition in product.composition.all():
+        values[('composition', str(composition.id))] = composition.material
+    return values
+
+
+def _adjust_counts(deltas, labels):
+    if not deltas:
+        return
+    FacetCount.objects.bulk_create(
+        [FacetCount(facet=facet, value=value, label=labels.get((facet, value), value))
+         for (facet, value), delta in deltas.items() if delta > 0],
+        ignore_conflicts=True
+    )
+    for (facet, value), delta in deltas.items():
+        FacetCount.objects.filter(facet=facet, value=value).update(count=F('count') + delta)
+
+
+@transaction.atomic
+def sync_product_facets(product_ids):
+    """
+    Bring the facet index and counts of the given products up to date by
+    diffing their current facet values against the indexed ones.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    products = Product.objects.select_related('category', 'sub_category') \
+        .prefetch_related('composition').in_bulk(product_ids)
+
+    indexed = defaultdict(set)
+    for product_id, facet, value in ProductFacet.objects.filter(
+            product_id__in=product_ids).values_list('product_id', 'facet', 'value'):
+        indexed[product_id].add((facet, value))
+
+    deltas = defaultdict(int)
+    labels = {}
+    to_delete = []
+    to_create = []
+    for product_id in set(indexed) | set(products):
+        current = product_facet_values(products[product_id]) if product_id in products else {}
+        labels.update(current)
+        for key in indexed[product_id] - current.keys():
+            deltas[key] -= 1
+            to_delete.append((product_id, key))
+        for key in current.keys() - indexed[product_id]:
+            deltas[key] += 1
+            to_create.append(ProductFacet(product_id=product_id, facet=key[0], value=key[1]))
+
+    for product_id, (facet, value) in to_delete:
+        ProductFacet.objects.filter(product_id=product_id, facet=facet, value=value).delete()
+    ProductFacet.objects.bulk_create(to_create)
+    _adjust_counts({key: delta for key, delta in deltas.items() if delta}, labels)
+
+
+def remove_product_facets(product_id):
+    """
+    Decrement counts for a product about to be deleted; its index rows go
+    with it through the cascade.
+    """
+    deltas = {
+        key: -1 for key in ProductFacet.objects.filter(
+            product_id=product_id).values_list('facet', 'value')
+    }
+    _adjust_counts(deltas, {})
+
+
+def update_facet_label(facet, value, label):
+    FacetCount.objects.filter(facet=facet, value=str(value)).update(label=label)
+
+
+@transaction.atomic
+def rebuild_facet_index(chunk_size=2000):
+    """
+    Rebuild the facet index and counts from scratch. Returns the product count.
+    """
+    ProductFacet.objects.all().delete()
+    FacetCount.objects.all().delete()
+    counts = defaultdict(int)
+    labels = {}
+    total = 0
+    batch = []
+    products = Product.objects.select_related('category', 'sub_category') \
+        .prefetch_related('composition').order_by('id')
+    for product in products.iterator(chunk_size=chunk_size):
+        total += 1
+        values = product_facet_values(product)
+        labels.update(values)
+        for facet, value in values:
+            counts[(facet, value)] += 1
+            batch.append(ProductFacet(product_id=product.id, facet=facet, value=value))
+        if len(batch) >= chunk_size:
+            ProductFacet.objects.bulk_create(batch)
+            batch = []
+    ProductFacet.objects.bulk_create(batch)
+    FacetCount.objects.bulk_create(
+        [FacetCount(facet=facet, value=value, label=labels[(facet, value)], count=count)
+         for (facet, value), count in counts.items()],
+        batch_size=chunk_size
+    )
+    return total
+
+
+def parse_facet_filters(query_params):
+    """
+    {facet: [values]} from query params. Values may be repeated or comma
+    separated; values of one facet are OR-ed, facets are AND-ed.
+    """
+    filters = {}
+    for facet in FACETS:
+        values = []
+        for raw in query_params.getlist(facet):
+            values.extend(v.strip() for v in raw.split(',') if v.strip())
+        if values:
+            filters[facet] = values
+    return filters
+
+
+def filter_products(queryset, filters):
+    for facet, values in filters.items():
+        queryset = queryset.filter(id__in=ProductFacet.objects.filter(
+            facet=facet, value__in=values).values('product_id'))
+    return queryset
+
+
+def get_facet_counts(filters):
+    """
+    Per-facet value counts for a filtered listing.
+
+    Counts for a facet ignore that facet's own filter, so buyers can widen a
+    selection. When no other facet is filtered the precomputed FacetCount
+    rows are used as-is; otherwise the narrow facet index is grouped over the
+    matching products.
+    """
+    rows = FacetCount.objects.filter(count__gt=0).values_list('facet', 'value', 'label', 'count')
+    labels = {}
+    global_counts = defaultdict(dict)
+    for facet, value, label, count in rows:
+        labels[(facet, value)] = label
+        global_counts[facet][value] = count
+
+    result = {}
+    for facet in FACETS:
+        others = {f: v for f, v in filters.items() if f != facet}
+        if not others:
+            counts = global_counts[facet]
+        else:
+            matching = filter_products(Product.objects.all(), others).values('id')
+            counts = dict(
+                ProductFacet.objects.filter(facet=facet, product_id__in=matching)
+                .values('value').annotate(count=Count('id')).values_list('value', 'count')
+            )
+        result[facet] = sorted(
+            [
+                {'value': value, 'label': labels.get((facet, value), value), 'count': count}
+                for value, count in counts.items()
+            ],
+            key=lambda item: (-item['count'], item['label'])
+        )
+    return result
@@ -0,0 +1,200 @@
+"""
+Fast read path for the hot public list endpoints.
+
+The row serializers here render the same JSON as ProductSerializer and
+CategorySerializer, but from values() rows instead of model instances and
+DRF fields. The field list (and its order) is taken from the DRF serializer,
+so sparse fieldsets behave identically; for each field an extractor is
+compiled once per serializer instance, and relations are loaded with one
+values() query per relation for the whole page.
+
+api/tests.py checks that both paths produce identical output.
+"""
+from collections import defaultdict
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+
+from .models import Category, Product
+from .serializers import CategorySerializer, ProductImageSerializer, ProductSerializer
+from .services.image_service import rendition_urls
+
+
+def file_url(name, request=None):
+    """What DRF's FileField/ImageField render for a stored file name."""
+    if not name:
+        return None
+    url = default_storage.url(name)
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+class RowSerializer:
+    """
+    Base class: subclasses define `serializer_class` (the DRF serializer whose
+    output is reproduced) and, for every field it can render, the values()
+    columns it reads in `field_columns` and an `extract_<field>` method
+    returning `fn(row, related)`. Fields backed by another table list a
+    `load_<field>(ids)` loader instead of columns.
+    """
+    serializer_class = None
+    field_columns = {}
+
+    def __init__(self, fields=None, request=None):
+        self.request = request
+        self.field_names = list(self.serializer_class(fields=fields).fields)
+        columns = ['id']
+        self.loaders = {}
+        self.extractors = []
+        for name in self.field_names:
+            extract = getattr(self, f'extract_{name}', None)
+            if extract is None:
+                raise ImproperlyConfigured(f'{type(self).__name__} cannot render {name!r}')
+            columns.extend(c for c in self.field_columns.get(name, ()) if c not in columns)
+            loader = getattr(self, f'load_{name}', None)
+            if loader is not None:
+                self.loaders[name] = loader
+            self.extractors.append((name, extract()))
+        self.columns = columns
+
+    def values(self, queryset):
+        return queryset.values(*self.columns)
+
+    def load_related(self, rows):
+        ids = [row['id'] for row in rows]
+        return {name: loader(ids) for name, loader in self.loaders.items()} if ids else {}
+
+    def to_representation(self, rows, related=None):
+        """
+        Render values() rows fetched with `self.values()`. Pass the result of
+        load_related() when the caller needs the relations too.
+        """
+        rows = list(rows)
+        if related is None:
+            related = self.load_related(rows)
+        extractors = self.extractors
+        return [{name: extract(row, related) for name, extract in extractors} for row in rows]
+
+    # Shared extractors
+
+    def extract_id(self):
+        return lambda row, related: str(row['id'])
+
+    def extract_image(self):
+        request = self.request
+        return lambda row, related: file_url(row['image'], request)
+
+    def extract_renditions(self):
+        request = self.request
+        return lambda row, related: rendition_urls(row['renditions'], request)
+
+    @staticmethod
+    def related_list(name):
+        return lambda row, related: related[name].get(row['id'], [])
+
+
+class ProductRowSerializer(RowSerializer):
+    serializer_class = ProductSerializer
+    field_columns = {
+        'style_number': ['style_number'],
+        'description': ['description'],
+        'image': ['image'],
+        'renditions': ['renditions'],
+        # Relation ids are also needed for the cache tags
+        'category': ['category_id', 'category__name'],
+        'sub_category': ['sub_category_id', 'sub_category__name'],
+    }
+    image_fields = list(ProductImageSerializer().fields)
+
+    def __init__(self, fields=None, request=None):
+        super().__init__(fields, request)
+        for column in ('category_id', 'sub_category_id'):
+            if column not in self.columns:
+                self.columns.append(column)
+
+    def extract_style_number(self):
+        return lambda row, related: row['style_number']
+
+    def extract_description(self):
+        return lambda row, related: row['description']
+
+    def extract_category(self):
+        def extract(row, related):
+            if row['category_id'] is None:
+                return None
+            return {'id': str(row['category_id']), 'name': row['category__name']}
+        return extract
+
+    def extract_sub_category(self):
+        def extract(row, related):
+            if row['sub_category_id'] is None:
+                return None
+            return {'id': str(row['sub_category_id']), 'name': row['sub_category__name']}
+        return extract
+
+    def extract_composition(self):
+        return self.related_list('composition')
+
+    def load_composition(self, ids):
+        compositions = defaultdict(list)
+        links = Product.composition.through.objects.filter(product_id__in=ids) \
+            .values_list('product_id', 'composition_id', 'composition__material')
+        for product_id, composition_id, material in links:
+            compositions[product_id].append({'id': str(composition_id), 'material': material})
+        return compositions
+
+    def extract_images(self):
+        return self.related_list('images')
+
+    def load_images(self, ids):
+        request = self.request
+        renderers = {
+            'id': lambda image: str(image['productimage_id']),
+            'renditions': lambda image: rendition_urls(image['productimage__renditions'], request),
+            'image': lambda image: file_url(image['productimage__image'], request),
+        }
+        renderers = [(name, renderers[name]) for name in self.image_fields]
+        images = defaultdict(list)
+        links = Product.images.through.objects.filter(product_id__in=ids).values(
+            'product_id', 'productimage_id', 'productimage__renditions', 'productimage__image'
+        )
+        for image in links:
+            images[image['product_id']].append({name: render(image) for name, render in renderers})
+        return images
+
+    def cache_tags(self, rows, related):
+        """Same tags as api.cache.product_tags for the rendered rows."""
+        tags = set()
+        for row in rows:
+            tags.add(f"product:{row['id']}")
+            if row['category_id']:
+                tags.add(f"category:{row['category_id']}")
+            if row['sub_category_id']:
+                tags.add(f"subcategory:{row['sub_category_id']}")
+        for name, model_name in (('composition', 'composition'), ('images', 'productimage')):
+            if name in related:
+                ids = {item['id'] for items in related[name].values() for item in items}
+                tags.update(f'{model_name}:{pk}' for pk in ids)
+        return tags
+
+
+class CategoryRowSerializer(RowSerializer):
+    serializer_class = CategorySerializer
+    field_columns = {
+        'renditions': ['renditions'],
+        'image': ['image'],
+        'name': ['name'],
+    }
+
+    def extract_name(self):
+        return lambda row, related: row['name']
+
+    def extract_subcategories(self):
+        return self.related_list('subcategories')
+
+    def load_subcategories(self, ids):
+        subcategories = defaultdict(list)
+        links = Category.subcategories.through.objects.filter(category_id__in=ids) \
+            .values_list('category_id', 'subcategory_id', 'subcategory__name')
+        for category_id, subcategory_id, name in links:
+            subcategories[category_id].append({'id': str(subcategory_id), 'name': name})
+        return subcategories
@@ -0,0 +1,129 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+_current_metrics = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    Counters collected for a single sampled request.
+    """
+    def __init__(self):
+        self.query_count = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.timings = {}
+
+    def as_dict(self):
+        return {
+            'queries': self.query_count,
+            'db_ms': round(self.db_time * 1000, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            **{f'{name}_ms': round(value * 1000, 2) for name, value in self.timings.items()},
+        }
+
+
+def record_cache(hit):
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
+
+
+@contextmanager
+def timed(name):
+    """
+    Add the wall time of the block to the current request's `name` timing.
+
+    Does nothing unless the request is being sampled.
+    """
+    metrics = _current_metrics.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timings[name] = metrics.timings.get(name, 0.0) + time.perf_counter() - start
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Record query count, DB time, response cache hits/misses and serializer
+    time for a sample of requests.
+
+    Results are sent as a `Server-Timing` header and logged as one JSON line
+    on the `api.instrumentation` logger. Configured by
+    settings.REQUEST_INSTRUMENTATION; with a sample rate of 0 the middleware
+    only does one comparison per request.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = getattr(settings, 'REQUEST_INSTRUMENTATION', {})
+        self.sample_rate = float(config.get('SAMPLE_RATE', 0))
+        self.server_timing = config.get('SERVER_TIMING', True)
+
+    def __call__(self, request):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self.record_query))
+                response = self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        total = time.perf_counter() - start
+
+        if self.server_timing:
+            response['Server-Timing'] = self.format_server_timing(metrics, total)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            **metrics.as_dict(),
+        }))
+        return response
+
+    @staticmethod
+    def record_query(execute, sql, params, many, context):
+        metrics = _current_metrics.get()
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if metrics is not None:
+                metrics.query_count += 1
+                metrics.db_time += time.perf_counter() - start
+
+    @staticmethod
+    def format_server_timing(metrics, total):
+        entries = [
+            f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.query_count} queries"',
+            f'cache;desc="hit={metrics.cache_hits} miss={metrics.cache_misses}"',
+        ]
+        for name, value in metrics.timings.items():
+            entries.append(f'{name};dur={value * 1000:.2f}')
+        entries.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(entries)
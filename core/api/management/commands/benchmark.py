@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from api.benchmarks import TIERS, environment, run_tier
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks catalog and inquiry hot paths on seeded databases and writes JSON results'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tiers', default='1k,10k',
+            help=f"Comma separated scale tiers ({', '.join(TIERS)}); default 1k,10k"
+        )
+        parser.add_argument('--iterations', type=int, default=20, help='Timed runs per case')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='benchmark.json', help="JSON results file, '-' for stdout")
+
+    def handle(self, *args, **options):
+        tiers = [tier.strip() for tier in options['tiers'].split(',') if tier.strip()]
+        unknown = [tier for tier in tiers if tier not in TIERS]
+        if unknown:
+            raise CommandError(f"Unknown tiers: {', '.join(unknown)}")
+
+        results = {
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'environment': environment(),
+            'iterations': options['iterations'],
+            'seed': options['seed'],
+            'tiers': {},
+        }
+        setup_test_environment()
+        try:
+            for tier in tiers:
+                self.stdout.write(f'Seeding and benchmarking {tier} products...')
+                results['tiers'][tier] = self.run_isolated(TIERS[tier], options)
+                for name, result in results['tiers'][tier]['benchmarks'].items():
+                    self.stdout.write(
+                        f"  {name:<22} {result['wall_ms']['median']:>9.2f} ms  "
+                        f"{result['queries']:>3} queries  {result['peak_memory_kb']:>9.1f} KB"
+                    )
+        finally:
+            teardown_test_environment()
+
+        payload = json.dumps(results, indent=2)
+        if options['output'] == '-':
+            self.stdout.write(payload)
+        else:
+            with open(options['output'], 'w') as output:
+                output.write(payload + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def run_isolated(self, product_count, options):
+        """Run one tier in a fresh on-disk test database, never the real one."""
+        with tempfile.TemporaryDirectory() as directory:
+            if connection.vendor == 'sqlite':
+                connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                # Sampling instrumentation would add its own overhead, and
+                # replica reads would leave the temporary database
+                with override_settings(
+                    REQUEST_INSTRUMENTATION={'SAMPLE_RATE': 0},
+                    DATABASE_ROUTING={**settings.DATABASE_ROUTING, 'REPLICAS': []},
+                ):
+                    return run_tier(product_count, options['iterations'], options['seed'])
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
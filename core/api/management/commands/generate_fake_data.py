@@ -1,158 +1,375 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+import django
+from django.apps import apps
+from django.db import connection, connections, transaction
 from django.utils import timezone
 from api.models import (
-    Product, 
-    ProductImage, 
-    Composition, 
-    Category, 
+    Product,
+    ProductImage,
+    Composition,
+    Category,
     SubCategory,
-    ContactUs, 
-    Inquiry, 
-    InquiryItems
+    ContactUs,
+    FacetCount,
+    Inquiry,
+    InquiryItems,
+    ProductFacet
 )
+from api import facets, search
+from api.cache import bump_cache_tags, collection_tag
+from concurrent.futures import ProcessPoolExecutor
 from faker import Faker
+import hashlib
 import random
 from datetime import timedelta
 import uuid
 
-fake = Faker()
+
+MATERIAL_TYPES = [
+    'Cotton', 'Polyester', 'Wool', 'Silk', 'Linen',
+    'Leather', 'Denim', 'Nylon', 'Cashmere', 'Modal'
+]
+IMAGE_URLS = [
+    'https://img.freepik.com/free-photo/male-belt-sweater-accessories-clothes_1203-6421.jpg',
+    'https://img.freepik.com/free-photo/brown-leather-shoes_1203-8175.jpg',
+    'https://img.freepik.com/free-photo/men-shirt_1203-8356.jpg',
+    'https://img.freepik.com/free-photo/shirt-hangers_1203-8389.jpg',
+    'https://img.freepik.com/free-photo/overhead-view-womans-casual-outfits_93675-133151.jpg'
+]
+CATEGORIES_DATA = {
+    'mens': {
+        'name': 'MENS PRODUCTS',
+        'subcategories': ['Mens Sweater', 'Mens T-Shirt', 'Mens Hoodie'],
+    },
+    'ladies': {
+        'name': 'LADIES PRODUCTS',
+        'subcategories': ['Ladies Sweater', 'Ladies T-Shirt', 'Ladies Pants'],
+    },
+    'boys': {
+        'name': 'BOYS PRODUCTS',
+        'subcategories': ['Boys Sweater', 'Boys T-Shirt', 'Boys Denim'],
+    }
+}
+GAUGES = ['7GG', '12GG', '14GG', '16GG']
+ENDS = ['Single', 'Double', 'Triple']
+WEIGHTS = ['150GSM', '180GSM', '200GSM', '220GSM', '250GSM']
+
+# Faker is slow per call, so free text is drawn from a pre-generated pool
+TEXT_POOL_SIZE = 500
+
+# Emptied by --flush, children before the tables they reference
+FLUSH_MODELS = (
+    Inquiry.items.through, Inquiry, InquiryItems, ContactUs,
+    ProductFacet, FacetCount, Product.composition.through, Product.images.through, Product,
+    ProductImage, Composition, Category.subcategories.through, Category, SubCategory,
+)
+
+
+def seeded_uuid(seed, kind, index):
+    """Stable id for the index-th row of a kind, so runs with one seed match."""
+    digest = hashlib.md5(f'{seed}:{kind}:{index}'.encode()).digest()
+    return uuid.UUID(bytes=digest, version=4)
+
+
+def text_pool(seed):
+    fake = Faker()
+    fake.seed_instance(seed)
+    return {
+        'paragraphs': [fake.paragraph() for _ in range(TEXT_POOL_SIZE)],
+        'names': [fake.name() for _ in range(TEXT_POOL_SIZE)],
+        'emails': [fake.email() for _ in range(TEXT_POOL_SIZE)],
+        'sentences': [fake.sentence() for _ in range(TEXT_POOL_SIZE)],
+        'texts': [fake.text() for _ in range(TEXT_POOL_SIZE)],
+    }
+
+
+# Product rows are seeded per product, so the output depends neither on the
+# chunk size nor on how chunks are spread over worker processes.
+_worker_context = None
+
+
+def _init_worker(context):
+    global _worker_context
+    _worker_context = context
+    if not apps.ready:
+        # Spawned (not forked) workers start without Django
+        django.setup()
+    # Forked workers must not share the parent's database connection
+    connections.close_all()
+
+
+def generate_product_chunk(start, count):
+    """Plain rows for products [start, start + count)."""
+    context = _worker_context
+    rng = random.Random()
+    paragraphs = context['paragraphs']
+    products = []
+    composition_links = []
+    image_links = []
+    for index in range(start, start + count):
+        rng.seed(f"{context['seed']}:product:{index}")
+        product_id = seeded_uuid(context['seed'], 'product', index)
+        category_id, subcategory_ids = rng.choice(context['categories'])
+        products.append(Product(
+            id=product_id,
+            style_number=f"STY-{index:07d}",
+            gauge=rng.choice(GAUGES),
+            end=rng.choice(ENDS),
+            weight=rng.choice(WEIGHTS),
+            description=rng.choice(paragraphs),
+            category_id=category_id,
+            sub_category_id=rng.choice(subcategory_ids) if subcategory_ids else None,
+            image=rng.choice(IMAGE_URLS),
+        ))
+        compositions = context['compositions']
+        for composition_id in rng.sample(compositions, k=min(rng.randint(1, 3), len(compositions))):
+            composition_links.append((product_id, composition_id))
+        images = context['images']
+        for image_id in rng.sample(images, k=min(rng.randint(1, 4), len(images))):
+            image_links.append((product_id, image_id))
+    return products, composition_links, image_links
+
+
+@transaction.atomic
+def insert_product_chunk(start, count):
+    """Generate and insert one chunk of products with their M2M rows."""
+    products, composition_links, image_links = generate_product_chunk(start, count)
+    Product.objects.bulk_create(products)
+    CompositionLink = Product.composition.through
+    CompositionLink.objects.bulk_create([
+        CompositionLink(product_id=product_id, composition_id=composition_id)
+        for product_id, composition_id in composition_links
+    ])
+    ImageLink = Product.images.through
+    ImageLink.objects.bulk_create([
+        ImageLink(product_id=product_id, productimage_id=image_id)
+        for product_id, image_id in image_links
+    ])
+    return count
+
 
 class Command(BaseCommand):
-    help = 'Generates fake data for testing'
+    help = 'Generates fake data for testing and load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=30)
+        parser.add_argument('--categories', type=int, default=3)
+        parser.add_argument('--subcategories', type=int, default=3, help='Per category')
+        parser.add_argument('--compositions', type=int, default=len(MATERIAL_TYPES))
+        parser.add_argument('--images', type=int, default=len(IMAGE_URLS), help='Shared gallery images')
+        parser.add_argument('--contacts', type=int, default=10)
+        parser.add_argument('--inquiries', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0, help='Same seed, same data (including ids)')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Processes inserting product rows in parallel (PostgreSQL only; SQLite always uses one)'
+        )
+        parser.add_argument(
+            '--flush', action='store_true',
+            help='Delete all catalog and inbox rows first, e.g. to rerun with the same seed'
+        )
+        parser.add_argument(
+            '--skip-indexes', action='store_true',
+            help='Do not rebuild the search and facet indexes afterwards'
+        )
+
+    def handle(self, *args, **options):
+        if options['products'] and not options['categories']:
+            raise CommandError('Products need at least one category')
+        if options['flush'] and options['skip_indexes']:
+            raise CommandError('--flush leaves the search index stale without a rebuild, drop --skip-indexes')
+        self.seed = options['seed']
+        self.chunk_size = options['chunk_size']
+        self.rng = random.Random(self.seed)
+        self.text = text_pool(self.seed)
+
+        if options['flush']:
+            self.flush()
+            self.stdout.write('Deleted existing catalog and inbox data')
+        elif self.seed_exists(options):
+            raise CommandError(
+                f"Data for seed {self.seed} already exists, use --flush to replace it or pick another --seed"
+            )
 
-    def handle(self, *args, **kwargs):
         self.stdout.write('Generating fake data...')
 
         # Create Compositions (Materials)
-        compositions = []
-        material_types = [
-            'Cotton', 'Polyester', 'Wool', 'Silk', 'Linen', 
-            'Leather', 'Denim', 'Nylon', 'Cashmere', 'Modal'
-        ]
-        for material in material_types:
-            composition = Composition.objects.create(material=material)
-            compositions.append(composition)
+        compositions = Composition.objects.bulk_create([
+            Composition(
+                id=seeded_uuid(self.seed, 'composition', i),
+                material=MATERIAL_TYPES[i] if i < len(MATERIAL_TYPES) else f'Material {i + 1}'
+            )
+            for i in range(options['compositions'])
+        ])
         self.stdout.write(f'Created {len(compositions)} compositions')
 
         # Create Product Images
-        product_images = []
-        image_urls = [
-            'https://img.freepik.com/free-photo/male-belt-sweater-accessories-clothes_1203-6421.jpg',
-            'https://img.freepik.com/free-photo/brown-leather-shoes_1203-8175.jpg',
-            'https://img.freepik.com/free-photo/men-shirt_1203-8356.jpg',
-            'https://img.freepik.com/free-photo/shirt-hangers_1203-8389.jpg',
-            'https://img.freepik.com/free-photo/overhead-view-womans-casual-outfits_93675-133151.jpg'
-        ]
-        for url in image_urls:
-            # Create a temporary file name for the image
-            image_name = f"product_images/{uuid.uuid4()}.jpg"
-            image = ProductImage.objects.create(image=image_name)
-            product_images.append(image)
+        product_images = ProductImage.objects.bulk_create([
+            ProductImage(
+                id=seeded_uuid(self.seed, 'image', i),
+                image=f"product_images/{seeded_uuid(self.seed, 'image-file', i)}.jpg"
+            )
+            for i in range(options['images'])
+        ])
         self.stdout.write(f'Created {len(product_images)} product images')
 
         # Create Categories and SubCategories
-        categories_data = {
-            'mens': {
-                'name': 'MENS PRODUCTS',
-                'subcategories': [
-                    {'name': 'Mens Sweater', 'slug': 'mens-sweater', 'icon': '🧥'},
-                    {'name': 'Mens T-Shirt', 'slug': 'mens-tshirt', 'icon': '👕'},
-                    {'name': 'Mens Hoodie', 'slug': 'mens-hoodie', 'icon': '🧥'},
-                ]
-            },
-            'ladies': {
-                'name': 'LADIES PRODUCTS',
-                'subcategories': [
-                    {'name': 'Ladies Sweater', 'slug': 'ladies-sweater', 'icon': '🧥'},
-                    {'name': 'Ladies T-Shirt', 'slug': 'ladies-tshirt', 'icon': '👚'},
-                    {'name': 'Ladies Pants', 'slug': 'ladies-pants', 'icon': '👖'},
-                ]
-            },
-            'boys': {
-                'name': 'BOYS PRODUCTS',
-                'subcategories': [
-                    {'name': 'Boys Sweater', 'slug': 'boys-sweater', 'icon': '🧥'},
-                    {'name': 'Boys T-Shirt', 'slug': 'boys-tshirt', 'icon': '👕'},
-                    {'name': 'Boys Denim', 'slug': 'boys-denim', 'icon': '👖'},
-                ]
-            }
-        }
-
-        categories = {}
-        for cat_key, cat_data in categories_data.items():
-            # Create Category
-            category = Category.objects.create(
-                name=cat_data['name']
-            )
-            
-            # Create SubCategories
-            for sub_data in cat_data['subcategories']:
-                subcategory = SubCategory.objects.create(
-                    name=sub_data['name']
-                )
-                category.subcategories.add(subcategory)
-            
-            categories[cat_key] = category
-
+        categories = self.create_categories(options['categories'], options['subcategories'])
         self.stdout.write(f'Created {len(categories)} categories with subcategories')
 
         # Create Products
-        products = []
-        sample_types = ['Development', '1st Fit', '2nd Fit', 'PP Sample', 'Production']
-        gauges = ['7GG', '12GG', '14GG', '16GG']
-        ends = ['Single', 'Double', 'Triple']
-        weights = ['150GSM', '180GSM', '200GSM', '220GSM', '250GSM']
-
-        for category in categories.values():
-            for _ in range(10):  # 10 products per category
-                product = Product.objects.create(
-                    style_number=f"STY-{random.randint(1000, 9999)}",
-                    gauge=random.choice(gauges),
-                    end=random.choice(ends),
-                    weight=random.choice(weights),
-                    description=fake.paragraph(),
-                    category=category,
-                    image=random.choice(image_urls)
-                )
-                
-                # Add random compositions
-                for _ in range(random.randint(1, 3)):
-                    product.composition.add(random.choice(compositions))
-                
-                # Add random product images
-                for _ in range(random.randint(1, 4)):
-                    product.images.add(random.choice(product_images))
-                
-                products.append(product)
-
-        self.stdout.write(f'Created {len(products)} products')
+        self.create_products(options['products'], options['workers'], {
+            'seed': self.seed,
+            'paragraphs': self.text['paragraphs'],
+            'categories': categories,
+            'compositions': [c.id for c in compositions],
+            'images': [i.id for i in product_images],
+        })
+        self.stdout.write(f"Created {options['products']} products")
 
         # Create Contact Us entries
-        for _ in range(10):
-            ContactUs.objects.create(
-                name=fake.name(),
-                email=fake.email(),
-                subject=fake.sentence(),
-                message=fake.text(),
-                is_read=random.choice([True, False]),
-                created_at=timezone.now() - timedelta(days=random.randint(1, 30))
-            )
-        self.stdout.write('Created 10 contact us entries')
+        self.create_contacts(options['contacts'])
+        self.stdout.write(f"Created {options['contacts']} contact us entries")
 
         # Create Inquiries with Items
-        for _ in range(10):
-            inquiry = Inquiry.objects.create(
-                name=fake.name(),
-                email=fake.email(),
-                subject=fake.sentence(),
-                message=fake.text(),
-                is_read=random.choice([True, False])
+        self.create_inquiries(options['inquiries'], options['products'])
+        self.stdout.write(f"Created {options['inquiries']} inquiries with items")
+
+        if not options['skip_indexes']:
+            self.stdout.write('Rebuilding search and facet indexes...')
+            search.rebuild_search_index(chunk_size=self.chunk_size)
+            facets.rebuild_facet_index(chunk_size=self.chunk_size)
+        # bulk_create sends no signals
+        bump_cache_tags(*(collection_tag(model) for model in (
+            Product, ProductImage, Composition, Category, SubCategory
+        )))
+        self.stdout.write(self.style.SUCCESS('Successfully generated fake data'))
+
+    def flush(self):
+        # Raw deletes: the ORM would load every row to run the cache and
+        # index signals, and the indexes are rebuilt afterwards anyway
+        with transaction.atomic(), connection.cursor() as cursor:
+            for model in FLUSH_MODELS:
+                cursor.execute(f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)}')
+
+    def seed_exists(self, options):
+        """Whether a previous run with this seed left rows whose ids would clash."""
+        first_rows = (
+            (Composition, 'composition', options['compositions']),
+            (ProductImage, 'image', options['images']),
+            (Category, 'category', options['categories']),
+            (Product, 'product', options['products']),
+            (ContactUs, 'contact', options['contacts']),
+            (Inquiry, 'inquiry', options['inquiries']),
+        )
+        return any(
+            model.objects.filter(id=seeded_uuid(self.seed, kind, 0)).exists()
+            for model, kind, count in first_rows if count
+        )
+
+    def create_categories(self, count, subcategories_per_category):
+        """[(category_id, [subcategory_id, ...]), ...]"""
+        presets = list(CATEGORIES_DATA.values())
+        categories = []
+        subcategories = []
+        links = []
+        result = []
+        for i in range(count):
+            preset = presets[i] if i < len(presets) else None
+            category = Category(
+                id=seeded_uuid(self.seed, 'category', i),
+                name=preset['name'] if preset else f'CATEGORY {i + 1} PRODUCTS'
             )
-            
-            # Add random products to inquiry
-            for product in random.sample(products, k=random.randint(1, 3)):
-                inquiry_item = InquiryItems.objects.create(product=product)
-                inquiry.items.add(inquiry_item)
-
-        self.stdout.write('Created 10 inquiries with items')
-        self.stdout.write(self.style.SUCCESS('Successfully generated fake data')) 
\ No newline at end of file
+            categories.append(category)
+            sub_ids = []
+            for j in range(subcategories_per_category):
+                if preset and j < len(preset['subcategories']):
+                    name = preset['subcategories'][j]
+                else:
+                    name = f'{category.name.split()[0].title()} Style {j + 1}'
+                subcategory = SubCategory(id=seeded_uuid(self.seed, f'subcategory-{i}', j), name=name)
+                subcategories.append(subcategory)
+                links.append(Category.subcategories.through(category_id=category.id, subcategory_id=subcategory.id))
+                sub_ids.append(subcategory.id)
+            result.append((category.id, sub_ids))
+        Category.objects.bulk_create(categories)
+        SubCategory.objects.bulk_create(subcategories, batch_size=self.chunk_size)
+        Category.subcategories.through.objects.bulk_create(links, batch_size=self.chunk_size)
+        return result
+
+    def create_products(self, count, workers, context):
+        chunks = [(start, min(self.chunk_size, count - start)) for start in range(0, count, self.chunk_size)]
+        if workers > 1 and connection.vendor == 'sqlite':
+            # SQLite allows a single writer, extra processes would only wait
+            # on the lock, so --workers only takes effect on PostgreSQL
+            self.stdout.write(self.style.WARNING('SQLite does not support concurrent writes, using one process'))
+            workers = 1
+        done = 0
+        if workers > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(context,)) as executor:
+                for inserted in executor.map(insert_product_chunk, *zip(*chunks)):
+                    done += inserted
+                    self.stdout.write(f'  {done}/{count} products')
+        else:
+            global _worker_context
+            _worker_context = context
+            for start, size in chunks:
+                done += insert_product_chunk(start, size)
+                self.stdout.write(f'  {done}/{count} products')
+
+    def pick_text(self, kind):
+        return self.rng.choice(self.text[kind])
+
+    def backdate(self, model, rows):
+        """auto_now_add ignores given values, so dates are spread afterwards."""
+        now = timezone.now()
+        for row in rows:
+            row.created_at = now - timedelta(days=self.rng.randint(1, 365), seconds=self.rng.randint(0, 86399))
+        model.objects.bulk_update(rows, ['created_at'], batch_size=1000)
+
+    def create_contacts(self, count):
+        for start in range(0, count, self.chunk_size):
+            with transaction.atomic():
+                contacts = ContactUs.objects.bulk_create([
+                    ContactUs(
+                        id=seeded_uuid(self.seed, 'contact', i),
+                        name=self.pick_text('names'),
+                        email=self.pick_text('emails'),
+                        subject=self.pick_text('sentences'),
+                        message=self.pick_text('texts'),
+                        is_read=self.rng.choice([True, False])
+                    )
+                    for i in range(start, min(start + self.chunk_size, count))
+                ])
+                self.backdate(ContactUs, contacts)
+
+    def create_inquiries(self, count, product_count):
+        for start in range(0, count, self.chunk_size):
+            inquiries = []
+            items = []
+            links = []
+            for i in range(start, min(start + self.chunk_size, count)):
+                inquiry = Inquiry(
+                    id=seeded_uuid(self.seed, 'inquiry', i),
+                    name=self.pick_text('names'),
+                    email=self.pick_text('emails'),
+                    subject=self.pick_text('sentences'),
+                    message=self.pick_text('texts'),
+                    is_read=self.rng.choice([True, False])
+                )
+                inquiries.append(inquiry)
+
+                # Add random products to inquiry; ids are derived, not looked up
+                for k, index in enumerate(self.rng.sample(range(product_count), k=min(self.rng.randint(1, 3), product_count))):
+                    item = InquiryItems(
+                        id=seeded_uuid(self.seed, f'inquiry-item-{i}', k),
+                        product_id=seeded_uuid(self.seed, 'product', index)
+                    )
+                    items.append(item)
+                    links.append(Inquiry.items.through(inquiry_id=inquiry.id, inquiryitems_id=item.id))
+            with transaction.atomic():
+                Inquiry.objects.bulk_create(inquiries)
+                InquiryItems.objects.bulk_create(items)
+                Inquiry.items.through.objects.bulk_create(links)
+                self.backdate(Inquiry, inquiries)
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.import_service import FORMATS, ProductImporter, detect_format
+
+
+class Command(BaseCommand):
+    help = 'Bulk imports products from a CSV or JSONL line sheet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Default: from the file extension')
+        parser.add_argument('--chunk-size', type=int)
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='Create unknown categories, sub-categories and compositions'
+        )
+
+    def handle(self, *args, **options):
+        config = getattr(settings, 'PRODUCT_IMPORT', {})
+        importer = ProductImporter(
+            chunk_size=options['chunk_size'] or config.get('CHUNK_SIZE', 500),
+            create_missing=options['create_missing'],
+            max_errors=config.get('MAX_ERRORS', 1000),
+        )
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                importer.run(fileobj, options['format'] or detect_format(options['path']))
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for error in importer.errors:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        if importer.error_count > len(importer.errors):
+            self.stderr.write(f'... {importer.error_count - len(importer.errors)} more errors')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {importer.created} products ({importer.error_count} rows rejected)'
+        ))
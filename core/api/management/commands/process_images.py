@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api.services.image_service import ImageProcessor
+
+
+class Command(BaseCommand):
+    help = 'Optimizes pending product images in a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+        parser.add_argument('--batch-size', type=int, help='Jobs claimed per batch')
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--poll-interval', type=float, default=2.0)
+
+    def handle(self, *args, **options):
+        processor = ImageProcessor(workers=options['workers'], batch_size=options['batch_size'])
+        self.stdout.write(f'Processing images with {processor.workers} workers...')
+        processor.run(once=options['once'], poll_interval=options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS('Image queue drained'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.facets import rebuild_facet_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the product facet index and facet counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding product facet index...')
+        count = rebuild_facet_index(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed facets of {count} products'))
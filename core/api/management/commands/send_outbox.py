@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from api.services.email_service import OutboxSender
+
+
+class Command(BaseCommand):
+    help = 'Delivers queued notification emails over one reused mail connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Emails sent per batch')
+        parser.add_argument('--once', action='store_true', help='Exit when no email is due')
+        parser.add_argument('--poll-interval', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        sender = OutboxSender(batch_size=options['batch_size'])
+        self.stdout.write('Sending queued emails...')
+        result = sender.run(once=options['once'], poll_interval=options['poll_interval'])
+        if result is not None:
+            sent, failed = result
+            self.stdout.write(self.style.SUCCESS(f'Sent {sent} emails, {failed} failed'))
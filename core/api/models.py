@@ -1,8 +1,36 @@
 from django.db import models
-from uuid import uuid4
+from django.utils import timezone
+from .ids import uuid7
 # Create your models here.
-class ProductImage(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid4, editable=False, unique=True)
+class ImageStatus(models.TextChoices):
+    PENDING = 'pending', 'Pending'
+    PROCESSING = 'processing', 'Processing'
+    READY = 'ready', 'Ready'
+    FAILED = 'failed', 'Failed'
+
+
+class ProcessedImageModel(models.Model):
+    """
+    Processing state of a model's `image`, maintained by
+    api.services.image_service.
+    """
+    image_status = models.CharField(
+        max_length=20,
+        choices=ImageStatus.choices,
+        default=ImageStatus.READY,
+        db_index=True
+    )
+    # Processing key (source content hash + optimization settings) of `image`
+    image_hash = models.CharField(max_length=64, blank=True, default='')
+    # {'thumb': {'width': 200, 'webp': <name>, 'jpeg': <name>}, ...}
+    renditions = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        abstract = True
+
+
+class ProductImage(ProcessedImageModel):
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False, unique=True)
     image = models.ImageField(upload_to='product_images/',null=True, blank=True)
 
     def __str__(self):
@@ -10,29 +38,29 @@ class ProductImage(models.Model):
 
 
 class Composition(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid4, editable=False, unique=True)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False, unique=True)
     material = models.CharField(max_length=100)
 
     def __str__(self):
         return self.material
 
 class SubCategory(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid4, editable=False, unique=True)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False, unique=True)
     name = models.CharField(max_length=50)
     def __str__(self):
         return self.name
     
 
-class Category(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid4, editable=False, unique=True)
+class Category(ProcessedImageModel):
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False, unique=True)
     image = models.ImageField(upload_to='category_images/',null=True, blank=True)
     name = models.CharField(max_length=50)
     subcategories = models.ManyToManyField(SubCategory, related_name='categories')
     def __str__(self):
         return self.name
 
-class Product(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid4, editable=False, unique=True)
+class Product(ProcessedImageModel):
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False, unique=True)
     style_number = models.CharField(max_length=50, db_index=True)
     gauge = models.CharField(max_length=50)
     end = models.CharField(max_length=50)
@@ -74,6 +102,42 @@ class Product(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=['style_number', 'category']),
+            # Keyset pagination of filtered product lists
+            models.Index(fields=['category', 'id']),
+            models.Index(fields=['sub_category', 'id']),
+        ]
+
+
+class ProductFacet(models.Model):
+    """
+    Facet index: one row per (product, facet, value), e.g. gauge=12GG or
+    composition=<id>. Kept in sync by api.facets.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='facets')
+    facet = models.CharField(max_length=20)
+    value = models.CharField(max_length=50)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['facet', 'value', 'product']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'facet', 'value'], name='unique_product_facet'),
+        ]
+
+
+class FacetCount(models.Model):
+    """
+    Precomputed number of products per facet value across the whole catalog.
+    """
+    facet = models.CharField(max_length=20)
+    value = models.CharField(max_length=50)
+    label = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['facet', 'value'], name='unique_facet_value'),
         ]
 
 
@@ -82,8 +146,9 @@ class Product(models.Model):
 
 
 
+
 class BaseContact(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid4, editable=False, unique=True)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False, unique=True)
     name = models.CharField(max_length=200)
     email = models.EmailField()
     subject = models.CharField(max_length=200)
@@ -105,9 +170,14 @@ class ContactUs(BaseContact):
     class Meta:
         verbose_name = 'Contact Us'
         verbose_name_plural = 'Contact Us'
+        indexes = [
+            # Admin inbox: filter by read state, newest first
+            models.Index(fields=['is_read', 'created_at']),
+            models.Index(fields=['created_at', 'id']),
+        ]
 
 class InquiryItems(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid4, editable=False, unique=True)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False, unique=True)
     product = models.ForeignKey(
         Product, 
         on_delete=models.CASCADE,
@@ -132,6 +202,42 @@ class Inquiry(BaseContact):
         verbose_name = 'Inquiry'
         verbose_name_plural = 'Inquiries'
         ordering = ['-created_at']
+        indexes = [
+            # Admin inbox: filter by read state, newest first
+            models.Index(fields=['is_read', 'created_at']),
+            models.Index(fields=['created_at', 'id']),
+        ]
+
 
+class EmailOutbox(models.Model):
+    """
+    Notification email waiting for delivery. Rows are written in the same
+    transaction as the submission that triggers them and drained by the
+    send_outbox worker.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        SENT = 'sent', 'Sent'
+        FAILED = 'failed', 'Failed'
+
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False, unique=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
 
+    def __str__(self):
+        return f"{self.subject} ({self.status})"
 
+    class Meta:
+        verbose_name = 'Email Outbox'
+        verbose_name_plural = 'Email Outbox'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
@@ -0,0 +1,124 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPaginator:
+    """
+    Keyset (cursor) pagination over a queryset with a unique ordering.
+
+    The cursor is an opaque token holding the ordering values of the last row
+    of the previous page, so every page is a single indexed range scan
+    (`id > last_id ORDER BY id LIMIT n`) no matter how deep the client pages.
+    `ordering` must end with a unique field; descending fields start with '-'.
+
+    Query params:
+    - cursor: token returned as `next_cursor` by the previous page
+    - limit: page size, capped at settings.MAX_PAGE_SIZE
+    """
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    ordering = ('id',)
+
+    def __init__(self, request, ordering=None):
+        self.request = request
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+        self.limit = self.get_limit()
+        self.after = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+
+    @property
+    def fields(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def get_limit(self):
+        default = getattr(settings, 'DEFAULT_PAGE_SIZE', 20)
+        maximum = getattr(settings, 'MAX_PAGE_SIZE', 100)
+        try:
+            limit = int(self.request.query_params.get(self.limit_query_param, default))
+        except (TypeError, ValueError):
+            return default
+        return max(1, min(limit, maximum))
+
+    def encode_cursor(self, row):
+        payload = {}
+        for field in self.fields:
+            # Pages may hold model instances or values() rows
+            value = row[field] if isinstance(row, dict) else getattr(row, field)
+            payload[field] = value.isoformat() if isinstance(value, datetime) else str(value)
+        payload = json.dumps(payload, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        """Ordering values of the cursor as strings; validated when filtering."""
+        if not token:
+            return None
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return [str(payload[field]) for field in self.fields]
+        except (binascii.Error, ValueError, KeyError, TypeError):
+            raise InvalidCursor('Invalid cursor')
+
+    def get_keyset_filter(self):
+        """
+        Rows after the cursor: (a > x) OR (a = x AND b > y) OR ..., with < for
+        descending fields.
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, self.after):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def paginate_queryset(self, queryset):
+        if self.after is not None:
+            try:
+                queryset = queryset.filter(self.get_keyset_filter())
+            except ValidationError:
+                raise InvalidCursor('Invalid cursor')
+        # Fetch one extra row to know whether another page exists
+        rows = list(queryset.order_by(*self.ordering)[:self.limit + 1])
+        self.has_more = len(rows) > self.limit
+        self.page = rows[:self.limit]
+        return self.page
+
+    def get_next_cursor(self):
+        if not self.has_more:
+            return None
+        return self.encode_cursor(self.page[-1])
+    def get_next_link(self):
+        next_cursor = self.get_next_cursor()
+        if next_cursor is None:
+            return None
+        params = self.request.query_params.copy()
+        params[self.cursor_query_param] = next_cursor
+        return self.request.build_absolute_uri(f'{self.request.path}?{params.urlencode()}')
+
+    def get_pagination_data(self):
+        return {
+            'next_cursor': self.get_next_cursor(),
+            'next': self.get_next_link(),
+            'limit': self.limit,
+        }
+
+
+class InboxPaginator(KeysetPaginator):
+    """
+    Newest-first pagination of contact and inquiry submissions. Ids of new
+    rows are time-ordered (api.ids.uuid7), but rows created before the
+    switch have random ids, so created_at leads and id only breaks ties.
+    """
+    ordering = ('-created_at', '-id')
@@ -0,0 +1,142 @@
+import re
+from uuid import UUID
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+
+from .models import Product
+
+
+SEARCH_TABLE = 'api_product_search'
+
+# FTS5 rowids are 64-bit integers; product ids are UUIDs. The rowid is the
+# low 63 bits of the UUID, so a product's row can be replaced or deleted
+# without scanning the index. Collisions are negligible (~1e-7 at 1M rows).
+ROWID_MASK = (1 << 63) - 1
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_enabled(using=DEFAULT_DB_ALIAS):
+    return connections[using].vendor == 'sqlite'
+
+
+def product_rowid(product_id):
+    if not isinstance(product_id, UUID):
+        product_id = UUID(str(product_id))
+    return product_id.int & ROWID_MASK
+
+
+def create_search_index(using=DEFAULT_DB_ALIAS):
+    if not search_enabled(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5('
+            'product_id UNINDEXED, style_number, description, category, materials, '
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+
+
+def _document(product):
+    return (
+        product_rowid(product.id),
+        product.id.hex,
+        product.style_number,
+        product.description,
+        product.category.name if product.category_id else '',
+        ' '.join(c.material for c in product.composition.all()),
+    )
+
+
+def _write_documents(cursor, products):
+    cursor.executemany(
+        f'INSERT INTO {SEARCH_TABLE} '
+        '(rowid, product_id, style_number, description, category, materials) '
+        'VALUES (%s, %s, %s, %s, %s, %s)',
+        [_document(product) for product in products]
+    )
+
+
+def indexable_products():
+    return Product.objects.select_related('category').prefetch_related('composition')
+
+
+def index_products(product_ids):
+    """
+    (Re)index the given products. Ids that no longer exist are dropped.
+    """
+    if not search_enabled():
+        return
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    products = list(indexable_products().filter(id__in=product_ids))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+            [(product_rowid(pk),) for pk in product_ids]
+        )
+        _write_documents(cursor, products)
+
+
+def remove_products(product_ids):
+    if not search_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+            [(product_rowid(pk),) for pk in product_ids]
+        )
+
+
+def rebuild_search_index(chunk_size=2000):
+    """
+    Rebuild the whole index from the product table. Returns the row count.
+    """
+    create_search_index()
+    count = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        batch = []
+        for product in indexable_products().order_by('id').iterator(chunk_size=chunk_size):
+            batch.append(product)
+            if len(batch) >= chunk_size:
+                _write_documents(cursor, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            _write_documents(cursor, batch)
+            count += len(batch)
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+    return count
+
+
+def build_match_query(text):
+    """
+    Turn free text into an FTS5 query: every word must match as a prefix.
+    Quoting each token keeps FTS5 operators in user input inert.
+    """
+    tokens = TOKEN_RE.findall(text)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_product_ids(text, limit):
+    """
+    Ids (as strings) of products matching `text`, best match first.
+    """
+    if not search_enabled():
+        # Plain substring matching on other databases
+        queryset = Product.objects.filter(style_number__icontains=text) | \
+            Product.objects.filter(description__icontains=text)
+        return [str(pk) for pk in queryset.order_by('style_number').values_list('id', flat=True)[:limit]]
+
+    match = build_match_query(text)
+    if not match:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT product_id FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+            'ORDER BY rank LIMIT %s',
+            [match, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
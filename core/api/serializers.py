@@ -1,5 +1,8 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
 from rest_framework import serializers
-from django.shortcuts import get_object_or_404
+from .services.image_service import rendition_urls
+from .services.inquiry_service import create_inquiries, get_product_styles
 from .models import (
     Product, 
     ProductImage, 
@@ -11,24 +14,143 @@ from .models import (
     InquiryItems
 )
 
+class ImageRenditionsField(serializers.ReadOnlyField):
+    """
+    Stored renditions map rendered as srcset strings and per-size URLs.
+    """
+    def to_representation(self, value):
+        return rendition_urls(value, self.context.get('request'))
+
+
+# Image worker bookkeeping (api.services.image_service), not for public payloads
+IMAGE_PROCESSING_FIELDS = ['image_status', 'image_hash']
+
+
+def parse_field_list(value):
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+class SparseFieldsetMixin:
+    """
+    Client-selectable fields for read serializers.
+
+    Query params understood by select_fields():
+    - fields=a,b: render only these fields
+    - exclude=a,b: render every default field except these
+    - expand=a,b: also render fields from Meta.expandable_fields, which are
+      left out by default
+
+    Views pass the result as `fields=` and use narrow_queryset() so only the
+    columns and relations being rendered are loaded. Meta.field_relations
+    maps a field to the `select_related`/`prefetch_related`/`only` lookups it
+    needs; Meta.always_load lists columns needed whatever is rendered.
+    """
+    def __init__(self, *args, fields=None, **kwargs):
+        self.selected_fields = fields
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for name, (serializer_class, options) in getattr(self.Meta, 'expandable_fields', {}).items():
+            fields[name] = serializer_class(**options)
+        if self.selected_fields is None:
+            selected = self.default_fields(fields)
+        else:
+            selected = self.selected_fields
+        return {name: field for name, field in fields.items() if name in selected}
+
+    @classmethod
+    def default_fields(cls, fields):
+        expandable = getattr(cls.Meta, 'expandable_fields', {})
+        return [name for name in fields if name not in expandable]
+
+    @classmethod
+    def select_fields(cls, query_params):
+        """
+        Field names to render for a request. Raises ValidationError for names
+        the serializer does not have.
+        """
+        only = parse_field_list(query_params.get('fields'))
+        exclude = parse_field_list(query_params.get('exclude'))
+        expand = parse_field_list(query_params.get('expand'))
+        if not (only or exclude or expand):
+            return None
+
+        expandable = list(getattr(cls.Meta, 'expandable_fields', {}))
+        default = list(cls().fields)
+        errors = {}
+        for param, names, allowed in (('fields', only, default + expandable),
+                                      ('exclude', exclude, default + expandable),
+                                      ('expand', expand, expandable)):
+            unknown = [name for name in names if name not in allowed]
+            if unknown:
+                errors[param] = [f"Unknown fields: {', '.join(unknown)}"]
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        if only:
+            selected = [name for name in default + expandable if name in only or name in expand]
+        else:
+            selected = default + [name for name in expandable if name in expand]
+        return [name for name in selected if name not in exclude]
+
+    @classmethod
+    def narrow_queryset(cls, queryset, fields=None, columns=()):
+        """
+        Load only what `fields` (None for the defaults) renders: model
+        columns through only(), relations as declared in Meta.field_relations.
+        `columns` are loaded as well, e.g. the ordering of a paginated list.
+        """
+        model = queryset.model
+        if fields is None:
+            fields = cls().fields
+        relations = getattr(cls.Meta, 'field_relations', {})
+        columns = {model._meta.pk.name, *columns, *getattr(cls.Meta, 'always_load', ())}
+        select_related = []
+        prefetch_related = []
+        for name in fields:
+            try:
+                field = model._meta.get_field(name)
+                if field.concrete and not field.many_to_many:
+                    columns.add(name)
+            except FieldDoesNotExist:
+                pass
+            lookups = relations.get(name, {})
+            columns.update(lookups.get('only', ()))
+            select_related.extend(lookups.get('select_related', ()))
+            prefetch_related.extend(lookups.get('prefetch_related', ()))
+        queryset = queryset.only(*columns)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+
+
 class SubCategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = SubCategory
         fields = '__all__'
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     subcategories = SubCategorySerializer(many=True)
+    renditions = ImageRenditionsField()
     
     class Meta:
         model = Category
-        fields = '__all__'
+        exclude = IMAGE_PROCESSING_FIELDS
+        field_relations = {
+            'subcategories': {'prefetch_related': ('subcategories',)},
+        }
 
 class ProductImageSerializer(serializers.ModelSerializer):
+    renditions = ImageRenditionsField()
+
     class Meta:
         model = ProductImage
-        fields = '__all__'
+        exclude = IMAGE_PROCESSING_FIELDS
 
-class CompositionSerializer(serializers.ModelSerializer):
+class CompositionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Composition
         fields = '__all__'
@@ -44,29 +166,54 @@ class ProductSubCategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name']
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     category = ProductCategorySerializer(read_only=True)
     sub_category = ProductSubCategorySerializer(read_only=True)
     composition = CompositionSerializer(many=True, read_only=True)
+    renditions = ImageRenditionsField()
     
     class Meta:
         model = Product
-        fields = ['id', 'style_number', 'image', 'category', 'sub_category', 'composition']
+        fields = ['id', 'style_number', 'image', 'renditions', 'category', 'sub_category', 'composition']
+        expandable_fields = {
+            'description': (serializers.CharField, {'read_only': True}),
+            'images': (ProductImageSerializer, {'many': True, 'read_only': True}),
+        }
+        # Cache tags (api.cache.product_tags) need the relation ids
+        always_load = ('category', 'sub_category')
+        field_relations = {
+            'category': {'select_related': ('category',), 'only': ('category__id', 'category__name')},
+            'sub_category': {'select_related': ('sub_category',), 'only': ('sub_category__id', 'sub_category__name')},
+            'composition': {'prefetch_related': (
+                Prefetch('composition', queryset=Composition.objects.only('id', 'material')),
+            )},
+            'images': {'prefetch_related': ('images',)},
+        }
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     composition = serializers.SerializerMethodField()
     category = serializers.SerializerMethodField()
     sub_category = serializers.SerializerMethodField()
     images = serializers.SerializerMethodField()
+    renditions = ImageRenditionsField()
 
     class Meta:
         model = Product
-        fields = '__all__'
+        exclude = IMAGE_PROCESSING_FIELDS
+        always_load = ('category', 'sub_category')
+        field_relations = {
+            'category': {'select_related': ('category',), 'prefetch_related': ('category__subcategories',)},
+            'sub_category': {'select_related': ('sub_category',)},
+            'composition': {'prefetch_related': ('composition',)},
+            'images': {'prefetch_related': ('images',)},
+        }
 
     def get_composition(self, obj):
         return [{'id': c.id, 'material': c.material} for c in obj.composition.all()]
     
     def get_category(self, obj):
+        if obj.category is None:
+            return None
         return {
             'id': obj.category.id,
             'name': obj.category.name,
@@ -77,13 +224,23 @@ class ProductDetailSerializer(serializers.ModelSerializer):
         }
     
     def get_sub_category(self, obj):
+        if obj.sub_category is None:
+            return None
         return {
             'id': obj.sub_category.id,
             'name': obj.sub_category.name
         }
     
     def get_images(self, obj):
-        return [{'id': img.id, 'image': img.image.url} for img in obj.images.all()]
+        request = self.context.get('request')
+        return [
+            {
+                'id': img.id,
+                'image': img.image.url if img.image else None,
+                'renditions': rendition_urls(img.renditions, request)
+            }
+            for img in obj.images.all()
+        ]
 
 
     
@@ -118,16 +275,31 @@ class InquiryCreateSerializer(serializers.ModelSerializer):
         model = Inquiry
         fields = ['name', 'email', 'subject', 'message', 'items']
 
+    def validate_items(self, value):
+        # Batch callers pass {product_id: style_number} for the whole batch
+        # so every row is checked against a single query
+        product_styles = self.context.get('product_styles')
+        if product_styles is None:
+            product_styles = get_product_styles(value)
+            self.context['product_styles'] = product_styles
+        missing = sorted({str(pk) for pk in value if pk not in product_styles})
+        if missing:
+            raise serializers.ValidationError(f"Products not found: {', '.join(missing)}")
+        return value
+
     def create(self, validated_data):
-        items_data = validated_data.pop('items', [])
-        inquiry = Inquiry.objects.create(**validated_data)
+        return create_inquiries([validated_data], self.context.get('product_styles'))[0]
+
 
-        for product_id in items_data:
-            product = get_object_or_404(Product, id=product_id)
-            inquiry_item = InquiryItems.objects.create(product=product)
-            inquiry.items.add(inquiry_item)
+class InquiryBatchItemSerializer(InquiryCreateSerializer):
+    """
+    One inquiry of a batch upload. Clients may send their own `id` so that
+    re-sending a batch after a dropped connection does not duplicate rows.
+    """
+    id = serializers.UUIDField(required=False)
 
-        return inquiry
+    class Meta(InquiryCreateSerializer.Meta):
+        fields = ['id'] + InquiryCreateSerializer.Meta.fields
     
 
 class InquirySerializer(serializers.ModelSerializer):
@@ -1,65 +1,210 @@
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+import logging
+import time
+from datetime import timedelta
+
 from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from api.models import EmailOutbox
+
+
+logger = logging.getLogger(__name__)
+
+NO_RECIPIENTS = 'No recipients: ADMIN_EMAIL is not set'
+
+
+def get_outbox_settings():
+    config = getattr(settings, 'EMAIL_OUTBOX', {})
+    return {
+        'batch_size': config.get('BATCH_SIZE', 50),
+        'max_attempts': config.get('MAX_ATTEMPTS', 8),
+        'backoff_seconds': config.get('BACKOFF_SECONDS', 30),
+        'max_backoff_seconds': config.get('MAX_BACKOFF_SECONDS', 3600),
+    }
+
 
 class EmailService:
+    """
+    Notification emails go through the EmailOutbox table. The queue_* methods
+    only insert a row, so call them inside the transaction that creates the
+    submission; OutboxSender delivers them later.
+    """
     @staticmethod
-    def send_contact_email(contact):
+    def build_email(subject, message):
         """
-        Send email notification for contact form submissions
+        Unsaved outbox row, for callers that bulk_create notifications.
+        Without ADMIN_EMAIL there is nobody to notify: the row is kept for
+        the record but starts out failed, so the worker never sends it.
         """
-        try:
-            subject = f'New Contact Form Submission: {contact.subject}'
-            message = f'''
+        email = EmailOutbox(
+            subject=subject,
+            body=message,
+            from_email=settings.EMAIL_HOST_USER or '',
+            recipients=[settings.ADMIN_EMAIL] if settings.ADMIN_EMAIL else [],
+        )
+        if not email.recipients:
+            email.status = EmailOutbox.Status.FAILED
+            email.last_error = NO_RECIPIENTS
+        return email
+
+    @staticmethod
+    def queue_email(subject, message):
+        email = EmailService.build_email(subject, message)
+        email.save()
+        return email
+
+    @staticmethod
+    def queue_contact_email(contact):
+        """
+        Queue email notification for contact form submissions
+        """
+        subject = f'New Contact Form Submission: {contact.subject}'
+        message = f'''
             Name: {contact.name}
             Email: {contact.email}
             Message: {contact.message}
             '''
-            send_mail(
-                subject,
-                message,
-                settings.EMAIL_HOST_USER,
-                [settings.ADMIN_EMAIL],
-                fail_silently=False,
-            )
-            return True
-        except Exception as e:
-            return False
+        return EmailService.queue_email(subject, message)
 
     @staticmethod
-    def send_inquiry_email(inquiry):
+    def queue_inquiry_email(inquiry):
         """
-        Send email notification for product inquiries
+        Queue email notification for product inquiries
         """
-        try:
-            subject = f'New Product Inquiry from {inquiry.name}'
-            
-            # Create a list of products in the inquiry
-            products_list = "\n".join([
-                f"- {item.product.style_number}" 
-                for item in inquiry.items.all()
-            ])
-            
-            message = f'''
+        style_numbers = inquiry.items.values_list('product__style_number', flat=True)
+        email = EmailService.build_inquiry_email(inquiry, style_numbers)
+        email.save()
+        return email
+
+    @staticmethod
+    def build_inquiry_email(inquiry, style_numbers):
+        subject = f'New Product Inquiry from {inquiry.name}'
+
+        # Create a list of products in the inquiry
+        products_list = "\n".join([
+            f"- {style_number}"
+            for style_number in style_numbers
+        ])
+
+        message = f'''
             New Product Inquiry:
-            
+
             Name: {inquiry.name}
             Email: {inquiry.email}
             Subject: {inquiry.subject}
             Message: {inquiry.message}
-            
+
             Products Inquired:
             {products_list}
             '''
-            
-            send_mail(
-                subject,
-                message,
-                settings.EMAIL_HOST_USER,
-                [settings.ADMIN_EMAIL],
-                fail_silently=False,
-            )
-            return True
+        return EmailService.build_email(subject, message)
+
+
+class OutboxSender:
+    """
+    Deliver due EmailOutbox rows in batches over one reused mail connection.
+
+    Failed sends are retried with exponential backoff until MAX_ATTEMPTS,
+    then marked failed. The connection comes from get_connection(), so
+    pointing EMAIL_HOST/EMAIL_PORT at a local SMTP stand-in (or using the
+    locmem/console backends) exercises the same path.
+    """
+    def __init__(self, connection=None, **overrides):
+        self.config = {**get_outbox_settings(), **{k: v for k, v in overrides.items() if v}}
+        self.connection = connection or get_connection(fail_silently=False)
+
+    def due(self):
+        return list(
+            EmailOutbox.objects.filter(
+                status=EmailOutbox.Status.PENDING,
+                next_attempt_at__lte=timezone.now()
+            ).order_by('next_attempt_at')[:self.config['batch_size']]
+        )
+
+    def backoff(self, attempts):
+        delay = self.config['backoff_seconds'] * 2 ** (attempts - 1)
+        return timedelta(seconds=min(delay, self.config['max_backoff_seconds']))
+
+    def send_batch(self):
+        """Send one batch. Returns (sent, failed) counts."""
+        batch = self.due()
+        if not batch:
+            return 0, 0
+
+        sent = failed = 0
+        try:
+            self.connection.open()
         except Exception as e:
-            return False 
\ No newline at end of file
+            logger.warning('Cannot open mail connection: %s', e)
+            for row in batch:
+                self.record_failure(row, e)
+            return 0, len(batch)
+
+        for row in batch:
+            if not row.recipients:
+                # Retrying cannot help a row with nowhere to go
+                failed += 1
+                EmailOutbox.objects.filter(id=row.id).update(
+                    status=EmailOutbox.Status.FAILED,
+                    attempts=row.attempts + 1,
+                    last_error=NO_RECIPIENTS
+                )
+                continue
+            message = EmailMessage(
+                row.subject,
+                row.body,
+                row.from_email or None,
+                row.recipients,
+                connection=self.connection,
+            )
+            try:
+                self.connection.send_messages([message])
+            except Exception as e:
+                failed += 1
+                self.record_failure(row, e)
+                # A broken connection is reopened for the rest of the batch
+                self.connection.close()
+                try:
+                    self.connection.open()
+                except Exception:
+                    pass
+                continue
+            sent += 1
+            EmailOutbox.objects.filter(id=row.id).update(
+                status=EmailOutbox.Status.SENT,
+                attempts=row.attempts + 1,
+                sent_at=timezone.now(),
+                last_error=''
+            )
+        return sent, failed
+
+    def record_failure(self, row, error):
+        attempts = row.attempts + 1
+        fields = {'attempts': attempts, 'last_error': str(error)}
+        if attempts >= self.config['max_attempts']:
+            fields['status'] = EmailOutbox.Status.FAILED
+        else:
+            fields['next_attempt_at'] = timezone.now() + self.backoff(attempts)
+        EmailOutbox.objects.filter(id=row.id).update(**fields)
+
+    def run(self, once=False, poll_interval=5.0):
+        """
+        Drain the outbox, keeping the connection open across batches.
+        Returns total (sent, failed) when `once` is set.
+        """
+        total_sent = total_failed = 0
+        try:
+            while True:
+                sent, failed = self.send_batch()
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    continue
+                if once:
+                    return total_sent, total_failed
+                # Idle: release the SMTP session until there is work again
+                self.connection.close()
+                time.sleep(poll_interval)
+        finally:
+            self.connection.close()
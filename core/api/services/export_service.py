@@ -0,0 +1,112 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+from uuid import UUID
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from api.models import ContactUs, Inquiry
+
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+CONTACT_FIELDS = ('id', 'created_at', 'name', 'email', 'subject', 'message', 'is_read')
+INQUIRY_FIELDS = CONTACT_FIELDS + ('style_numbers',)
+
+
+class Echo:
+    """File-like object whose write() hands the line back to csv.writer."""
+    def write(self, value):
+        return value
+
+
+def parse_date_range(date_from, date_to):
+    """
+    (start, end) aware datetimes for `created_at >= start` and
+    `created_at < end` from inclusive YYYY-MM-DD bounds. Raises ValueError.
+    """
+    bounds = []
+    for name, value, offset in (('from', date_from, 0), ('to', date_to, 1)):
+        if not value:
+            bounds.append(None)
+            continue
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid '{name}' date: {value}")
+        bounds.append(timezone.make_aware(datetime.combine(day + timedelta(days=offset), time.min)))
+    return tuple(bounds)
+
+
+def filter_created(queryset, start=None, end=None):
+    if start is not None:
+        queryset = queryset.filter(created_at__gte=start)
+    if end is not None:
+        queryset = queryset.filter(created_at__lt=end)
+    return queryset
+
+
+def iter_contacts(start=None, end=None, chunk_size=2000):
+    queryset = filter_created(ContactUs.objects.order_by('created_at', 'id'), start, end)
+    yield from queryset.values(*CONTACT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def iter_inquiries(start=None, end=None, chunk_size=2000):
+    """
+    Inquiries flattened to one row each, with the style numbers of their
+    products as a list. Rows are read with a server-side cursor and the
+    style numbers are fetched once per chunk.
+    """
+    queryset = filter_created(Inquiry.objects.order_by('created_at', 'id'), start, end)
+    chunk = []
+    for row in queryset.values(*CONTACT_FIELDS).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield from _with_style_numbers(chunk)
+            chunk = []
+    if chunk:
+        yield from _with_style_numbers(chunk)
+
+
+def _with_style_numbers(rows):
+    style_numbers = {row['id']: [] for row in rows}
+    links = Inquiry.items.through.objects.filter(inquiry_id__in=style_numbers) \
+        .values_list('inquiry_id', 'inquiryitems__product__style_number')
+    for inquiry_id, style_number in links:
+        style_numbers[inquiry_id].append(style_number)
+    for row in rows:
+        row['style_numbers'] = sorted(style_numbers[row['id']])
+        yield row
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def stream_csv(rows, fields):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        values = []
+        for field in fields:
+            value = _plain(row[field])
+            values.append(';'.join(value) if isinstance(value, list) else value)
+        yield writer.writerow(values)
+
+
+def stream_ndjson(rows, fields):
+    for row in rows:
+        yield json.dumps({field: _plain(row[field]) for field in fields}) + '\n'
+
+
+def stream_export(rows, fields, file_format):
+    if file_format == 'csv':
+        return stream_csv(rows, fields)
+    return stream_ndjson(rows, fields)
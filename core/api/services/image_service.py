@@ -0,0 +1,320 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from PIL import Image
+
+from api.cache import bump_cache_tags, collection_tag, instance_tag
+from api.models import Category, ImageStatus, Product, ProductImage
+
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_DIR = 'derivatives'
+
+# Every model with a processed `image`
+IMAGE_MODELS = (Product, ProductImage, Category)
+
+MIME_TYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+}
+
+
+def get_supported_formats(formats):
+    """Requested formats the installed Pillow can encode; JPEG always last."""
+    Image.init()
+    supported = [f.upper() for f in formats if f.upper() != 'JPEG' and f.upper() in Image.SAVE]
+    return supported + ['JPEG']
+
+
+def get_optimization_options():
+    config = getattr(settings, 'IMAGE_OPTIMIZATION', {})
+    renditions = getattr(settings, 'IMAGE_RENDITIONS', {})
+    return {
+        'max_size': (config.get('MAX_WIDTH', 800), config.get('MAX_HEIGHT', 800)),
+        'quality': config.get('QUALITY', 80),
+        'format': config.get('FORMAT', 'JPEG'),
+        'renditions': sorted(renditions.get('SIZES', {}).items(), key=lambda item: item[1]),
+        'rendition_formats': get_supported_formats(renditions.get('FORMATS', [])),
+        'rendition_quality': renditions.get('QUALITY', {}),
+    }
+
+
+def get_extension(image_format):
+    return '.jpg' if image_format == 'JPEG' else f'.{image_format.lower()}'
+
+
+def processing_key(fileobj, options):
+    """
+    SHA-256 of the source bytes plus the optimization options. Equal keys
+    always produce the same derivatives.
+    """
+    digest = hashlib.sha256(json.dumps(options, sort_keys=True).encode())
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(64 * 1024), b''):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def derivative_base(key):
+    return f'{DERIVATIVE_DIR}/{key[:2]}/{key}'
+
+
+def manifest_name(key):
+    return derivative_base(key) + '.json'
+
+
+def load_manifest(storage, key):
+    """
+    {'image': <name>, 'renditions': {...}} stored for `key`, or None if the
+    source has not been processed with these options yet.
+    """
+    name = manifest_name(key)
+    if not storage.exists(name):
+        return None
+    with storage.open(name, 'rb') as manifest:
+        return json.loads(manifest.read())
+
+
+def find_derivative(fieldfile, options):
+    """
+    (key, manifest) for a freshly uploaded file; `manifest` is None unless
+    the same content was already processed with the same options.
+    """
+    key = processing_key(fieldfile.file, options)
+    return key, load_manifest(fieldfile.storage, key)
+
+
+def _encode(img, image_format, quality):
+    output = BytesIO()
+    img.save(output, format=image_format, quality=quality, optimize=True)
+    return output.getvalue()
+
+
+def optimize_image_bytes(data, options):
+    """
+    Resize and re-encode one image into the main derivative and every
+    rendition. Runs in a worker process, so it only takes and returns plain
+    data: (main_bytes, [(size_name, width, format, bytes), ...]).
+    """
+    img = Image.open(BytesIO(data))
+
+    # Convert to RGB if image is in RGBA mode
+    if img.mode in ('RGBA', 'P', 'LA'):
+        img = img.convert('RGB')
+
+    main = img.copy()
+    main.thumbnail(options['max_size'], Image.Resampling.LANCZOS)
+    main_bytes = _encode(main, options['format'], options['quality'])
+
+    renditions = []
+    for index, (size_name, width) in enumerate(options['renditions']):
+        # Never upscale; the smallest size is always produced
+        if width > img.width and index > 0:
+            break
+        resized = img.copy()
+        resized.thumbnail((width, img.height), Image.Resampling.LANCZOS)
+        for image_format in options['rendition_formats']:
+            quality = options['rendition_quality'].get(image_format, options['quality'])
+            renditions.append((size_name, resized.width, image_format, _encode(resized, image_format, quality)))
+    return main_bytes, renditions
+
+
+def rendition_urls(renditions, request=None):
+    """
+    srcset-ready view of a stored renditions map:
+
+    {'srcset': {'image/webp': '<url> 200w, <url> 400w', ...},
+     'sizes': {'thumb': {'width': 200, 'image/webp': <url>, ...}, ...}}
+    """
+    if not renditions:
+        return None
+
+    def url(name):
+        value = default_storage.url(name)
+        return request.build_absolute_uri(value) if request is not None else value
+
+    srcset = {}
+    sizes = {}
+    for size_name, entry in sorted(renditions.items(), key=lambda item: item[1]['width']):
+        width = entry['width']
+        sizes[size_name] = {'width': width}
+        for fmt, mime in MIME_TYPES.items():
+            if fmt in entry:
+                sizes[size_name][mime] = url(entry[fmt])
+                srcset.setdefault(mime, []).append(f'{sizes[size_name][mime]} {width}w')
+    return {
+        'srcset': {mime: ', '.join(items) for mime, items in srcset.items()},
+        'sizes': sizes,
+    }
+
+
+class ImageProcessor:
+    """
+    Drains pending product, gallery and category images through a process pool.
+
+    Rows whose `image_status` is pending form the queue: admin writes only
+    store the raw upload and mark it pending (see api.signals). Each job is
+    claimed by flipping pending -> processing in a conditional UPDATE, so
+    of two workers racing for a row only one sees it change. Results are
+    written back with QuerySet.update(), so no save signals re-queue them,
+    and only while the row is still processing: a job re-queued by a new
+    upload or finished by another worker is left alone.
+
+    Derivatives are stored content-addressed under derivatives/, keyed by
+    processing_key(), with a JSON manifest listing the main image and the
+    renditions; a source whose manifest already exists is pointed at it
+    without decoding anything.
+    """
+    models = IMAGE_MODELS
+
+    def __init__(self, workers=None, batch_size=None):
+        config = getattr(settings, 'IMAGE_OPTIMIZATION', {})
+        self.workers = workers or config.get('WORKERS') or os.cpu_count()
+        self.batch_size = batch_size or config.get('BATCH_SIZE', 50)
+        self.options = get_optimization_options()
+
+    def requeue_stale(self):
+        """
+        Return jobs left in processing by a worker that died mid-batch. Jobs
+        of a worker still running are returned too; its guarded finish()
+        turns that into repeated work, not conflicting results.
+        """
+        for model in self.models:
+            model.objects.filter(image_status=ImageStatus.PROCESSING).update(
+                image_status=ImageStatus.PENDING
+            )
+
+    def pending_ids(self, model):
+        return list(
+            model.objects.filter(image_status=ImageStatus.PENDING)
+            .values_list('id', flat=True)[:self.batch_size]
+        )
+
+    def claim(self, model):
+        """Claim up to batch_size pending rows; rows another worker got first are skipped."""
+        claimed = [
+            pk for pk in self.pending_ids(model)
+            if model.objects.filter(id=pk, image_status=ImageStatus.PENDING)
+            .update(image_status=ImageStatus.PROCESSING)
+        ]
+        return list(model.objects.filter(id__in=claimed))
+
+    def run_once(self, executor):
+        """Process one batch of each model. Returns the number of jobs handled."""
+        handled = 0
+        for model in self.models:
+            jobs = {}
+            claimed = self.claim(model)
+            handled += len(claimed)
+            for instance in claimed:
+                if not instance.image:
+                    self.finish(instance, ImageStatus.READY)
+                    continue
+                try:
+                    with instance.image.open('rb') as source:
+                        data = source.read()
+                except (OSError, ValueError) as e:
+                    logger.warning('Cannot read %s: %s', instance.image.name, e)
+                    self.finish(instance, ImageStatus.FAILED)
+                    continue
+                key = processing_key(BytesIO(data), self.options)
+                manifest = load_manifest(instance.image.storage, key)
+                if manifest is not None:
+                    if self.finish(instance, ImageStatus.READY, key, manifest):
+                        self.replace_source(instance, manifest)
+                    continue
+                future = executor.submit(optimize_image_bytes, data, self.options)
+                jobs[future] = (instance, key)
+
+            for future in as_completed(jobs):
+                instance, key = jobs[future]
+                try:
+                    main_bytes, renditions = future.result()
+                except Exception as e:
+                    logger.warning('Optimizing %s failed: %s', instance.image.name, e)
+                    self.finish(instance, ImageStatus.FAILED)
+                    continue
+                manifest = self.store(instance.image.storage, key, main_bytes, renditions)
+                if self.finish(instance, ImageStatus.READY, key, manifest):
+                    self.replace_source(instance, manifest)
+        return handled
+
+    def store(self, storage, key, main_bytes, renditions):
+        """Write the derivatives, then the manifest that makes them reusable."""
+        base = derivative_base(key)
+
+        def save(name, content):
+            if storage.exists(name):
+                return name
+            return storage.save(name, ContentFile(content))
+
+        manifest = {
+            'image': save(base + get_extension(self.options['format']), main_bytes),
+            'renditions': {},
+        }
+        for size_name, width, image_format, content in renditions:
+            entry = manifest['renditions'].setdefault(size_name, {'width': width})
+            entry[image_format.lower()] = save(f'{base}-{width}w{get_extension(image_format)}', content)
+        if not storage.exists(manifest_name(key)):
+            storage.save(manifest_name(key), ContentFile(json.dumps(manifest).encode()))
+        return manifest
+
+    def source_in_use(self, name):
+        return any(model.objects.filter(image=name).exists() for model in IMAGE_MODELS)
+
+    def replace_source(self, instance, manifest):
+        """
+        Drop the raw upload once the instance points at its derivative (call
+        after finish()). Rows can share a file name, e.g. copies or seeded
+        data, so the file stays while any other row still refers to it.
+        """
+        raw_name = instance.image.name
+        if raw_name == manifest['image'] or raw_name.startswith(f'{DERIVATIVE_DIR}/'):
+            return
+        if not self.source_in_use(raw_name):
+            instance.image.storage.delete(raw_name)
+
+    def finish(self, instance, image_status, key=None, manifest=None):
+        """Record the result of a claimed job. Returns False if the row is no longer ours."""
+        fields = {'image_status': image_status}
+        if manifest is not None:
+            fields.update(image=manifest['image'], image_hash=key, renditions=manifest['renditions'])
+        updated = type(instance).objects.filter(
+            id=instance.id, image_status=ImageStatus.PROCESSING, image=instance.image.name
+        ).update(**fields)
+        if not updated:
+            return False
+        # update() sends no signals, so refresh the cached payloads here
+        tags = [instance_tag(instance), collection_tag(type(instance))]
+        if isinstance(instance, ProductImage):
+            tags.append(collection_tag(Product))
+        bump_cache_tags(*tags)
+        return True
+
+    def run(self, once=False, poll_interval=2.0):
+        """
+        Process jobs until the queue is empty (`once`) or forever, polling
+        every `poll_interval` seconds while idle. Run a single worker command;
+        parallelism comes from the process pool.
+        """
+        self.requeue_stale()
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                close_old_connections()
+                if self.run_once(executor):
+                    continue
+                if once:
+                    return
+                time.sleep(poll_interval)
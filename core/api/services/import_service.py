@@ -0,0 +1,205 @@
+import csv
+import io
+import json
+import os
+
+from django.db import transaction
+
+from api import facets, search
+from api.cache import bump_cache_tags, collection_tag
+from api.models import Category, Composition, ImageStatus, Product, ProductImage, SubCategory
+
+
+TEXT_FIELDS = ('style_number', 'gauge', 'end', 'weight')
+FORMATS = ('csv', 'jsonl')
+
+# Multi-valued CSV cells: "Cotton;Wool"
+LIST_SEPARATOR = ';'
+
+
+def detect_format(filename, default='csv'):
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if extension in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if extension == 'csv':
+        return 'csv'
+    return default
+
+
+def iter_rows(fileobj, file_format):
+    """
+    Yield (line_number, row) from a binary CSV or JSONL stream, one line at
+    a time. Rows that cannot be parsed are yielded as (line_number, None).
+    """
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    if file_format == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+def _split(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value).split(LIST_SEPARATOR) if v.strip()]
+
+
+class ProductImporter:
+    """
+    Bulk product import from a CSV/JSONL line sheet.
+
+    Columns: style_number (required), gauge, end, weight, description,
+    category, sub_category, composition, image, images. Relations are given
+    by name and resolved through lookup maps loaded once; composition and
+    images take several values (a list in JSONL, `;`-separated in CSV).
+    image/images are names of files already in media storage and are queued
+    for the image worker.
+
+    Valid rows are inserted with bulk_create in chunks, each chunk in its own
+    transaction. bulk_create sends no signals, so the search and facet
+    indexes are updated per chunk and the catalog cache tags are bumped once
+    at the end.
+    """
+    def __init__(self, chunk_size=500, create_missing=False, max_errors=1000):
+        self.chunk_size = chunk_size
+        self.create_missing = create_missing
+        self.max_errors = max_errors
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+        self.new_relations = set()
+
+        self.categories = {c.name.lower(): c for c in Category.objects.all()}
+        self.sub_categories = {s.name.lower(): s for s in SubCategory.objects.all()}
+        self.compositions = {c.material.lower(): c for c in Composition.objects.all()}
+        self.category_links = set(
+            Category.subcategories.through.objects.values_list('category_id', 'subcategory_id')
+        )
+
+    def add_error(self, line_number, errors):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': line_number, 'errors': errors})
+
+    def resolve(self, lookup, model, field, name, errors, key):
+        if not name:
+            return None
+        instance = lookup.get(name.lower())
+        if instance is None:
+            if not self.create_missing:
+                errors.setdefault(key, []).append(f"Unknown {key.replace('_', ' ')}: {name}")
+                return None
+            instance = model.objects.create(**{field: name})
+            lookup[name.lower()] = instance
+            self.new_relations.add(model)
+        return instance
+
+    def build(self, row):
+        """(product, composition ids, image names) for a row, or raise ValueError(errors)."""
+        errors = {}
+        values = {field: str(row.get(field) or '').strip() for field in TEXT_FIELDS}
+        if not values['style_number']:
+            errors['style_number'] = ['This field is required.']
+        for field, value in values.items():
+            if len(value) > 50:
+                errors.setdefault(field, []).append('Ensure this field has no more than 50 characters.')
+
+        category = self.resolve(self.categories, Category, 'name',
+                                str(row.get('category') or '').strip(), errors, 'category')
+        sub_category = self.resolve(self.sub_categories, SubCategory, 'name',
+                                    str(row.get('sub_category') or '').strip(), errors, 'sub_category')
+        compositions = [
+            self.resolve(self.compositions, Composition, 'material', name, errors, 'composition')
+            for name in _split(row.get('composition'))
+        ]
+        if errors:
+            raise ValueError(errors)
+
+        if category and sub_category and (category.id, sub_category.id) not in self.category_links:
+            category.subcategories.add(sub_category)
+            self.category_links.add((category.id, sub_category.id))
+            self.new_relations.add(Category)
+
+        image = str(row.get('image') or '').strip()
+        product = Product(
+            **values,
+            description=str(row.get('description') or ''),
+            category=category,
+            sub_category=sub_category,
+            image=image or None,
+            image_status=ImageStatus.PENDING if image else ImageStatus.READY,
+        )
+        composition_ids = list(dict.fromkeys(c.id for c in compositions))
+        return product, composition_ids, _split(row.get('images'))
+
+    @transaction.atomic
+    def flush(self, batch):
+        products = [product for product, _, _ in batch]
+        Product.objects.bulk_create(products)
+
+        Through = Product.composition.through
+        Through.objects.bulk_create([
+            Through(product_id=product.id, composition_id=composition_id)
+            for product, composition_ids, _ in batch
+            for composition_id in composition_ids
+        ])
+
+        images = []
+        image_links = []
+        for product, _, image_names in batch:
+            for name in image_names:
+                image = ProductImage(image=name, image_status=ImageStatus.PENDING)
+                images.append(image)
+                image_links.append(Product.images.through(product_id=product.id, productimage_id=image.id))
+        ProductImage.objects.bulk_create(images)
+        Product.images.through.objects.bulk_create(image_links)
+
+        product_ids = [product.id for product in products]
+        search.index_products(product_ids)
+        facets.sync_product_facets(product_ids)
+        self.created += len(products)
+
+    def run(self, fileobj, file_format='csv'):
+        """Import every row of `fileobj`. Returns self for the counters."""
+        batch = []
+        try:
+            for line_number, row in iter_rows(fileobj, file_format):
+                if row is None:
+                    self.add_error(line_number, {'row': ['Invalid JSON object']})
+                    continue
+                try:
+                    batch.append(self.build(row))
+                except ValueError as e:
+                    self.add_error(line_number, e.args[0])
+                    continue
+                if len(batch) >= self.chunk_size:
+                    self.flush(batch)
+                    batch = []
+            if batch:
+                self.flush(batch)
+        except UnicodeDecodeError:
+            self.add_error(None, {'file': ['File is not valid UTF-8']})
+        finally:
+            if self.created or self.new_relations:
+                tags = [collection_tag(Product), collection_tag(ProductImage)]
+                tags.extend(collection_tag(model) for model in self.new_relations)
+                bump_cache_tags(*tags)
+        return self
+
+    def summary(self):
+        return {
+            'created': self.created,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
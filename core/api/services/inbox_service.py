@@ -0,0 +1,41 @@
+from uuid import UUID
+
+from api.models import Inquiry
+from api.services.export_service import filter_created, parse_date_range
+
+
+BOOLEAN_VALUES = {'true': True, '1': True, 'false': False, '0': False}
+
+
+def filter_submissions(queryset, params):
+    """
+    Apply the admin inbox filters to a ContactUs or Inquiry queryset:
+
+    - is_read: true/false
+    - from, to: inclusive YYYY-MM-DD bounds on created_at
+    - product: product id (inquiries only)
+
+    Raises ValueError on malformed values and on filters the model does
+    not support.
+    """
+    is_read = params.get('is_read')
+    if is_read not in (None, ''):
+        if is_read.lower() not in BOOLEAN_VALUES:
+            raise ValueError(f"Invalid 'is_read' value: {is_read}")
+        queryset = queryset.filter(is_read=BOOLEAN_VALUES[is_read.lower()])
+
+    queryset = filter_created(queryset, *parse_date_range(params.get('from'), params.get('to')))
+
+    product = params.get('product')
+    if product:
+        if queryset.model is not Inquiry:
+            # Ignoring it would widen a bulk action to every submission
+            raise ValueError("The 'product' filter only applies to inquiries")
+        try:
+            product = UUID(product)
+        except ValueError:
+            raise ValueError(f"Invalid 'product' id: {product}")
+        # A subquery on the M2M table avoids duplicate rows from joining items
+        queryset = queryset.filter(id__in=Inquiry.items.through.objects.filter(
+            inquiryitems__product_id=product).values('inquiry_id'))
+    return queryset
@@ -0,0 +1,64 @@
+from django.db import transaction
+from django.db.models import Prefetch
+
+from api.models import Inquiry, InquiryItems, Product, EmailOutbox
+from api.services.email_service import EmailService
+
+
+def get_product_styles(product_ids):
+    """{product_id: style_number} for the given ids, in one query."""
+    return dict(
+        Product.objects.filter(id__in=set(product_ids)).values_list('id', 'style_number')
+    )
+
+
+def inquiries_with_items():
+    """
+    Inquiry queryset that serializes through InquirySerializer without
+    per-item queries.
+    """
+    return Inquiry.objects.prefetch_related(
+        Prefetch(
+            'items',
+            queryset=InquiryItems.objects.select_related(
+                'product__category', 'product__sub_category'
+            ).prefetch_related('product__composition')
+        )
+    )
+
+
+@transaction.atomic
+def create_inquiries(rows, product_styles=None):
+    """
+    Create inquiries from validated InquiryCreateSerializer data with a fixed
+    number of queries: one product lookup (skipped when `product_styles` is
+    given), then one bulk insert each for inquiries, items, M2M rows and
+    notification emails. Product ids must already be validated.
+    """
+    if product_styles is None:
+        product_styles = get_product_styles(
+            product_id for row in rows for product_id in row.get('items', [])
+        )
+
+    inquiries = []
+    items = []
+    links = []
+    emails = []
+    for row in rows:
+        row = dict(row)
+        product_ids = row.pop('items', [])
+        inquiry = Inquiry(**row)
+        inquiries.append(inquiry)
+        for product_id in product_ids:
+            item = InquiryItems(product_id=product_id)
+            items.append(item)
+            links.append(Inquiry.items.through(inquiry_id=inquiry.id, inquiryitems_id=item.id))
+        emails.append(EmailService.build_inquiry_email(
+            inquiry, [product_styles[product_id] for product_id in product_ids]
+        ))
+
+    Inquiry.objects.bulk_create(inquiries)
+    InquiryItems.objects.bulk_create(items)
+    Inquiry.items.through.objects.bulk_create(links)
+    EmailOutbox.objects.bulk_create(emails)
+    return inquiries
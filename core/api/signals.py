@@ -1,59 +1,141 @@
-from django.db.models.signals import pre_save
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, pre_delete, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
-from PIL import Image
-from io import BytesIO
-from django.core.files.uploadedfile import InMemoryUploadedFile
-import sys
-from api.models import Product
+from api.models import Product, Category, SubCategory, Composition, ProductImage, ImageStatus
+from api.cache import bump_cache_tags, instance_tag, collection_tag
+from api import search, facets
+from api.services import image_service
 
 @receiver(pre_save, sender=Product)
-def optimize_image(sender, instance, **kwargs):
-    if instance.image:
-        # Open the uploaded image
-        img = Image.open(instance.image)
-        
-        # Convert to RGB if image is in RGBA mode
-        if img.mode == 'RGBA':
-            img = img.convert('RGB')
-        
-        # Set maximum dimensions
-        max_size = (800, 800)  # You can adjust these dimensions
-        img.thumbnail(max_size, Image.Resampling.LANCZOS)
-        
-        # Create a BytesIO object to store the optimized image
-        output = BytesIO()
-        
-        # Save the image with optimal quality (80% is usually a good balance)
-        img.save(output, format='JPEG', quality=80, optimize=True)
-        output.seek(0)
-        
-        # Replace the image field with optimized version
-        instance.image = InMemoryUploadedFile(
-            output,
-            'ImageField',
-            f"{instance.image.name.split('.')[0]}.jpg",
-            'image/jpeg',
-            sys.getsizeof(output),
-            None
+@receiver(pre_save, sender=ProductImage)
+@receiver(pre_save, sender=Category)
+def queue_image_optimization(sender, instance, **kwargs):
+    """
+    Store new uploads as-is and leave optimization to the process_images
+    worker (api.services.image_service), so admin writes return immediately.
+
+    Uploads whose content was already optimized with the current settings
+    reuse the stored derivative and are never written or queued.
+    """
+    # An uncommitted file is a fresh upload that has not been written yet
+    if instance.image and not instance.image._committed:
+        key, manifest = image_service.find_derivative(
+            instance.image, image_service.get_optimization_options()
         )
+        if manifest is not None:
+            instance.image = manifest['image']
+            instance.image_hash = key
+            instance.renditions = manifest['renditions']
+            instance.image_status = ImageStatus.READY
+        else:
+            instance.renditions = {}
+            instance.image_status = ImageStatus.PENDING
+
+
+
+# Catalog cache invalidation
+#
+# Every save/delete bumps the instance's own tag and its model's collection
+# tag; M2M changes bump both sides. See api.cache for how tags are used.
+
+CATALOG_MODELS = (Product, Category, SubCategory, Composition, ProductImage)
+
+
+def bump_catalog_tags(sender, instance, **kwargs):
+    bump_cache_tags(instance_tag(instance), collection_tag(sender))
+
+
+# Connected per model: a receiver without a sender would make every
+# queryset delete (e.g. bulk inquiry triage) fetch and signal row by row
+for model in CATALOG_MODELS:
+    post_save.connect(bump_catalog_tags, sender=model)
+    post_delete.connect(bump_catalog_tags, sender=model)
+
+
+@receiver(m2m_changed, sender=Product.composition.through)
+@receiver(m2m_changed, sender=Product.images.through)
+@receiver(m2m_changed, sender=Category.subcategories.through)
+def bump_catalog_relation_tags(sender, instance, action, model, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    tags = {instance_tag(instance), collection_tag(type(instance)), collection_tag(model)}
+    # pk_set is None on clear(), where the instance's own tag is enough
+    tags.update(f'{model._meta.model_name}:{pk}' for pk in pk_set or ())
+    bump_cache_tags(*tags)
+
+
+# Derived product indexes: full-text search (api.search) and facets (api.facets)
+
+def reindex_products(product_ids):
+    product_ids = list(product_ids)
+    search.index_products(product_ids)
+    facets.sync_product_facets(product_ids)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    reindex_products([instance.pk])
+
+
+@receiver(pre_delete, sender=Product)
+def unindex_product_facets(sender, instance, **kwargs):
+    facets.remove_product_facets(instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+
+
+@receiver(m2m_changed, sender=Product.composition.through)
+def reindex_product_materials(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        reindex_products([instance.pk])
+    elif pk_set:
+        reindex_products(pk_set)
+    else:
+        reindex_products(instance.product_materials.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, **kwargs):
+    if not created:
+        search.index_products(instance.products.values_list('id', flat=True))
+        facets.update_facet_label('category', instance.pk, instance.name)
+
+
+@receiver(post_save, sender=SubCategory)
+def relabel_sub_category_facet(sender, instance, created, **kwargs):
+    if not created:
+        facets.update_facet_label('sub_category', instance.pk, instance.name)
+
+
+@receiver(post_save, sender=Composition)
+def reindex_composition_products(sender, instance, created, **kwargs):
+    if not created:
+        search.index_products(instance.product_materials.values_list('id', flat=True))
+        facets.update_facet_label('composition', instance.pk, instance.material)
+
+
+@receiver(pre_delete, sender=Composition)
+def reindex_products_without_composition(sender, instance, **kwargs):
+    # The M2M rows are gone by post_delete, so collect the products now
+    product_ids = list(instance.product_materials.values_list('id', flat=True))
+    transaction.on_commit(lambda: reindex_products(product_ids))
+
 
-    # Handle additional images if they exist
-    if hasattr(instance, 'images'):
-        for image in instance.images.all():
-            if image.image:
-                img = Image.open(image.image)
-                if img.mode == 'RGBA':
-                    img = img.convert('RGB')
-                img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                output = BytesIO()
-                img.save(output, format='JPEG', quality=80, optimize=True)
-                output.seek(0)
-                image.image = InMemoryUploadedFile(
-                    output,
-                    'ImageField',
-                    f"{image.image.name.split('.')[0]}.jpg",
-                    'image/jpeg',
-                    sys.getsizeof(output),
-                    None
-                )
-                image.save() 
\ No newline at end of file
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    Tune every new SQLite connection with settings.SQLITE_PRAGMAS. With
+    CONN_MAX_AGE this runs once per persistent connection, not per request.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,176 @@
+"""
+Query budgets for API routes.
+
+A test case mixes in QueryBudgetMixin and lists one QueryBudget per route.
+Every route is requested against fixtures of each size in `fixture_sizes`,
+and the test fails when a request runs more than `max_queries` queries at
+any size, or when its query count grows by more than `max_growth` between
+the smallest and the largest fixtures. The default growth of 0 means the
+query count must not depend on the number of rows, which is what an N+1
+regression breaks first.
+"""
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+from . import facets, search
+from .benchmarks import ENDS, GAUGES, WEIGHTS, QueryCounter
+from .models import (
+    Category, Composition, ContactUs, Inquiry, InquiryItems, Product, ProductImage, SubCategory
+)
+
+
+class QueryBudget:
+    """
+    One route and its budget. `path` and string values in `data` are
+    formatted with the fixture context, e.g. '/api/products/{product}/';
+    `data` may also be a callable taking the context. `admin` requests are
+    made as an authenticated superuser.
+    """
+    def __init__(self, method, path, max_queries, max_growth=0, data=None, admin=False, status=200):
+        self.method = method.lower()
+        self.path = path
+        self.max_queries = max_queries
+        self.max_growth = max_growth
+        self.data = data
+        self.admin = admin
+        self.status = status
+
+    def __str__(self):
+        return f'{self.method.upper()} {self.path}'
+
+    def build(self, context):
+        data = self.data(context) if callable(self.data) else self.data
+        if isinstance(data, dict):
+            data = {key: value.format(**context) if isinstance(value, str) else value
+                    for key, value in data.items()}
+        return self.path.format(**context), data
+
+
+def catalog_fixtures(size):
+    """
+    `size` rows in every catalog and inbox table, each with the relations
+    the serializers render, and the search and facet indexes built. Returns
+    the ids and values the route templates refer to.
+    """
+    subcategories = SubCategory.objects.bulk_create([SubCategory(name=f'Sub {i}') for i in range(size)])
+    categories = Category.objects.bulk_create([
+        Category(name=f'Category {i}', image=f'category_images/category-{i}.jpg') for i in range(size)
+    ])
+    Category.subcategories.through.objects.bulk_create([
+        Category.subcategories.through(category_id=category.id, subcategory_id=subcategories[(i + k) % size].id)
+        for i, category in enumerate(categories) for k in range(min(2, size))
+    ])
+    compositions = Composition.objects.bulk_create([Composition(material=f'Material {i}') for i in range(size)])
+    images = ProductImage.objects.bulk_create([
+        ProductImage(image=f'product_images/gallery-{i}.jpg') for i in range(size)
+    ])
+    products = Product.objects.bulk_create([
+        Product(
+            style_number=f'STY-{i:05d}',
+            gauge=GAUGES[i % len(GAUGES)],
+            end=ENDS[i % len(ENDS)],
+            weight=WEIGHTS[i % len(WEIGHTS)],
+            description=f'Knitted sweater {i}',
+            category=categories[i],
+            sub_category=subcategories[i],
+            image=f'product_images/product-{i}.jpg',
+        )
+        for i in range(size)
+    ])
+    Product.composition.through.objects.bulk_create([
+        Product.composition.through(product_id=product.id, composition_id=compositions[(i + k) % size].id)
+        for i, product in enumerate(products) for k in range(min(2, size))
+    ])
+    Product.images.through.objects.bulk_create([
+        Product.images.through(product_id=product.id, productimage_id=images[(i + k) % size].id)
+        for i, product in enumerate(products) for k in range(min(2, size))
+    ])
+
+    contacts = ContactUs.objects.bulk_create([
+        ContactUs(name=f'Buyer {i}', email=f'buyer{i}@example.com', subject='Samples', message='Please send')
+        for i in range(size)
+    ])
+    inquiries = Inquiry.objects.bulk_create([
+        Inquiry(name=f'Buyer {i}', email=f'buyer{i}@example.com', subject='Samples', message='Please send')
+        for i in range(size)
+    ])
+    items = InquiryItems.objects.bulk_create([
+        InquiryItems(product_id=products[(i + k) % size].id) for i in range(size) for k in range(2)
+    ])
+    Inquiry.items.through.objects.bulk_create([
+        Inquiry.items.through(inquiry_id=inquiry.id, inquiryitems_id=items[i * 2 + k].id)
+        for i, inquiry in enumerate(inquiries) for k in range(2)
+    ])
+
+    search.rebuild_search_index()
+    facets.rebuild_facet_index()
+    return {
+        'product': products[0].id,
+        'products': [str(product.id) for product in products[:5]],
+        'category': categories[0].id,
+        'gauge': products[0].gauge,
+        'contact': contacts[0].id,
+        'contacts': [str(contact.id) for contact in contacts[:5]],
+        'inquiry': inquiries[0].id,
+    }
+
+
+class QueryBudgetMixin:
+    """
+    Mix into a TestCase and set `budgets`. Override `build_fixtures()` for
+    fixtures other than catalog_fixtures().
+    """
+    budgets = ()
+    fixture_sizes = (10, 1000)
+
+    def build_fixtures(self, size):
+        return catalog_fixtures(size)
+
+    def count_queries(self, budget, context):
+        # Cached responses would hide the queries of the view
+        cache.clear()
+        client = APIClient()
+        if budget.admin:
+            client.force_authenticate(self.budget_user)
+        path, data = budget.build(context)
+        extra = {} if budget.method == 'get' else {'format': 'json'}
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            response = getattr(client, budget.method)(path, data, **extra)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(
+            response.status_code, budget.status,
+            f'{budget} returned {response.status_code}, the budget would measure the wrong path'
+        )
+        return queries.count
+
+    def test_query_budgets(self):
+        self.budget_user = get_user_model().objects.create_superuser('budget', password='budget')
+        counts = {budget: [] for budget in self.budgets}
+        # Repeated requests would otherwise run into the anonymous rate limit
+        with mock.patch.object(APIView, 'throttle_classes', []):
+            for size in self.fixture_sizes:
+                savepoint = transaction.savepoint()
+                context = self.build_fixtures(size)
+                for budget in self.budgets:
+                    counts[budget].append(self.count_queries(budget, context))
+                transaction.savepoint_rollback(savepoint)
+
+        sizes = ', '.join(map(str, self.fixture_sizes))
+        for budget, budget_counts in counts.items():
+            with self.subTest(route=str(budget)):
+                measured = f'{budget_counts} queries for {sizes} rows'
+                self.assertLessEqual(
+                    max(budget_counts), budget.max_queries,
+                    f'{budget} exceeds its budget of {budget.max_queries} queries: {measured}'
+                )
+                self.assertLessEqual(
+                    budget_counts[-1] - budget_counts[0], budget.max_growth,
+                    f'{budget} grows by more than {budget.max_growth} queries: {measured}'
+                )
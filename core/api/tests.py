@@ -1,3 +1,1234 @@
-from django.test import TestCase
+import io
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from smtplib import SMTPException
+from unittest import mock
+from uuid import RFC_4122
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import OperationalError, connection, connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .facets import rebuild_facet_index
+from .fast_serializers import CategoryRowSerializer, ProductRowSerializer
+from .ids import uuid7
+from .models import (
+    Category, Composition, ContactUs, EmailOutbox, ImageStatus, Inquiry, Product, ProductImage, SubCategory
+)
+from .cache import GUARD_TAGS, bump_cache_tags
+from .serializers import CategorySerializer, ProductDetailSerializer, ProductSerializer
+from .services.email_service import EmailService, OutboxSender
+from .services.image_service import (
+    ImageProcessor, get_optimization_options, get_supported_formats, load_manifest, optimize_image_bytes,
+    rendition_urls
+)
+from .testing import QueryBudget, QueryBudgetMixin, catalog_fixtures
+
+
+RENDITIONS = {
+    'thumb': {'width': 200, 'webp': 'derivatives/ab/ab-200w.webp', 'jpeg': 'derivatives/ab/ab-200w.jpg'},
+    'medium': {'width': 400, 'jpeg': 'derivatives/ab/ab-400w.jpg'},
+}
+
+
+def normalize(data):
+    """
+    Plain JSON, with relation lists sorted by id: neither path defines an
+    order for M2M relations.
+    """
+    data = json.loads(json.dumps(data))
+
+    def sort_lists(value):
+        if isinstance(value, dict):
+            return {key: sort_lists(item) for key, item in value.items()}
+        if isinstance(value, list):
+            items = [sort_lists(item) for item in value]
+            if all(isinstance(item, dict) and 'id' in item for item in items):
+                items.sort(key=lambda item: item['id'])
+            return items
+        return value
+    return sort_lists(data)
+
+
+class FastSerializerCompatibilityTests(TestCase):
+    """The values() read path renders exactly what the DRF serializers do."""
+
+    @classmethod
+    def setUpTestData(cls):
+        knit = Category.objects.create(name='Knitwear', image='category_images/knit.jpg')
+        Category.objects.filter(id=knit.id).update(renditions=RENDITIONS)
+        Category.objects.create(name='Empty')
+        crew = SubCategory.objects.create(name='Crew neck')
+        vneck = SubCategory.objects.create(name='V neck')
+        knit.subcategories.add(crew, vneck)
+        cotton = Composition.objects.create(material='Cotton')
+        wool = Composition.objects.create(material='Wool')
+
+        full = Product.objects.create(
+            style_number='KN-001', gauge='12GG', end='2', weight='300g', description='Crew sweater',
+            category=knit, sub_category=crew, image='product_images/kn-001.jpg'
+        )
+        Product.objects.filter(id=full.id).update(renditions=RENDITIONS)
+        full.composition.set([cotton, wool])
+        gallery = ProductImage.objects.create(image='product_images/kn-001-back.jpg')
+        ProductImage.objects.filter(id=gallery.id).update(renditions=RENDITIONS)
+        full.images.add(gallery, ProductImage.objects.create())
+
+        bare = Product.objects.create(style_number='KN-002', description='')
+        bare.composition.set([wool])
+        Product.objects.create(style_number='KN-003', category=knit)
+
+    def assertSameOutput(self, serializer_class, row_serializer_class, queryset, fields=None, request=None):
+        context = {'request': request} if request is not None else {}
+        expected = serializer_class(
+            serializer_class.narrow_queryset(queryset, fields), many=True, fields=fields, context=context
+        ).data
+        row_serializer = row_serializer_class(fields, request)
+        actual = row_serializer.to_representation(row_serializer.values(queryset))
+
+        self.assertEqual(normalize(actual), normalize(expected))
+        for actual_item, expected_item in zip(actual, expected):
+            self.assertEqual(list(actual_item), list(expected_item))
+
+    def test_product_default_fields(self):
+        self.assertSameOutput(ProductSerializer, ProductRowSerializer, Product.objects.order_by('id'))
+
+    def test_product_with_request(self):
+        request = APIRequestFactory().get('/api/products/')
+        self.assertSameOutput(
+            ProductSerializer, ProductRowSerializer, Product.objects.order_by('id'), request=request
+        )
+
+    def test_product_sparse_fieldsets(self):
+        selections = [
+            {'fields': 'id,style_number,image'},
+            {'exclude': 'composition,renditions'},
+            {'expand': 'images,description'},
+            {'fields': 'id,images', 'expand': 'images'},
+        ]
+        request = APIRequestFactory().get('/api/products/')
+        for params in selections:
+            with self.subTest(params=params):
+                fields = ProductSerializer.select_fields(params)
+                self.assertSameOutput(
+                    ProductSerializer, ProductRowSerializer, Product.objects.order_by('id'),
+                    fields=fields, request=request
+                )
+
+    def test_category_default_fields(self):
+        self.assertSameOutput(CategorySerializer, CategoryRowSerializer, Category.objects.order_by('id'))
+
+    def test_category_sparse_fieldsets(self):
+        for params in ({'fields': 'id,name'}, {'exclude': 'subcategories'}):
+            with self.subTest(params=params):
+                fields = CategorySerializer.select_fields(params)
+                self.assertSameOutput(
+                    CategorySerializer, CategoryRowSerializer, Category.objects.order_by('id'), fields=fields
+                )
+
+    def test_product_list_view_matches_serializer(self):
+        response = self.client.get('/api/products/', {'limit': 2})
+        products = Product.objects.order_by('id')[:2]
+        request = response.wsgi_request
+        expected = ProductSerializer(
+            ProductSerializer.narrow_queryset(products), many=True, context={'request': request}
+        ).data
+        self.assertEqual(normalize(response.json()['products']), normalize(expected))
+
+
+class ApiQueryBudgetTests(QueryBudgetMixin, TestCase):
+    budgets = [
+        QueryBudget('get', '/api/categories/', 2),
+        QueryBudget('get', '/api/categories/', 1, data={'fields': 'id,name'}),
+        QueryBudget('get', '/api/products/', 2, data={'limit': 50}),
+        QueryBudget('get', '/api/products/', 3, data={'limit': 50, 'expand': 'images,description'}),
+        QueryBudget('get', '/api/products/', 2, data={'limit': 50, 'category': '{category}'}),
+        QueryBudget('get', '/api/products/filter/', 8, data={'gauge': '{gauge}', 'limit': 50}),
+        QueryBudget('get', '/api/products/search/', 3, data={'q': 'sweater', 'limit': 50}),
+        QueryBudget('get', '/api/products/{product}/', 4),
+        QueryBudget('get', '/api/compositions/', 1),
+        QueryBudget('post', '/api/contact-us/', 4, status=201, data={
+            'name': 'Buyer', 'email': 'buyer@example.com', 'subject': 'Samples', 'message': 'Please send'
+        }),
+        QueryBudget('post', '/api/Inquiry/', 10, status=201, data=lambda context: {
+            'name': 'Buyer', 'email': 'buyer@example.com', 'subject': 'Samples', 'message': 'Please send',
+            'items': context['products'],
+        }),
+        QueryBudget('post', '/api/Inquiry/batch/', 7, status=201, data=lambda context: {'inquiries': [
+            {'name': f'Buyer {i}', 'email': 'buyer@example.com', 'subject': 'Samples', 'message': 'Please send',
+             'items': context['products'][i:]}
+            for i in range(5)
+        ]}),
+    ]
+
+
+class UUID7Tests(TestCase):
+    def test_version_and_variant(self):
+        value = uuid7()
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, RFC_4122)
+
+    def test_time_prefix(self):
+        before = time.time_ns() // 1_000_000
+        value = uuid7()
+        after = time.time_ns() // 1_000_000
+        self.assertTrue(before <= value.int >> 80 <= after)
+
+    def test_strictly_increasing(self):
+        values = [uuid7() for _ in range(10000)]
+        self.assertEqual(values, sorted(set(values)))
+        # Stored as hex, so the database orders them the same way
+        self.assertEqual([value.hex for value in values], sorted(value.hex for value in values))
+
+    def test_new_rows_follow_creation_order(self):
+        ids = [ContactUs.objects.create(name='Buyer', email='buyer@example.com', subject='s', message='m').id
+               for _ in range(5)]
+        self.assertEqual(list(ContactUs.objects.order_by('id').values_list('id', flat=True)), ids)
+
+
+class SQLiteConcurrencyTests(SimpleTestCase):
+    """
+    Two connections to one on-disk database, as two server threads would
+    have. The in-memory test database uses a shared cache with table locks,
+    so it cannot show WAL behaviour.
+    """
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.create_database('concurrency.sqlite3')
+
+    def create_database(self, name):
+        self.path = os.path.join(self.directory, name)
+        with self.open_connection().cursor() as cursor:
+            cursor.execute('CREATE TABLE submission (id INTEGER PRIMARY KEY, message TEXT)')
+            cursor.execute("INSERT INTO submission (message) VALUES ('first')")
+
+    def connect(self):
+        wrapper = DatabaseWrapper({**connection.settings_dict, 'NAME': self.path}, alias='concurrency')
+        wrapper.ensure_connection()
+        return wrapper
+
+    def open_connection(self):
+        wrapper = self.connect()
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def count(self, cursor):
+        cursor.execute('SELECT COUNT(*) FROM submission')
+        return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        with self.open_connection().cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+
+    def test_reader_does_not_wait_for_open_write(self):
+        writer = self.open_connection().cursor()
+        reader = self.open_connection().cursor()
+        writer.execute('BEGIN IMMEDIATE')
+        writer.execute("INSERT INTO submission (message) VALUES ('second')")
+
+        start = time.perf_counter()
+        self.assertEqual(self.count(reader), 1)  # the last committed state
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+        writer.execute('COMMIT')
+        self.assertEqual(self.count(reader), 2)
+
+    def test_writer_commits_during_read_transaction(self):
+        reader = self.open_connection().cursor()
+        writer = self.open_connection().cursor()
+        reader.execute('BEGIN')
+        self.assertEqual(self.count(reader), 1)
+
+        writer.execute('BEGIN IMMEDIATE')
+        writer.execute("INSERT INTO submission (message) VALUES ('second')")
+        writer.execute('COMMIT')
+
+        # The open read transaction keeps its snapshot
+        self.assertEqual(self.count(reader), 1)
+        reader.execute('COMMIT')
+        self.assertEqual(self.count(reader), 2)
+
+    def test_rollback_journal_locks_writer_out(self):
+        # Control: without WAL the same commit fails while a reader is active
+        pragmas = {**settings.SQLITE_PRAGMAS, 'journal_mode': 'delete', 'busy_timeout': 100}
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            self.create_database('rollback-journal.sqlite3')
+            reader = self.open_connection().cursor()
+            writer = self.open_connection().cursor()
+        reader.execute('BEGIN')
+        self.count(reader)
+
+        writer.execute('BEGIN IMMEDIATE')
+        writer.execute("INSERT INTO submission (message) VALUES ('second')")
+        with self.assertRaisesMessage(OperationalError, 'database is locked'):
+            writer.execute('COMMIT')
+        writer.execute('ROLLBACK')
+        reader.execute('COMMIT')
+
+    def test_concurrent_inserts_and_reads(self):
+        errors = []
+        reads = []
+
+        # Thread-local connections, as Django gives each request thread
+        def write():
+            wrapper = self.connect()
+            cursor = wrapper.cursor()
+            try:
+                for i in range(200):
+                    cursor.execute('BEGIN IMMEDIATE')
+                    cursor.execute('INSERT INTO submission (message) VALUES (%s)', [f'message {i}'])
+                    cursor.execute('COMMIT')
+            except OperationalError as error:
+                errors.append(error)
+            finally:
+                wrapper.close()
+
+        def read():
+            wrapper = self.connect()
+            cursor = wrapper.cursor()
+            try:
+                for _ in range(200):
+                    start = time.perf_counter()
+                    self.count(cursor)
+                    reads.append(time.perf_counter() - start)
+            except OperationalError as error:
+                errors.append(error)
+            finally:
+                wrapper.close()
+
+        threads = [threading.Thread(target=write) for _ in range(2)]
+        threads += [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(reads), 800)
+        with self.open_connection().cursor() as cursor:
+            self.assertEqual(self.count(cursor), 401)
+
+
+class ReadReplicaRoutingTests(TransactionTestCase):
+    """
+    The test database is the primary and an SQLite file holding a snapshot
+    of it is the replica, so whatever is written after the snapshot is
+    replication lag.
+    """
+    @classmethod
+    def setUpClass(cls):
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        cls.replica_path = os.path.join(directory.name, 'replica.sqlite3')
+        connections.settings['replica'] = {**connection.settings_dict, 'NAME': cls.replica_path}
+        cls.addClassCleanup(cls.remove_replica)
+        # Set here rather than on the class: the runner would try to create
+        # a test database for the alias before it exists
+        cls.databases = {'default', 'replica'}
+        super().setUpClass()
+
+    @classmethod
+    def remove_replica(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', password='admin')
+        self.other_admin = User.objects.create_superuser('other', password='other')
+        Product.objects.create(style_number='STY-1', description='Replicated')
+        Composition.objects.create(material='Cotton')
+
+        connections['replica'].close()
+        connection.ensure_connection()
+        replica = sqlite3.connect(self.replica_path)
+        connection.connection.backup(replica)
+        replica.close()
+
+        # Not replicated yet
+        Product.objects.create(style_number='STY-2', description='Lagging')
+        # Tags never seen count as just changed; give them all a version now
+        bump_cache_tags(*GUARD_TAGS)
+
+        routing = override_settings(DATABASE_ROUTING={
+            'REPLICAS': ['replica'],
+            'READ_VIEW_MODULES': ['api.views', 'admin_panel.views'],
+            'STICKY_SECONDS': 60,
+        })
+        routing.enable()
+        self.addCleanup(routing.disable)
+
+    def admin_client(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        return client
+
+    def style_numbers(self):
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 200, response.content)
+        return sorted(product['style_number'] for product in response.json()['products'])
+
+    def materials(self, client):
+        response = client.get('/api/admin/compositions/')
+        self.assertEqual(response.status_code, 200)
+        return sorted(composition['material'] for composition in response.json()['data'])
+
+    def settled(self):
+        """As if the replication lag since the last catalog write had passed."""
+        return mock.patch('api.cache.time', **{'time.return_value': time.time() + 3600})
+
+    def test_public_reads_use_replica(self):
+        with self.settled():
+            self.assertEqual(self.style_numbers(), ['STY-1'])
+
+    def test_cache_fill_after_write_uses_primary(self):
+        # STY-2 was just written: the replica may lag, so the fill (and what
+        # is stored under the new tag versions) comes from the primary
+        self.assertEqual(self.style_numbers(), ['STY-1', 'STY-2'])
+        with self.settled():
+            self.assertEqual(self.style_numbers(), ['STY-1', 'STY-2'])
+
+    def test_etag_after_write_matches_primary(self):
+        response = self.client.get('/api/products/')
+        etag = response['ETag']
+        with self.settled():
+            revalidated = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(sorted(p['style_number'] for p in response.json()['products']), ['STY-1', 'STY-2'])
+
+    def test_without_replicas_reads_use_primary(self):
+        with override_settings(DATABASE_ROUTING={}):
+            self.assertEqual(self.style_numbers(), ['STY-1', 'STY-2'])
+
+    def test_public_posts_use_primary(self):
+        response = self.client.post('/api/contact-us/', {
+            'name': 'Buyer', 'email': 'buyer@example.com', 'subject': 'Samples', 'message': 'Please send'
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ContactUs.objects.using('default').count(), 1)
+        self.assertEqual(ContactUs.objects.using('replica').count(), 0)
+
+    def test_admin_reads_own_writes(self):
+        admin = self.admin_client(self.admin)
+        other = self.admin_client(self.other_admin)
+        self.assertEqual(self.materials(admin), ['Cotton'])
+
+        response = admin.post('/api/admin/compositions/', {'material': 'Wool'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Composition.objects.using('replica').count(), 1)
+
+        # Pinned to the primary after the write; other clients are not
+        self.assertEqual(self.materials(admin), ['Cotton', 'Wool'])
+        self.assertEqual(self.materials(other), ['Cotton'])
+        with self.settled():
+            self.assertEqual(self.style_numbers(), ['STY-1'])
+
+        # Once the pin expires, reads go back to the replica
+        cache.clear()
+        self.assertEqual(self.materials(admin), ['Cotton'])
+
+    def test_failed_write_does_not_pin(self):
+        admin = self.admin_client(self.admin)
+        response = admin.post('/api/admin/compositions/', {}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.materials(admin), ['Cotton'])
+
+
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.create(style_number='KN-001', description='Merino crew sweater')
+        Product.objects.create(style_number='KN-002', description='Cotton polo')
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, q):
+        response = self.client.get('/api/products/search/', {'q': q})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [product['style_number'] for product in response.json()['products']]
+
+    def test_search(self):
+        self.assertEqual(self.search('merino'), ['KN-001'])
+        self.assertEqual(sorted(self.search('KN')), ['KN-001', 'KN-002'])
+
+    def test_substring_fallback_without_fts(self):
+        with mock.patch('api.search.search_enabled', return_value=False):
+            self.assertEqual(self.search('sweater'), ['KN-001'])
+            self.assertEqual(self.search('kn-00'), ['KN-001', 'KN-002'])
+
+    def test_query_required(self):
+        self.assertEqual(self.client.get('/api/products/search/').status_code, 400)
+
+
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Knit')
+        cls.product = Product.objects.create(style_number='KN-001', category=cls.category)
+
+    def setUp(self):
+        cache.clear()
+
+    def category_name(self):
+        response = self.client.get(f'/api/products/{self.product.id}/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['product']['category']['name']
+
+    def test_cached_until_tag_bumped(self):
+        self.assertEqual(self.category_name(), 'Knit')
+        Category.objects.filter(id=self.category.id).update(name='Knitwear')
+        # update() sends no signal, so the cached body is still served
+        self.assertEqual(self.category_name(), 'Knit')
+        bump_cache_tags(f'category:{self.category.id}', 'category')
+        self.assertEqual(self.category_name(), 'Knitwear')
+
+    def test_write_during_render_is_not_cached(self):
+        to_representation = ProductDetailSerializer.to_representation
+
+        def rename_while_rendering(serializer, instance):
+            data = to_representation(serializer, instance)
+            self.category.name = 'Knitwear'
+            self.category.save()
+            return data
+
+        with mock.patch.object(ProductDetailSerializer, 'to_representation', rename_while_rendering):
+            self.assertEqual(self.category_name(), 'Knit')
+        self.assertEqual(self.category_name(), 'Knitwear')
+
+    @override_settings(ALLOWED_HOSTS=['shop.example.com', 'cdn.example.com', 'testserver'])
+    def test_key_includes_host_and_scheme(self):
+        Product.objects.filter(id=self.product.id).update(image='product_images/kn-001.jpg')
+
+        def image(**extra):
+            response = self.client.get('/api/products/', **extra)
+            return response.json()['products'][0]['image']
+
+        self.assertEqual(image(HTTP_HOST='shop.example.com'), 'http://shop.example.com/media/product_images/kn-001.jpg')
+        self.assertEqual(image(HTTP_HOST='cdn.example.com'), 'http://cdn.example.com/media/product_images/kn-001.jpg')
+        self.assertEqual(
+            image(HTTP_HOST='shop.example.com', secure=True), 'https://shop.example.com/media/product_images/kn-001.jpg'
+        )
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    EMAIL_HOST_USER='shop@example.com',
+    ADMIN_EMAIL='admin@example.com',
+    EMAIL_OUTBOX={'BATCH_SIZE': 50, 'MAX_ATTEMPTS': 3, 'BACKOFF_SECONDS': 30, 'MAX_BACKOFF_SECONDS': 3600},
+)
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.product = Product.objects.create(style_number='KN-001', gauge='12GG', end='2/28', weight=300)
+
+    def contact(self, **data):
+        return self.client.post('/api/contact-us/', {
+            'name': 'Buyer', 'email': 'buyer@example.com', 'subject': 'Samples', 'message': 'Please send', **data
+        }, format='json')
+
+    def inquiry(self):
+        return self.client.post('/api/Inquiry/', {
+            'name': 'Buyer', 'email': 'buyer@example.com', 'subject': 'Samples', 'message': 'Please send',
+            'items': [str(self.product.id)]
+        }, format='json')
+
+    def make_due(self):
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+
+    def test_submissions_queue_instead_of_sending(self):
+        self.assertEqual(self.contact().status_code, 201)
+        self.assertEqual(self.inquiry().status_code, 201)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            sorted(EmailOutbox.objects.values_list('subject', 'recipients', 'status')),
+            [
+                ('New Contact Form Submission: Samples', ['admin@example.com'], EmailOutbox.Status.PENDING),
+                ('New Product Inquiry from Buyer', ['admin@example.com'], EmailOutbox.Status.PENDING),
+            ]
+        )
+
+    def test_contact_rolls_back_with_its_email(self):
+        with mock.patch.object(EmailOutbox, 'save', side_effect=OperationalError('disk full')):
+            with self.assertRaises(OperationalError):
+                self.contact()
+        self.assertFalse(ContactUs.objects.exists())
+
+    def test_inquiry_rolls_back_with_its_email(self):
+        with mock.patch.object(EmailOutbox.objects, 'bulk_create', side_effect=OperationalError('disk full')):
+            with self.assertRaises(OperationalError):
+                self.inquiry()
+        self.assertFalse(Inquiry.objects.exists())
+
+    def test_batch_shares_one_connection(self):
+        for i in range(3):
+            EmailService.queue_email(f'Subject {i}', 'Body')
+        with mock.patch.object(EmailBackend, 'open', autospec=True) as open_connection:
+            self.assertEqual(OutboxSender().run(once=True), (3, 0))
+        open_connection.assert_called_once()
+        self.assertEqual(sorted(message.subject for message in mail.outbox), ['Subject 0', 'Subject 1', 'Subject 2'])
+        self.assertEqual(mail.outbox[0].to, ['admin@example.com'])
+        self.assertEqual(mail.outbox[0].from_email, 'shop@example.com')
+        self.assertFalse(EmailOutbox.objects.exclude(status=EmailOutbox.Status.SENT).exists())
+
+    def test_failed_send_backs_off_then_succeeds(self):
+        email = EmailService.queue_email('Subject', 'Body')
+        sender = OutboxSender()
+        with mock.patch.object(EmailBackend, 'send_messages', side_effect=SMTPException('try later')):
+            before = timezone.now()
+            self.assertEqual(sender.send_batch(), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts, email.last_error), (EmailOutbox.Status.PENDING, 1, 'try later'))
+            self.assertGreaterEqual(email.next_attempt_at, before + timedelta(seconds=30))
+            # Not due again until the backoff has passed
+            self.assertEqual(sender.send_batch(), (0, 0))
+
+            self.make_due()
+            before = timezone.now()
+            self.assertEqual(sender.send_batch(), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual(email.attempts, 2)
+            self.assertGreaterEqual(email.next_attempt_at, before + timedelta(seconds=60))
+
+        self.make_due()
+        self.assertEqual(sender.send_batch(), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.last_error), (EmailOutbox.Status.SENT, 3, ''))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        email = EmailService.queue_email('Subject', 'Body')
+        sender = OutboxSender()
+        with mock.patch.object(EmailBackend, 'send_messages', side_effect=SMTPException('mailbox unavailable')):
+            for _ in range(3):
+                self.make_due()
+                sender.send_batch()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (EmailOutbox.Status.FAILED, 3))
+        self.make_due()
+        self.assertEqual(sender.send_batch(), (0, 0))
+
+    @override_settings(ADMIN_EMAIL=None)
+    def test_without_admin_email_nothing_is_sent(self):
+        self.assertEqual(self.contact().status_code, 201)
+        email = EmailOutbox.objects.get()
+        self.assertEqual(email.status, EmailOutbox.Status.FAILED)
+        self.assertIn('ADMIN_EMAIL', email.last_error)
+        self.assertEqual(OutboxSender().run(once=True), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_row_without_recipients_is_failed_not_sent(self):
+        email = EmailOutbox.objects.create(subject='Subject', body='Body', recipients=[])
+        self.assertEqual(OutboxSender().send_batch(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, EmailOutbox.Status.FAILED)
+        self.assertEqual(len(mail.outbox), 0)
+
+
+class GenerateFakeDataTests(TestCase):
+    sizes = {'products': 20, 'categories': 2, 'contacts': 5, 'inquiries': 5, 'chunk_size': 8}
+
+    def generate(self, **options):
+        out = io.StringIO()
+        call_command('generate_fake_data', stdout=out, **{**self.sizes, **options})
+        return out.getvalue()
+
+    def snapshot(self):
+        return (
+            sorted(Product.objects.values_list('id', 'style_number', 'weight')),
+            sorted(Inquiry.objects.values_list('id', 'name')),
+            ContactUs.objects.count(),
+        )
+
+    def test_rerun_with_same_seed_needs_flush(self):
+        self.generate(seed=7)
+        first = self.snapshot()
+        with self.assertRaisesMessage(CommandError, 'use --flush'):
+            self.generate(seed=7)
+        self.generate(seed=7, flush=True)
+        self.assertEqual(self.snapshot(), first)
+        self.assertEqual(len(first[0]), 20)
+
+    def test_flush_replaces_other_data(self):
+        self.generate(seed=1)
+        self.generate(seed=2, flush=True)
+        self.assertEqual(Product.objects.count(), 20)
+        self.assertEqual(Category.objects.count(), 2)
+
+    def test_workers_fall_back_to_one_process_on_sqlite(self):
+        output = self.generate(workers=4)
+        self.assertIn('using one process', output)
+        self.assertEqual(Product.objects.count(), 20)
+
+
+class ImageProcessorTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name, IMAGE_RENDITIONS={}))
+        self.processor = ImageProcessor(workers=1, batch_size=10)
+
+    def upload(self, name='product_images/raw.jpg', color='red'):
+        output = BytesIO()
+        Image.new('RGB', (1200, 900), color).save(output, format='JPEG')
+        return default_storage.save(name, ContentFile(output.getvalue()))
+
+    def process(self, *models):
+        self.processor.models = models
+        with ThreadPoolExecutor(1) as executor:
+            return self.processor.run_once(executor)
+
+    def test_shared_source_kept_until_last_reference(self):
+        name = self.upload()
+        product = Product.objects.create(
+            style_number='KN-001', gauge='12GG', end='2/28', weight=300, image=name, image_status=ImageStatus.PENDING
+        )
+        gallery_image = ProductImage.objects.create(image=name, image_status=ImageStatus.PENDING)
+
+        self.assertEqual(self.process(Product), 1)
+        product.refresh_from_db()
+        self.assertEqual(product.image_status, ImageStatus.READY)
+        self.assertNotEqual(product.image.name, name)
+        self.assertTrue(default_storage.exists(name))
+
+        # Same content: reuses the derivative, and nothing refers to the source any more
+        self.assertEqual(self.process(ProductImage), 1)
+        gallery_image.refresh_from_db()
+        self.assertEqual(gallery_image.image.name, product.image.name)
+        self.assertFalse(default_storage.exists(name))
+        self.assertTrue(default_storage.exists(product.image.name))
+
+    def test_claim_skips_rows_claimed_elsewhere(self):
+        first, second = (ProductImage.objects.create(image_status=ImageStatus.PENDING) for _ in range(2))
+
+        def pending_ids(model):
+            # Another worker claims `second` between the select and the update
+            ProductImage.objects.filter(id=second.id).update(image_status=ImageStatus.PROCESSING)
+            return [first.id, second.id]
+
+        with mock.patch.object(self.processor, 'pending_ids', pending_ids):
+            self.assertEqual([row.id for row in self.processor.claim(ProductImage)], [first.id])
+
+    def test_result_for_replaced_upload_is_dropped(self):
+        name = self.upload()
+        ProductImage.objects.create(image=name, image_status=ImageStatus.PENDING)
+        [job] = self.processor.claim(ProductImage)
+        # A new upload lands, and another worker claims it, while `job` is optimized
+        ProductImage.objects.filter(id=job.id).update(
+            image=self.upload('product_images/new.jpg', 'blue'), image_status=ImageStatus.PROCESSING
+        )
+
+        manifest = {'image': 'derivatives/ab/ab.jpg', 'renditions': {}}
+        self.assertFalse(self.processor.finish(job, ImageStatus.READY, 'ab', manifest))
+        self.assertFalse(self.processor.finish(job, ImageStatus.FAILED))
+        job.refresh_from_db()
+        self.assertEqual((job.image.name, job.image_status), ('product_images/new.jpg', ImageStatus.PROCESSING))
+
+    @override_settings(IMAGE_RENDITIONS={
+        'SIZES': {'card': 400, 'thumb': 200, 'zoom': 1600}, 'FORMATS': ['WEBP', 'JPEG'], 'QUALITY': {'WEBP': 70},
+    })
+    def test_stores_renditions_and_manifest(self):
+        processor = ImageProcessor(workers=1, batch_size=10)
+        image = ProductImage.objects.create(image=self.upload(), image_status=ImageStatus.PENDING)
+        processor.models = (ProductImage,)
+        with ThreadPoolExecutor(1) as executor:
+            processor.run_once(executor)
+        image.refresh_from_db()
+
+        manifest = load_manifest(default_storage, image.image_hash)
+        self.assertEqual(manifest, {'image': image.image.name, 'renditions': image.renditions})
+        # The 1200px source is not upscaled to 1600
+        self.assertEqual(list(manifest['renditions']), ['thumb', 'card'])
+        self.assertEqual(
+            {name: sorted(entry) for name, entry in manifest['renditions'].items()},
+            {'thumb': ['jpeg', 'webp', 'width'], 'card': ['jpeg', 'webp', 'width']}
+        )
+        for name, entry in manifest['renditions'].items():
+            for fmt in ('jpeg', 'webp'):
+                with default_storage.open(entry[fmt]) as stored:
+                    rendered = Image.open(stored)
+                    self.assertEqual((rendered.format, rendered.width), (fmt.upper(), entry['width']))
+        self.assertEqual(image.renditions['card']['width'], 400)
+
+
+class ProductPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.context = catalog_fixtures(7)
+        self.client = APIClient()
+
+    def test_cursor_round_trip(self):
+        ids = []
+        params = {'limit': 3, 'fields': 'id'}
+        while True:
+            response = self.client.get('/api/products/', params)
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            self.assertEqual(body['limit'], 3)
+            ids.extend(product['id'] for product in body['products'])
+            if body['next_cursor'] is None:
+                self.assertIsNone(body['next'])
+                break
+            self.assertIn(f"cursor={body['next_cursor']}", body['next'])
+            params['cursor'] = body['next_cursor']
+        self.assertEqual(ids, sorted(str(pk) for pk in Product.objects.values_list('id', flat=True)))
+
+    def test_cursor_keeps_filters(self):
+        response = self.client.get('/api/products/', {'category': self.context['category'], 'limit': 1})
+        self.assertEqual(len(response.json()['products']), 1)
+        self.assertIsNone(response.json()['next_cursor'])
+
+    def test_next_link_keeps_filters(self):
+        category = Category.objects.get(id=self.context['category'])
+        Product.objects.bulk_create([
+            Product(style_number=f'KN-{i:03d}', gauge='12GG', end='2/28', weight='300GSM', category=category)
+            for i in range(4)
+        ])
+        style_numbers = []
+        response = self.client.get('/api/products/', {'category': str(category.id), 'limit': 2, 'fields': 'style_number'})
+        while True:
+            style_numbers.extend(product['style_number'] for product in response.json()['products'])
+            if response.json()['next'] is None:
+                break
+            self.assertIn(f'category={category.id}', response.json()['next'])
+            response = self.client.get(response.json()['next'])
+        self.assertEqual(sorted(style_numbers), sorted(category.products.values_list('style_number', flat=True)))
+        self.assertEqual(len(style_numbers), 5)
+
+    def test_invalid_cursor(self):
+        for cursor in ('not-a-cursor', 'eyJpZCI6Im5vcGUifQ'):  # the second decodes to {"id":"nope"}
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/products/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['message'], 'Invalid pagination or filter parameters')
+
+    def test_limit_is_capped(self):
+        with override_settings(MAX_PAGE_SIZE=5):
+            self.assertEqual(self.client.get('/api/products/', {'limit': 1000}).json()['limit'], 5)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog_fixtures(3)
+        self.client = APIClient()
+
+    def get(self, path='/api/products/', data=None, etag=None):
+        extra = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(path, data, **extra)
+
+    def test_matching_etag_is_not_modified(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('max-age=60', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            response = self.get(etag=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+        self.assertEqual(self.get(etag=f'"stale", {etag}').status_code, 304)
+        self.assertEqual(self.get(etag='*').status_code, 304)
+
+    def test_etag_depends_on_query(self):
+        etag = self.get()['ETag']
+        response = self.get(data={'limit': 1}, etag=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_write_changes_etag(self):
+        etag = self.get('/api/compositions/')['ETag']
+        self.assertEqual(self.get('/api/compositions/', etag=etag).status_code, 304)
+        Composition.objects.create(material='Alpaca')
+        response = self.get('/api/compositions/', etag=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Alpaca', [composition['material'] for composition in response.json()['compositions']])
+
+    def test_gallery_image_write_changes_etag(self):
+        params = {'expand': 'images'}
+        etag = self.get(data=params)['ETag']
+        image = ProductImage.objects.first()
+        image.image = 'product_images/reshot.jpg'
+        image.save()
+        response = self.get(data=params, etag=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'http://testserver/media/product_images/reshot.jpg',
+            [gallery['image'] for product in response.json()['products'] for gallery in product['images']]
+        )
+
+    def test_errors_carry_no_etag(self):
+        response = self.get(data={'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class ProductFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.knit = Category.objects.create(name='Knit')
+        self.wool = Composition.objects.create(material='Wool')
+        self.cotton = Composition.objects.create(material='Cotton')
+
+    def create_product(self, style_number, gauge='12GG', materials=()):
+        product = Product.objects.create(
+            style_number=style_number, gauge=gauge, end='2/28', weight='300GSM', category=self.knit
+        )
+        product.composition.set(materials)
+        return product
+
+    def listing(self, **params):
+        response = self.client.get('/api/products/filter/', params)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        counts = {facet: {item['label']: item['count'] for item in items} for facet, items in body['facets'].items()}
+        return counts, sorted(product['style_number'] for product in body['products'])
+
+    def test_counts_follow_create_update_and_delete(self):
+        first = self.create_product('KN-001', materials=[self.wool])
+        second = self.create_product('KN-002', gauge='7GG', materials=[self.wool, self.cotton])
+        counts, _ = self.listing()
+        self.assertEqual(counts['gauge'], {'12GG': 1, '7GG': 1})
+        self.assertEqual(counts['composition'], {'Wool': 2, 'Cotton': 1})
+        self.assertEqual(counts['category'], {'Knit': 2})
+
+        second.gauge = '12GG'
+        second.save()
+        second.composition.remove(self.wool)
+        counts, _ = self.listing()
+        self.assertEqual(counts['gauge'], {'12GG': 2})
+        self.assertEqual(counts['composition'], {'Wool': 1, 'Cotton': 1})
+
+        first.delete()
+        counts, _ = self.listing()
+        self.assertEqual(counts['gauge'], {'12GG': 1})
+        self.assertEqual(counts['composition'], {'Cotton': 1})
+        self.assertEqual(counts['category'], {'Knit': 1})
+
+    def test_incremental_counts_match_rebuild(self):
+        products = [self.create_product(f'KN-{i:03d}', gauge=('7GG', '12GG')[i % 2], materials=[self.wool]) for i in range(4)]
+        products[0].delete()
+        products[1].composition.add(self.cotton)
+        self.knit.name = 'Knitwear'
+        self.knit.save()
+        before = self.listing()
+        rebuild_facet_index()
+        cache.clear()
+        self.assertEqual(self.listing(), before)
+        self.assertEqual(before[0]['category'], {'Knitwear': 3})
+
+    def test_filters_narrow_other_facets_only(self):
+        self.create_product('KN-001', materials=[self.wool])
+        self.create_product('KN-002', gauge='7GG', materials=[self.cotton])
+        counts, style_numbers = self.listing(gauge='7GG')
+        self.assertEqual(style_numbers, ['KN-002'])
+        # A facet's own filter is ignored so the selection can be widened
+        self.assertEqual(counts['gauge'], {'12GG': 1, '7GG': 1})
+        self.assertEqual(counts['composition'], {'Cotton': 1})
+
+        counts, style_numbers = self.listing(gauge='7GG,12GG', composition=str(self.wool.id))
+        self.assertEqual(style_numbers, ['KN-001'])
+        self.assertEqual(counts['gauge'], {'12GG': 1})
+
+
+@override_settings(ADMIN_EMAIL='admin@example.com')
+class InquiryBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.products = [
+            Product.objects.create(style_number=style_number, gauge='12GG', end='2/28', weight='300GSM')
+            for style_number in ('KN-001', 'KN-002')
+        ]
+
+    def row(self, client_id=None, **data):
+        row = {
+            'name': 'Buyer', 'email': 'buyer@example.com', 'subject': 'Samples', 'message': 'Please send',
+            'items': [str(product.id) for product in self.products], **data
+        }
+        if client_id is not None:
+            row['id'] = str(client_id)
+        return row
+
+    def post(self, rows):
+        return self.client.post('/api/Inquiry/batch/', {'inquiries': rows}, format='json')
+
+    def test_creates_rows_with_items_and_emails(self):
+        response = self.post([self.row(name='Ann'), self.row(name='Bob', items=[str(self.products[1].id)])])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['created']), 2)
+        styles = {
+            inquiry.name: sorted(inquiry.items.values_list('product__style_number', flat=True))
+            for inquiry in Inquiry.objects.all()
+        }
+        self.assertEqual(styles, {'Ann': ['KN-001', 'KN-002'], 'Bob': ['KN-002']})
+        self.assertEqual(EmailOutbox.objects.count(), 2)
+        self.assertIn('- KN-002', EmailOutbox.objects.get(subject='New Product Inquiry from Bob').body)
+
+    def test_duplicate_client_ids_in_one_batch(self):
+        client_id = uuid7()
+        response = self.post([self.row(client_id, name='First'), self.row(client_id, name='Second')])
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(body['created'], [str(client_id)])
+        self.assertEqual(body['duplicates'], [str(client_id)])
+        self.assertEqual(Inquiry.objects.get().name, 'First')
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+
+    def test_resent_batch_creates_nothing(self):
+        rows = [self.row(uuid7()), self.row(uuid7())]
+        self.assertEqual(self.post(rows).status_code, 201)
+        response = self.post(rows)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], [])
+        self.assertEqual(response.json()['duplicates'], [row['id'] for row in rows])
+        self.assertEqual(Inquiry.objects.count(), 2)
+
+    def test_invalid_rows_reported_by_index(self):
+        missing = uuid7()
+        response = self.post([self.row(email='not-an-email'), self.row(), self.row(items=[str(missing)])])
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertFalse(body['status'])
+        self.assertEqual(len(body['created']), 1)
+        self.assertEqual(set(body['errors']), {'0', '2'})
+        self.assertIn('email', body['errors']['0'])
+        self.assertEqual(body['errors']['2']['items'], [f'Products not found: {missing}'])
+
+    @override_settings(INQUIRY_BATCH_MAX_SIZE=2)
+    def test_rejects_empty_and_oversized_batches(self):
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.post([self.row()] * 3).status_code, 400)
+        self.assertFalse(Inquiry.objects.exists())
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.context = catalog_fixtures(2)
+        self.client = APIClient()
+
+    def test_select_fields(self):
+        select = ProductSerializer.select_fields
+        self.assertIsNone(select({}))
+        self.assertEqual(select({'fields': 'style_number, id'}), ['id', 'style_number'])
+        self.assertEqual(select({'fields': 'id,description'}), ['id', 'description'])
+        self.assertEqual(
+            select({'exclude': 'image,renditions', 'expand': 'description'}),
+            ['id', 'style_number', 'category', 'sub_category', 'composition', 'description']
+        )
+        self.assertEqual(select({'fields': 'id', 'expand': 'images'}), ['id', 'images'])
+
+    def test_unknown_fields_are_reported_per_param(self):
+        with self.assertRaises(serializers.ValidationError) as raised:
+            ProductSerializer.select_fields({'fields': 'id,price', 'exclude': 'cost', 'expand': 'image'})
+        self.assertEqual(raised.exception.detail, {
+            'fields': ['Unknown fields: price'],
+            'exclude': ['Unknown fields: cost'],
+            # Only Meta.expandable_fields can be expanded
+            'expand': ['Unknown fields: image'],
+        })
+
+    def test_views_render_selected_fields(self):
+        product = self.context['product']
+        for path, key, params, expected in (
+            ('/api/products/', 'products', {'fields': 'id,style_number'}, {'id', 'style_number'}),
+            ('/api/products/', 'products', {'fields': 'id', 'expand': 'images'}, {'id', 'images'}),
+            ('/api/products/filter/', 'products', {'fields': 'style_number'}, {'style_number'}),
+            ('/api/products/search/', 'products', {'q': 'knitted', 'fields': 'id'}, {'id'}),
+            ('/api/categories/', 'categories', {'fields': 'name'}, {'name'}),
+            ('/api/compositions/', 'compositions', {'exclude': 'id'}, {'material'}),
+        ):
+            with self.subTest(path=path, params=params):
+                response = self.client.get(path, params)
+                self.assertEqual(response.status_code, 200)
+                rows = response.json()[key]
+                self.assertTrue(rows)
+                self.assertEqual([set(row) for row in rows], [expected] * len(rows))
+        response = self.client.get(f'/api/products/{product}/', {'fields': 'id,description'})
+        self.assertEqual(set(response.json()['product']), {'id', 'description'})
+
+    def test_views_reject_unknown_fields(self):
+        for path in ('/api/products/', '/api/products/filter/', '/api/products/search/',
+                     f"/api/products/{self.context['product']}/", '/api/categories/', '/api/compositions/'):
+            with self.subTest(path=path):
+                response = self.client.get(path, {'q': 'knitted', 'fields': 'id,price'})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['message'], 'Invalid field selection')
+                self.assertEqual(response.json()['errors'], {'fields': ['Unknown fields: price']})
+
+
+class RequestInstrumentationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog_fixtures(3)
+
+    def get(self):
+        # The middleware reads its settings when the client's handler loads it
+        client = APIClient()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def server_timing(self, response):
+        header = response['Server-Timing']
+        queries, hits, misses = re.search(
+            r'db;dur=[\d.]+;desc="(\d+) queries", cache;desc="hit=(\d+) miss=(\d+)"', header
+        ).groups()
+        self.assertRegex(header, r', total;dur=[\d.]+$')
+        return int(queries), int(hits), int(misses), header
+
+    @override_settings(REQUEST_INSTRUMENTATION={'SAMPLE_RATE': 1})
+    def test_uncached_then_cached_request(self):
+        with self.assertLogs('api.instrumentation', 'INFO') as logs:
+            response, query_count = self.get()
+        queries, hits, misses, header = self.server_timing(response)
+        self.assertGreater(query_count, 0)
+        self.assertEqual((queries, hits, misses), (query_count, 0, 1))
+        self.assertIn('serializer;dur=', header)
+        self.assertEqual(len(logs.records), 1)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(
+            {key: line[key] for key in ('method', 'path', 'status', 'queries', 'cache_hits', 'cache_misses')},
+            {'method': 'GET', 'path': '/api/products/', 'status': 200,
+             'queries': query_count, 'cache_hits': 0, 'cache_misses': 1}
+        )
+        self.assertIn('serializer_ms', line)
+
+        with self.assertLogs('api.instrumentation', 'INFO') as logs:
+            response, query_count = self.get()
+        self.assertEqual(self.server_timing(response)[:3], (query_count, 1, 0))
+        self.assertNotIn('serializer;dur=', response['Server-Timing'])
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(json.loads(logs.records[0].getMessage())['cache_hits'], 1)
+
+    @override_settings(REQUEST_INSTRUMENTATION={'SAMPLE_RATE': 0})
+    def test_unsampled_request(self):
+        with self.assertNoLogs('api.instrumentation'):
+            response, _ = self.get()
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(REQUEST_INSTRUMENTATION={'SAMPLE_RATE': 1, 'SERVER_TIMING': False})
+    def test_log_without_header(self):
+        with self.assertLogs('api.instrumentation', 'INFO') as logs:
+            response, _ = self.get()
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertEqual(len(logs.records), 1)
+
+
+class ImageRenditionTests(SimpleTestCase):
+    def options(self, sizes, formats=('AVIF', 'WEBP', 'JPEG')):
+        with override_settings(IMAGE_RENDITIONS={'SIZES': sizes, 'FORMATS': list(formats), 'QUALITY': {}}):
+            return get_optimization_options()
+
+    def source(self, width, height, mode='RGB'):
+        output = BytesIO()
+        Image.new(mode, (width, height)).save(output, format='PNG')
+        return output.getvalue()
+
+    def test_supported_formats_end_with_jpeg(self):
+        self.assertEqual(get_supported_formats(['jpeg', 'WEBP', 'BOGUS']), ['WEBP', 'JPEG'])
+        self.assertEqual(get_supported_formats([]), ['JPEG'])
+        # Without an encoder a format is dropped and JPEG still serves every size
+        with mock.patch.dict(Image.SAVE, clear=False) as save:
+            save.pop('AVIF', None)
+            save.pop('WEBP', None)
+            self.assertEqual(get_supported_formats(['AVIF', 'WEBP', 'JPEG']), ['JPEG'])
+
+    def test_sizes_in_width_order_without_upscaling(self):
+        options = self.options({'zoom': 1600, 'thumb': 200, 'detail': 800, 'card': 400})
+        self.assertEqual([width for _, width in options['renditions']], [200, 400, 800, 1600])
+        main, renditions = optimize_image_bytes(self.source(1000, 500, 'RGBA'), options)
+
+        formats = options['rendition_formats']
+        self.assertEqual(formats[-1], 'JPEG')
+        self.assertEqual(
+            [(name, width, image_format) for name, width, image_format, _ in renditions],
+            [(name, width, image_format) for name, width in (('thumb', 200), ('card', 400), ('detail', 800))
+             for image_format in formats]
+        )
+        for _, width, image_format, content in renditions:
+            rendered = Image.open(BytesIO(content))
+            self.assertEqual((rendered.format, rendered.size), (image_format, (width, width // 2)))
+        self.assertEqual(Image.open(BytesIO(main)).size, (800, 400))
+
+    def test_small_source_still_gets_smallest_size(self):
+        options = self.options({'thumb': 200, 'card': 400}, formats=['JPEG'])
+        _, renditions = optimize_image_bytes(self.source(120, 90), options)
+        self.assertEqual([(name, width) for name, width, _, _ in renditions], [('thumb', 120)])
+
+    def test_rendition_urls(self):
+        self.assertIsNone(rendition_urls({}))
+        renditions = {
+            'card': {'width': 400, 'webp': 'derivatives/ab/k-400w.webp', 'jpeg': 'derivatives/ab/k-400w.jpg'},
+            'thumb': {'width': 200, 'webp': 'derivatives/ab/k-200w.webp', 'jpeg': 'derivatives/ab/k-200w.jpg'},
+        }
+        self.assertEqual(rendition_urls(renditions), {
+            'srcset': {
+                'image/webp': '/media/derivatives/ab/k-200w.webp 200w, /media/derivatives/ab/k-400w.webp 400w',
+                'image/jpeg': '/media/derivatives/ab/k-200w.jpg 200w, /media/derivatives/ab/k-400w.jpg 400w',
+            },
+            'sizes': {
+                'thumb': {'width': 200, 'image/webp': '/media/derivatives/ab/k-200w.webp',
+                          'image/jpeg': '/media/derivatives/ab/k-200w.jpg'},
+                'card': {'width': 400, 'image/webp': '/media/derivatives/ab/k-400w.webp',
+                         'image/jpeg': '/media/derivatives/ab/k-400w.jpg'},
+            },
+        })
+        request = APIRequestFactory().get('/', HTTP_HOST='shop.example.com')
+        with override_settings(ALLOWED_HOSTS=['shop.example.com']):
+            urls = rendition_urls(renditions, request)
+        self.assertEqual(urls['sizes']['thumb']['image/jpeg'], 'http://shop.example.com/media/derivatives/ab/k-200w.jpg')
+
+
+class PublicImageFieldTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.context = catalog_fixtures(2)
+        self.client = APIClient()
+
+    def test_processing_fields_are_not_public(self):
+        product = self.client.get(f"/api/products/{self.context['product']}/").json()['product']
+        category = self.client.get('/api/categories/').json()['categories'][0]
+        gallery_image = self.client.get('/api/products/', {'expand': 'images'}).json()['products'][0]['images'][0]
+        for payload in (product, category, gallery_image):
+            self.assertIn('renditions', payload)
+            self.assertNotIn('image_hash', payload)
+            self.assertNotIn('image_status', payload)
+        response = self.client.get('/api/categories/', {'fields': 'name,image_hash'})
+        self.assertEqual(response.status_code, 400)
@@ -1,16 +1,19 @@
 from django.contrib import admin
 from django.urls import path
-from .views import ProductList, ProductDetail, ContactUsView, InquiryView, CategoryList, CompositionView
+from .views import ProductList, ProductFacetList, ProductSearch, ProductDetail, ContactUsView, InquiryView, InquiryBatchView, CategoryList, CompositionView
 
 
 
 
 urlpatterns = [
     path('products/', ProductList.as_view(), name='product-list'),
+    path('products/filter/', ProductFacetList.as_view(), name='product-filter'),
+    path('products/search/', ProductSearch.as_view(), name='product-search'),
     path('products/<uuid:pk>/', ProductDetail.as_view(), name='product-detail'),
     path('compositions/', CompositionView.as_view(), name='composition-list'),
     path('contact-us/', ContactUsView.as_view(), name='contact-us'),
     path('Inquiry/', InquiryView.as_view(), name='inquiry'),
+    path('Inquiry/batch/', InquiryBatchView.as_view(), name='inquiry-batch'),
     path('categories/', CategoryList.as_view(), name='category-list'),
     
 ] 
\ No newline at end of file
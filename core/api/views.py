@@ -2,7 +2,7 @@ from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from rest_framework import status
+from rest_framework import serializers, status
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
 from django.views.decorators.vary import vary_on_cookie
@@ -16,41 +16,53 @@ from .serializers import (
     InquirySerializer,
     CompositionSerializer,
     InquiryCreateSerializer,
+    InquiryBatchItemSerializer,
 )
 
 from .services.email_service import EmailService
-from django.db import connection
-from django.db import reset_queries
-import time
-from django.core.cache import cache
+from .services.inquiry_service import create_inquiries, get_product_styles, inquiries_with_items
+from django.conf import settings
+from .fast_serializers import CategoryRowSerializer, ProductRowSerializer
+from .pagination import KeysetPaginator, InvalidCursor
+from .search import search_product_ids
+from .facets import parse_facet_filters, filter_products, get_facet_counts
+from uuid import UUID
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from .cache import cache_response, conditional_response, product_tags
+from .instrumentation import timed
+
+# Product lists embed category, sub-category and composition names, and
+# gallery images with expand=images
+CATALOG_TAGS = ('product', 'productimage', 'category', 'subcategory', 'composition')
+
 
 class CategoryList(APIView):
     """
     Get all categories with their subcategories
     """
-    def get_cache_key(self):
-        return 'category_list_cache_key'
-
+    @conditional_response(tags=('category', 'subcategory'))
+    @cache_response(tags=('category', 'subcategory'))
     def get(self, request):
         try:
-            cache_key = self.get_cache_key()
-            cached_data = cache.get(cache_key)
-            
-            if cached_data:
-                return Response(cached_data)
-            
-            categories = Category.objects.prefetch_related('subcategories').all()
-            serializer = CategorySerializer(categories, many=True)
+            fields = CategorySerializer.select_fields(request.query_params)
+            # Same output as CategorySerializer, built from values() rows
+            serializer = CategoryRowSerializer(fields)
+            with timed('serializer'):
+                data = serializer.to_representation(serializer.values(Category.objects.all()))
             response_data = {
                 'status': 'success',
                 'message': 'Categories fetched successfully',
-                'categories': serializer.data
+                'categories': data
             }
             
-            # Cache for 5 minutes
-            cache.set(cache_key, response_data, 300)
-            
             return Response(response_data, status=status.HTTP_200_OK)
+        except serializers.ValidationError as e:
+            return Response({
+                'status': 'error',
+                'message': 'Invalid field selection',
+                'errors': e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({
                 'status': 'error',
@@ -58,49 +70,169 @@ class CategoryList(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class ProductList(APIView):
+    """
+    Get products one page at a time, ordered by id.
+
+    Query params:
+    - category: optional category id
+    - sub_category: optional sub-category id
+    - cursor: `next_cursor` from the previous page
+    - limit: page size (default DEFAULT_PAGE_SIZE, max MAX_PAGE_SIZE)
+    - fields, exclude, expand: sparse fieldsets, e.g.
+      fields=id,style_number,image or expand=images,description
+      (see api.serializers.SparseFieldsetMixin)
+    """
+    @conditional_response(tags=CATALOG_TAGS)
+    @cache_response(tags=('product',))
     def get(self, request):
         try:
-            cache_key = 'product_list'
-            products = cache.get(cache_key)
-            
-            if products is None:
-                products = Product.objects.select_related('category').prefetch_related(
-                    Prefetch('composition', queryset=Composition.objects.only('id', 'material')),
-                    Prefetch('sub_category', queryset=SubCategory.objects.only('id', 'name'))
-                ).all()
-                cache.set(cache_key, products, timeout=300)  # Cache for 5 minutes
-            
-            # Reset query log
-            reset_queries()
-            
-            # Start time
-            start = time.time()
-            
-            # Convert to list to execute the query
-            products_list = list(products)
-            
-            # Print query count and time
-            query_count = len(connection.queries)
-            end = time.time()
-            
-            print(f"Number of queries: {query_count}")
-            print(f"Time taken: {end - start:.2f} seconds")
+            paginator = KeysetPaginator(request)
+            fields = ProductSerializer.select_fields(request.query_params)
+            # Same output as ProductSerializer, built from values() rows
+            serializer = ProductRowSerializer(fields, request)
+            products = Product.objects.all()
+
+            category = request.query_params.get('category')
+            if category:
+                products = products.filter(category_id=category)
+            sub_category = request.query_params.get('sub_category')
+            if sub_category:
+                products = products.filter(sub_category_id=sub_category)
+
+            # Only the current page is fetched from the database
+            rows = paginator.paginate_queryset(serializer.values(products))
+            related = serializer.load_related(rows)
             
-            # Print actual queries for analysis
-            for query in connection.queries:
-                print(f"Query: {query['sql']}")
+            with timed('serializer'):
+                data = serializer.to_representation(rows, related)
             
-            serializer = ProductSerializer(
-                products_list, 
-                many=True, 
-                context={'request': request}
+            response = Response({
+                'status': 'success',
+                'message': 'Products fetched successfully',
+                'products': data,
+                **paginator.get_pagination_data()
+            }, status=status.HTTP_200_OK)
+            response.cache_tags = serializer.cache_tags(rows, related)
+            return response
+        except (InvalidCursor, ValidationError) as e:
+            return Response({
+                'status': 'error',
+                'message': 'Invalid pagination or filter parameters'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except serializers.ValidationError as e:
+            return Response({
+                'status': 'error',
+                'message': 'Invalid field selection',
+                'errors': e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({
+                'status': 'error',
+                'message': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class ProductFacetList(APIView):
+    """
+    Filtered product listing with facet counts.
+
+    Query params:
+    - category, sub_category, gauge, end, weight, composition: facet
+      filters; repeat a param or comma separate values to OR them
+    - cursor, limit, fields, exclude, expand: as for ProductList
+
+    Each facet's counts ignore that facet's own filter.
+    """
+    @cache_response(tags=CATALOG_TAGS)
+    def get(self, request):
+        try:
+            paginator = KeysetPaginator(request)
+            filters = parse_facet_filters(request.query_params)
+            fields = ProductSerializer.select_fields(request.query_params)
+            products = filter_products(
+                ProductSerializer.narrow_queryset(Product.objects.all(), fields),
+                filters
             )
-            
+            products_list = paginator.paginate_queryset(products)
+
+            with timed('serializer'):
+                data = ProductSerializer(
+                    products_list,
+                    many=True,
+                    fields=fields,
+                    context={'request': request}
+                ).data
+            response = Response({
+                'status': 'success',
+                'message': 'Products fetched successfully',
+                'products': data,
+                'facets': get_facet_counts(filters),
+                **paginator.get_pagination_data()
+            }, status=status.HTTP_200_OK)
+            response.cache_tags = set().union(*(product_tags(p, fields=fields) for p in products_list))
+            return response
+        except InvalidCursor:
+            return Response({
+                'status': 'error',
+                'message': 'Invalid pagination or filter parameters'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except serializers.ValidationError as e:
             return Response({
+                'status': 'error',
+                'message': 'Invalid field selection',
+                'errors': e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({
+                'status': 'error',
+                'message': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class ProductSearch(APIView):
+    """
+    Full-text search over style number, description, category and materials.
+
+    Query params:
+    - q: search text; every word is matched as a prefix
+    - limit: max results (default DEFAULT_PAGE_SIZE, max MAX_PAGE_SIZE)
+    - fields, exclude, expand: as for ProductList
+    """
+    @cache_response(tags=CATALOG_TAGS)
+    def get(self, request):
+        try:
+            query = request.query_params.get('q', '').strip()
+            if not query:
+                return Response({
+                    'status': 'error',
+                    'message': 'Search query "q" is required'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            limit = KeysetPaginator(request).limit
+            fields = ProductSerializer.select_fields(request.query_params)
+            product_ids = search_product_ids(query, limit)
+            products = ProductSerializer.narrow_queryset(Product.objects.all(), fields).in_bulk(product_ids)
+            # Keep the relevance order from the index
+            products_list = [products[pk] for pk in map(UUID, product_ids) if pk in products]
+
+            with timed('serializer'):
+                data = ProductSerializer(
+                    products_list,
+                    many=True,
+                    fields=fields,
+                    context={'request': request}
+                ).data
+            response = Response({
                 'status': 'success',
                 'message': 'Products fetched successfully',
-                'products': serializer.data
+                'products': data
             }, status=status.HTTP_200_OK)
+            response.cache_tags = set().union(*(product_tags(p, fields=fields) for p in products_list))
+            return response
+        except serializers.ValidationError as e:
+            return Response({
+                'status': 'error',
+                'message': 'Invalid field selection',
+                'errors': e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({
                 'status': 'error',
@@ -110,33 +242,40 @@ class ProductList(APIView):
 class ProductDetail(APIView):
     """
     Get product details by ID
+
+    Query params:
+    - fields, exclude: sparse fieldsets, as for ProductList
     """
+    # Unknown ids are cached too, so repeated misses never reach the database
+    @cache_response(statuses=(200, 404))
     def get(self, request, pk):
         try:
-            cache_key = f'product_detail_{pk}'
-            product = cache.get(cache_key)
-            
-            if product is None:
-                product = get_object_or_404(
-                    Product.objects.select_related('category').prefetch_related(
-                        Prefetch('images', queryset=ProductImage.objects.all()),
-                        Prefetch('composition', queryset=Composition.objects.all())
-                    ),
-                    id=pk
-                )
-                cache.set(cache_key, product, timeout=300)  # Cache for 5 minutes
+            fields = ProductDetailSerializer.select_fields(request.query_params)
+            product = ProductDetailSerializer.narrow_queryset(Product.objects.all(), fields).get(id=pk)
             
-            serializer = ProductDetailSerializer(product)
-            return Response({
+            with timed('serializer'):
+                data = ProductDetailSerializer(product, fields=fields).data
+            response = Response({
                 'status': 'success',
                 'message': 'Product details fetched successfully',
-                'product': serializer.data
+                'product': data
             }, status=status.HTTP_200_OK)
+            response.cache_tags = product_tags(product, detail=True, fields=fields)
+            return response
         except Product.DoesNotExist:
-            return Response({
+            # Creating a product with this id bumps the same tag
+            response = Response({
                 'status': 'error',
                 'message': f'Product not found with id: {pk}'
             }, status=status.HTTP_404_NOT_FOUND)
+            response.cache_tags = {f'product:{pk}'}
+            return response
+        except serializers.ValidationError as e:
+            return Response({
+                'status': 'error',
+                'message': 'Invalid field selection',
+                'errors': e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({
                 'status': 'error',
@@ -145,13 +284,24 @@ class ProductDetail(APIView):
         
 
 class CompositionView(APIView):
+    @conditional_response(tags=('composition',))
+    @cache_response(tags=('composition',))
     def get(self, request):
-        compositions = Composition.objects.all()
-        serializer = CompositionSerializer(compositions, many=True)
+        try:
+            fields = CompositionSerializer.select_fields(request.query_params)
+        except serializers.ValidationError as e:
+            return Response({
+                'status': 'error',
+                'message': 'Invalid field selection',
+                'errors': e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
+        compositions = CompositionSerializer.narrow_queryset(Composition.objects.all(), fields)
+        with timed('serializer'):
+            data = CompositionSerializer(compositions, many=True, fields=fields).data
         return Response({
             'status': 'success',
             'message': 'Compositions fetched successfully',
-            'compositions': serializer.data
+            'compositions': data
         }, status=status.HTTP_200_OK)
 
 class ContactUsView(APIView):
@@ -161,10 +311,11 @@ class ContactUsView(APIView):
     def post(self, request):
         serializer = ContactUsSerializer(data=request.data)
         if serializer.is_valid():
-            contact = serializer.save()
-            
-            # Send email using the service
-            email_sent = EmailService.send_contact_email(contact)
+            # The notification is delivered by the outbox worker, and only
+            # if the submission itself commits
+            with transaction.atomic():
+                contact = serializer.save()
+                EmailService.queue_contact_email(contact)
             
             response_data = {
                 'status': 'success',
@@ -172,9 +323,6 @@ class ContactUsView(APIView):
                 'data': serializer.data
             }
             
-            if not email_sent:
-                response_data['warning'] = 'Form submitted but notification email failed'
-            
             return Response(response_data, status=status.HTTP_201_CREATED)
             
         return Response(
@@ -214,16 +362,11 @@ class InquiryView(APIView):
         """
         serializer = InquiryCreateSerializer(data=request.data)
         if serializer.is_valid():
-            # Save the inquiry
+            # Saves the inquiry, its items and its notification atomically
             inquiry = serializer.save()
             
-            # Send email notification
-            email_sent = EmailService.send_inquiry_email(inquiry)
-            
-            response_data = InquirySerializer(inquiry).data
-            
-            if not email_sent:
-                response_data['warning'] = 'Inquiry created but notification email failed'
+            with timed('serializer'):
+                response_data = InquirySerializer(inquiries_with_items().get(id=inquiry.id)).data
             
             return Response({
                 "status": True,
@@ -235,3 +378,78 @@ class InquiryView(APIView):
             "message": "Invalid data",
             "errors": serializer.errors
         }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class InquiryBatchView(APIView):
+    """
+    Create many inquiries in one request (offline trade-show tablets).
+
+    Request Data:
+    - inquiries: [{"id": "<optional client uuid>", "name": ..., "email": ...,
+      "subject": ..., "message": ..., "items": ["product_id", ...]}, ...]
+
+    Valid rows are created together; invalid rows are reported by index.
+    Rows whose client id already exists are skipped, so a batch can be
+    re-sent safely.
+
+    Returns:
+    - created: ids of the new inquiries
+    - duplicates: client ids that already existed
+    - errors: {index: validation errors}
+    """
+    def post(self, request):
+        rows = request.data.get('inquiries') if isinstance(request.data, dict) else None
+        max_size = getattr(settings, 'INQUIRY_BATCH_MAX_SIZE', 200)
+        if not isinstance(rows, list) or not rows:
+            return Response({
+                "status": False,
+                "message": "Invalid data",
+                "errors": {"inquiries": ["A non-empty list is required"]}
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > max_size:
+            return Response({
+                "status": False,
+                "message": f"At most {max_size} inquiries per batch"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # One product lookup for every id mentioned anywhere in the batch
+        product_ids = set()
+        for row in rows:
+            items = row.get('items') if isinstance(row, dict) else None
+            for value in items if isinstance(items, list) else ():
+                try:
+                    product_ids.add(UUID(str(value)))
+                except ValueError:
+                    pass
+        context = {'product_styles': get_product_styles(product_ids)}
+
+        valid = []
+        errors = {}
+        for index, row in enumerate(rows):
+            serializer = InquiryBatchItemSerializer(data=row, context=context)
+            if serializer.is_valid():
+                valid.append(serializer.validated_data)
+            else:
+                errors[index] = serializer.errors
+
+        client_ids = [row['id'] for row in valid if 'id' in row]
+        existing = set(Inquiry.objects.filter(id__in=client_ids).values_list('id', flat=True))
+        duplicates = []
+        new_rows = []
+        seen = set()
+        for row in valid:
+            if 'id' in row and (row['id'] in existing or row['id'] in seen):
+                duplicates.append(row['id'])
+                continue
+            seen.add(row.get('id'))
+            new_rows.append(row)
+
+        inquiries = create_inquiries(new_rows, context['product_styles']) if new_rows else []
+
+        return Response({
+            "status": not errors,
+            "message": f"{len(inquiries)} inquiries created",
+            "created": [inquiry.id for inquiry in inquiries],
+            "duplicates": duplicates,
+            "errors": errors
+        }, status=status.HTTP_201_CREATED if inquiries else status.HTTP_200_OK)
@@ -51,12 +51,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.instrumentation.RequestInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.db_routing.ReadReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
@@ -90,9 +92,51 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Reuse connections across requests; 0 closes them after every request
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Writers take the lock at BEGIN and wait for it (busy_timeout),
+            # instead of failing with "database is locked" when a read
+            # transaction has to be upgraded to a write
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Read replicas, e.g. DB_REPLICAS=/srv/replica1.sqlite3,/srv/replica2.sqlite3
+# (two SQLite files are enough to try the routing locally)
+for index, name in enumerate(filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'],
+        'NAME': name,
+        # Tests run against the primary only
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['api.db_routing.PrimaryReplicaRouter']
+
+DATABASE_ROUTING = {
+    'REPLICAS': [alias for alias in DATABASES if alias != 'default'],
+    # Safe requests to these views read from a replica
+    'READ_VIEW_MODULES': ['api.views', 'admin_panel.views'],
+    # Assumed replication lag: after a write the client (by Authorization
+    # header) reads from the primary this long, and after a catalog write so
+    # do response cache fills
+    'STICKY_SECONDS': int(os.getenv('DB_STICKY_SECONDS', '15')),
+}
+
+# Applied to every new SQLite connection (api.signals.apply_sqlite_pragmas)
+SQLITE_PRAGMAS = {
+    # Readers and the writer no longer block each other
+    'journal_mode': 'wal',
+    # Safe with WAL: a power loss can drop the last commits, not corrupt
+    'synchronous': 'normal',
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000')),  # ms
+    'cache_size': -64000,  # negative: KiB, so 64 MB per connection
+    'mmap_size': 256 * 1024 * 1024,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -166,6 +210,19 @@ CSRF_TRUSTED_ORIGINS = [
 DEFAULT_PAGE_SIZE = 20
 MAX_PAGE_SIZE = 100
 
+# Largest number of inquiries accepted by one /api/Inquiry/batch/ request
+INQUIRY_BATCH_MAX_SIZE = 200
+
+# Bulk product import (admin products/import/ and the import_products command)
+PRODUCT_IMPORT = {
+    'CHUNK_SIZE': 500,
+    # Per-row errors reported back; the total is always counted
+    'MAX_ERRORS': 1000,
+}
+
+# Rows fetched per round trip by the admin inquiry/contact exports
+EXPORT_CHUNK_SIZE = 2000
+
 # Email Configuration
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND')
 EMAIL_HOST = os.getenv('EMAIL_HOST')
@@ -175,6 +232,14 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 ADMIN_EMAIL = os.getenv('ADMIN_EMAIL')
 
+# Notification emails are queued in EmailOutbox and sent by `send_outbox`
+EMAIL_OUTBOX = {
+    'BATCH_SIZE': 50,
+    'MAX_ATTEMPTS': 8,
+    'BACKOFF_SECONDS': 30,
+    'MAX_BACKOFF_SECONDS': 3600,
+}
+
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
 
 
@@ -220,7 +285,56 @@ IMAGE_OPTIMIZATION = {
     'MAX_WIDTH': 800,
     'MAX_HEIGHT': 800,
     'QUALITY': 80,
-    'FORMAT': 'JPEG'
+    'FORMAT': 'JPEG',
+    # process_images worker: pool size (None = CPU count) and jobs per batch
+    'WORKERS': None,
+    'BATCH_SIZE': 50,
 }
 
+# Responsive renditions generated alongside the main image. SIZES are max
+# widths; formats the installed Pillow cannot encode are skipped, and JPEG
+# is always produced as the fallback.
+IMAGE_RENDITIONS = {
+    'SIZES': {
+        'thumb': 200,
+        'card': 400,
+        'detail': 800,
+        'zoom': 1600,
+    },
+    'FORMATS': ['AVIF', 'WEBP', 'JPEG'],
+    'QUALITY': {
+        'AVIF': 50,
+        'WEBP': 75,
+        'JPEG': 80,
+    },
+}
 
+# Browser / reverse proxy caching of public catalog endpoints
+CATALOG_HTTP_CACHE = {
+    'MAX_AGE': 60,
+    'STALE_WHILE_REVALIDATE': 300,
+}
+
+# Per-request metrics (query count, DB time, cache hits/misses, serializer time)
+# SAMPLE_RATE is the fraction of requests measured; 0 disables instrumentation
+REQUEST_INSTRUMENTATION = {
+    'SAMPLE_RATE': float(os.getenv('INSTRUMENTATION_SAMPLE_RATE', '0')),
+    'SERVER_TIMING': True,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.instrumentation': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
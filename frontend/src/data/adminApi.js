@@ -135,28 +135,29 @@ export const deleteCategory = async (categoryId) => {
 
 export const fetchCategoryProducts = async (categoryId) => {
   try {
-    const response = await fetch(`${BaseUrl}/api/admin/categorised-products/${categoryId}/`, {
-      method: 'GET',
-      headers: getAuthHeaders(),
-      credentials: 'include'
-    });
-
-    if (!response.ok) {
-      const errorData = await response.json();
-      throw new Error(errorData.detail || 'Failed to fetch products');
-    }
+    // The listing is paginated: follow the cursor until every page is loaded
+    const products = [];
+    let url = `${BaseUrl}/api/admin/categorised-products/${categoryId}/?limit=100`;
+    while (url) {
+      const response = await fetch(url, {
+        method: 'GET',
+        headers: getAuthHeaders(),
+        credentials: 'include'
+      });
+
+      if (!response.ok) {
+        const errorData = await response.json();
+        throw new Error(errorData.detail || errorData.message || 'Failed to fetch products');
+      }
 
-    const data = await response.json();
-    console.log('API Response:', data); // Debug log
-    
-    // Check if data is an array directly or has a products property
-    if (Array.isArray(data)) {
-      return data;
-    } else if (data.products && Array.isArray(data.products)) {
-      return data.products;
-    } else {
-      throw new Error('Invalid response format');
+      const data = await response.json();
+      if (!Array.isArray(data.data)) {
+        throw new Error('Invalid response format');
+      }
+      products.push(...data.data);
+      url = data.next;
     }
+    return products;
   } catch (error) {
     console.error('Error fetching category products:', error);
     throw error;
@@ -415,23 +416,27 @@ export const fetchInquiries = async () => {
     const headers = getAuthHeaders();
     if (!headers) return [];
 
-    const response = await fetch('http://127.0.0.1:8000/api/admin/Inquiry/', {
-      headers,
-      credentials: 'include',
-    });
-    
-    if (response.status === 401) {
-      handleUnauthorizedResponse({ response });
-      return [];
+    // The inbox is paginated newest first: follow `next` until every page is loaded
+    const inquiries = [];
+    let url = `${BaseUrl}/api/admin/Inquiry/?limit=100`;
+    while (url) {
+      const response = await fetch(url, {
+        headers,
+        credentials: 'include',
+      });
+
+      if (response.status === 401) {
+        handleUnauthorizedResponse({ response });
+        return [];
+      }
+
+      if (!response.ok) throw new Error('Failed to fetch inquiries');
+
+      const responseData = await response.json();
+      inquiries.push(...(responseData.data || []));
+      url = responseData.next;
     }
-    
-    if (!response.ok) throw new Error('Failed to fetch inquiries');
-    
-    const responseData = await response.json();
-    console.log('Inquiries response:', responseData); // Debug log
-    
-    // Return the data array from the response
-    return responseData.data || [];
+    return inquiries;
   } catch (error) {
     console.error('Error fetching inquiries:', error);
     return [];
@@ -178,23 +178,38 @@ export const categories = [
   }
 ];
 
-export const fetchAllProducts = async () => {
-  try {
-    const response = await fetch(`${BaseUrl}/api/products/`, {
+// The product list is paginated: follow `next` until every page is loaded.
+// `filters` (category, sub_category) are applied by the server.
+const fetchProductPages = async (filters = {}) => {
+  const params = new URLSearchParams({ ...filters, limit: 100 });
+  const allProducts = [];
+  let url = `${BaseUrl}/api/products/?${params}`;
+  while (url) {
+    const response = await fetch(url, {
       method: 'GET',
       headers: {
         'Content-Type': 'application/json',
       },
     });
-    
+
     if (!response.ok) {
       const errorData = await response.json();
-      throw new Error(errorData.detail || 'Failed to fetch products');
+      throw new Error(errorData.detail || errorData.message || 'Failed to fetch products');
     }
-    
+
     const data = await response.json();
-    console.log('Products response:', data); // Debug log
-    return data.products || data;
+    if (!Array.isArray(data.products)) {
+      throw new Error('Invalid response format');
+    }
+    allProducts.push(...data.products);
+    url = data.next;
+  }
+  return allProducts;
+};
+
+export const fetchAllProducts = async () => {
+  try {
+    return await fetchProductPages();
   } catch (error) {
     console.error('Error fetching products:', error);
     // Return mock data as fallback
@@ -228,32 +243,7 @@ export const fetchAllCategories = async () => {
 
 export const fetchCategoryProducts = async (categoryId) => {
   try {
-    // Fetch all products and filter by category
-    const response = await fetch(`${BaseUrl}/api/products/`, {
-      method: 'GET',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-    });
-    
-    if (!response.ok) {
-      const errorData = await response.json();
-      throw new Error(errorData.detail || 'Failed to fetch products');
-    }
-    
-    const data = await response.json();
-    console.log('All products response:', data); // Debug log
-    
-    // Get products array from response
-    const allProducts = data.products || data;
-    
-    // Filter products by category
-    const categoryProducts = allProducts.filter(product => 
-      product.category?.id === categoryId
-    );
-    
-    console.log('Filtered category products:', categoryProducts); // Debug log
-    return categoryProducts;
+    return await fetchProductPages({ category: categoryId });
   } catch (error) {
     console.error('Error fetching category products:', error);
     // Return filtered mock data as fallback
@@ -263,33 +253,7 @@ export const fetchCategoryProducts = async (categoryId) => {
 
 export const fetchSubcategoryProducts = async (categoryId, subcategoryId) => {
   try {
-    // Fetch all products and filter by category and subcategory
-    const response = await fetch(`${BaseUrl}/api/products/`, {
-      method: 'GET',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-    });
-    
-    if (!response.ok) {
-      const errorData = await response.json();
-      throw new Error(errorData.detail || 'Failed to fetch products');
-    }
-    
-    const data = await response.json();
-    console.log('All products response:', data); // Debug log
-    
-    // Get products array from response
-    const allProducts = data.products || data;
-    
-    // Filter products by category and subcategory
-    const subcategoryProducts = allProducts.filter(product => 
-      product.category?.id === categoryId && 
-      product.sub_category?.id === subcategoryId
-    );
-    
-    console.log('Filtered subcategory products:', subcategoryProducts); // Debug log
-    return subcategoryProducts;
+    return await fetchProductPages({ category: categoryId, sub_category: subcategoryId });
   } catch (error) {
     console.error('Error fetching subcategory products:', error);
     // Return filtered mock data as fallback